@@ -0,0 +1,45 @@
+"""
+Compares full and lean page loads on the SeleniumBase path (HTTP path disabled).
+Loads the same pages in each mode with a fresh driver and reports seconds/page and KB transferred/page.
+Needs Chrome and, with --proxy, a running Tor.
+
+    python -m benchmarks.browser_load_benchmark --proxy socks5://127.0.0.1:9050
+    python -m benchmarks.browser_load_benchmark --url https://www.mobile.bg/obiavi/avtomobili-dzhipove/audi/a4 --pages 5
+"""
+import argparse
+import multiprocessing
+
+from config import BASE_URL
+from src.mobile_bg.parser_service import BRANDS_PAGE_MARKERS, LISTINGS_PAGE_MARKERS, POST_PAGE_MARKERS
+import src.shared.service.request_service as request_service
+
+
+def run_mode(url, pages, proxy, lean):
+    request_service.SELENIUMBASE_LEAN_MODE = lean
+    service = request_service.RequestService(proxy)
+
+    try:
+        for _ in range(pages):
+            service.fetch_page_seleniumbase(url, max_retries=1,
+                                            expected_markers=BRANDS_PAGE_MARKERS + LISTINGS_PAGE_MARKERS + POST_PAGE_MARKERS)
+        return service.get_driver_stats()
+    finally:
+        service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=BASE_URL)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--proxy", default=None, help="e.g. socks5://127.0.0.1:9050")
+    args = parser.parse_args()
+
+    # Every mode runs in its own process so the driver and its caches start cold
+    context = multiprocessing.get_context("spawn")
+    print(f"{'mode':<8}{'pages':>8}{'s/page':>10}{'KB/page':>10}")
+    for name, lean in (("full", False), ("lean", True)):
+        with context.Pool(1) as pool:
+            stats = pool.apply(run_mode, (args.url, args.pages, args.proxy, lean))
+        print(f"{name:<8}{stats['pages_fetched']:>8}{stats['seconds_per_page']:>10.2f}{stats['kb_per_page']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
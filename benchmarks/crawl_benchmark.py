@@ -0,0 +1,175 @@
+"""
+Runs phases 1-3 of scrape_mobile_bg against the local stand-in site (benchmarks/stand_in_server.py) instead of
+mobile.bg through Tor, and reports pages/sec, CPU seconds, peak RSS and DB rows/sec. Needs no network, Tor or Chrome,
+so crawler regressions show up before a deploy. The browser fallback and the adaptive rate limit are off unless asked
+for, they would otherwise measure Chrome and the pacing instead of the pipeline.
+
+    python -m benchmarks.crawl_benchmark
+    python -m benchmarks.crawl_benchmark --brands 10 --models 5 --pages 5 --latency 0.2 --error-rate 0.02 --workers 16
+    python -m benchmarks.crawl_benchmark --engine async --output async.json --baseline pool.json
+    python -m benchmarks.crawl_benchmark --profile   # then: python -m benchmarks.profile_report <run folder>/profiles
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sqlite3
+import tempfile
+import time
+from functools import partial
+
+from benchmarks.stand_in_server import BASE_PATH, LISTINGS_PER_PAGE, serve, add_site_arguments, get_site_options
+from src.mobile_bg import async_scraper_service, parser_service, scraper_service
+from src.shared.service import async_request_service, request_service
+
+# Lower is better for these, higher for the rest
+LOWER_IS_BETTER = ("seconds", "cpu_seconds", "cpu_seconds_per_page", "main_rss_mb", "worker_rss_mb")
+
+
+class NoTor:
+    """
+    Stands in for TorManager: no proxy, so the request services connect to the local site directly.
+    """
+    proxies = {"http": None, "https": None}
+
+    def start(self):
+        return True
+
+    def stop(self):
+        ""
+
+    def get_worker_proxies(self, num_workers):
+        return [None] * num_workers
+
+
+def configure(port, args):
+    # Pool workers are forked, so they inherit everything patched here
+    parser_service.URL_SCHEME = "http:"
+    scraper_service.BASE_URL = f"http://127.0.0.1:{port}{BASE_PATH}"
+    scraper_service.TorManager = NoTor
+    scraper_service.TOR_POOL_ENABLED = False
+    scraper_service.NUM_WORKERS = args.workers
+    scraper_service.PROFILING_ENABLED = args.profile
+    scraper_service.PIPELINE_ENABLED = not args.no_pipeline
+    async_scraper_service.NUM_WORKERS = args.workers
+
+    request_service.BROWSER_FALLBACK_ENABLED = args.browser
+    request_service.ADAPTIVE_RATE_ENABLED = args.rate_control
+    async_request_service.ADAPTIVE_RATE_ENABLED = args.rate_control
+    async_scraper_service.AsyncRequestService = partial(async_request_service.AsyncRequestService,
+                                                        browser_fallback=args.browser)
+
+def cpu_seconds():
+    # Pool workers are reaped when the pool is joined, from then on their time counts in RUSAGE_CHILDREN
+    return sum(usage.ru_utime + usage.ru_stime
+               for usage in (resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)))
+
+def rss_mb(who):
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return resource.getrusage(who).ru_maxrss / 1024 / (1024 if os.uname().sysname == "Darwin" else 1)
+
+def count_rows(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        tables = [name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        rows = {table: connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+    finally:
+        connection.close()
+    return rows
+
+def run(args, output_folder):
+    port_queue, stats_queue, stop_event = multiprocessing.Queue(), multiprocessing.Queue(), multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(get_site_options(args), port_queue, stop_event, stats_queue),
+                                     daemon=True)
+    server.start()
+
+    try:
+        configure(port_queue.get(timeout=30), args)
+
+        cpu_before = cpu_seconds()
+        started = time.perf_counter()
+        scraper_service.scrape_mobile_bg(folder=output_folder, engine=args.engine)
+        elapsed = time.perf_counter() - started
+        cpu = cpu_seconds() - cpu_before
+
+    finally:
+        stop_event.set()
+
+    site_stats = stats_queue.get(timeout=30)
+    server.join()
+
+    rows = count_rows(os.path.join(output_folder, "posts.db"))
+    expected_posts = args.brands * args.models * args.pages * LISTINGS_PER_PAGE
+
+    return {
+        "engine": args.engine,
+        "workers": args.workers,
+        "seconds": round(elapsed, 2),
+        "requests": site_stats["requests"],
+        "pages": site_stats["pages"],
+        "pages_per_sec": round(site_stats["pages"] / elapsed, 1),
+        "cpu_seconds": round(cpu, 2),
+        "cpu_seconds_per_page": round(cpu / site_stats["pages"], 4) if site_stats["pages"] else 0,
+        "main_rss_mb": round(rss_mb(resource.RUSAGE_SELF), 1),
+        "worker_rss_mb": round(rss_mb(resource.RUSAGE_CHILDREN), 1),
+        "posts": rows.get("listings", 0),
+        "expected_posts": expected_posts,
+        "db_rows": sum(rows.values()),
+        "db_rows_per_sec": round(sum(rows.values()) / elapsed, 1),
+        "injected_errors": site_stats["errors"],
+        "injected_challenges": site_stats["challenges"],
+    }
+
+def print_results(results, baseline=None):
+    print(f"{'metric':<24}{'value':>14}" + (f"{'baseline':>14}{'change':>10}" if baseline else ""))
+    for key, value in results.items():
+        line = f"{key:<24}{value:>14}"
+        if baseline and isinstance(value, (int, float)) and isinstance(baseline.get(key), (int, float)):
+            change = (value - baseline[key]) / baseline[key] if baseline[key] else 0
+            worse = change > 0 if key in LOWER_IS_BETTER else change < 0
+            line += f"{baseline[key]:>14}{change:>+9.0%}{' !' if worse and abs(change) >= 0.1 else ''}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_site_arguments(parser)
+    parser.add_argument("--engine", choices=("pool", "async"), default="pool")
+    parser.add_argument("--workers", type=int, default=scraper_service.NUM_WORKERS)
+    parser.add_argument("--browser", action="store_true", help="Keep the SeleniumBase fallback (needs Chrome)")
+    parser.add_argument("--rate-control", action="store_true", help="Keep the adaptive per-worker rate limit")
+    parser.add_argument("--no-pipeline", action="store_true", help="Wait for all of phase 2 before phase 3 starts")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with, changes of 10%% for the worse are flagged")
+    parser.add_argument("--keep", action="store_true", help="Keep the run folder (brands.db, posts.db, archive.db...)")
+    parser.add_argument("--profile", action="store_true", help="Profile the pool workers into the run folder, implies --keep")
+    parser.add_argument("--verbose", action="store_true", help="Show the scraper's logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    output_folder = tempfile.mkdtemp(prefix="crawl_benchmark_")
+    try:
+        results = run(args, output_folder)
+    finally:
+        if args.keep or args.profile:
+            print(f"Run folder: {output_folder}")
+        else:
+            shutil.rmtree(output_folder, ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
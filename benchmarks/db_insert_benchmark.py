@@ -0,0 +1,81 @@
+"""
+Compares posts.db insert throughput of the legacy per-call connections, the cached connections
+and the batched transactions used by the DB writer, on a synthetic dataset.
+
+    python -m benchmarks.db_insert_benchmark --posts 100000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from config import BATCH_SIZE
+from src.mobile_bg.db_service import create_posts_database, insert_post, write_posts_batch
+from src.shared.utils import db_util
+
+
+def synthetic_posts(count):
+    for i in range(count):
+        yield {
+            "post_number": str(10_000_000 + i),
+            "brand": "Brand",
+            "model": f"Model {i % 50}",
+            "title": f"Brand Model {i}",
+            "link": f"https://www.mobile.bg/obiava-{10_000_000 + i}",
+            "subtitle": "2.0 TDI",
+            "location": "Sofia",
+            "current_price": f"{5000 + i % 20000} лв.",
+            "additional_info": "Lorem ipsum dolor sit amet " * 5,
+            "images": [f"https://cdn.mobile.bg/photos/{i}_{n}.webp" for n in range(8)],
+            "car_parameters": {f"param_{n}": f"value_{n}" for n in range(8)},
+            "technical_data": {f"tech_{n}": f"value_{n}" for n in range(6)},
+            "extras": [f"extra_{n}" for n in range(10)],
+        }
+
+def run_per_call(db_path, count, cached):
+    db_util.DB_CACHE_CONNECTIONS = cached
+    for post in synthetic_posts(count):
+        insert_post(db_path, post)
+    db_util.close_connections()
+
+def run_batched(db_path, count):
+    conn = db_util.connect(db_path)
+    batch = []
+    for post in synthetic_posts(count):
+        batch.append(post)
+        if len(batch) >= BATCH_SIZE:
+            with conn:
+                write_posts_batch(conn, batch)
+            batch = []
+    with conn:
+        write_posts_batch(conn, batch)
+    conn.close()
+
+def measure(name, count, run):
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = os.path.join(folder, "posts.db")
+        create_posts_database(db_path)
+        db_util.close_connections()
+
+        started = time.perf_counter()
+        run(db_path, count)
+        elapsed = time.perf_counter() - started
+
+    print(f"{name:<32} {count:>8} posts {elapsed:>9.2f}s {count / elapsed:>12.1f} posts/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--legacy-posts", type=int, default=10_000,
+                        help="the legacy path is orders of magnitude slower, so it is measured on a subset")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    measure("per-call connections (legacy)", args.legacy_posts, lambda db, n: run_per_call(db, n, cached=False))
+    measure("cached connection", args.posts, lambda db, n: run_per_call(db, n, cached=True))
+    measure(f"batched transactions ({BATCH_SIZE})", args.posts, run_batched)
+
+if __name__ == "__main__":
+    main()
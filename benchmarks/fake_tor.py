@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the tor executable, for exercising TorManager/TorPool without a network.
+Listens on the --SocksPort it is given (so the port looks taken like a real Tor's), prints Tor's bootstrap lines and
+then idles until it is terminated. It never proxies anything.
+
+Environment variables:
+    FAKE_TOR_BOOTSTRAP_SECONDS  how long bootstrapping takes (default 1)
+    FAKE_TOR_STALL_PORTS        comma separated SOCKS ports whose instance stops at 50% and never bootstraps
+    FAKE_TOR_IGNORE_TERM        set to 1 to ignore SIGTERM, so only a kill stops the process
+"""
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def argument(name, default=None):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+def say(line):
+    print(f"{time.strftime('%b %d %H:%M:%S.000')} [notice] {line}", flush=True)
+
+def main():
+    socks_port = int(argument("--SocksPort", 9050))
+    bootstrap_seconds = float(os.environ.get("FAKE_TOR_BOOTSTRAP_SECONDS", 1))
+    stalled = str(socks_port) in os.environ.get("FAKE_TOR_STALL_PORTS", "").split(",")
+
+    if os.environ.get("FAKE_TOR_IGNORE_TERM") == "1":
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", socks_port))
+    listener.listen()
+    say(f"Opened Socks listener connection (ready) on 127.0.0.1:{socks_port}")
+
+    say("Bootstrapped 0% (starting): Starting")
+    time.sleep(bootstrap_seconds / 2)
+    say("Bootstrapped 50% (loading_descriptors): Loading relay descriptors")
+    if not stalled:
+        time.sleep(bootstrap_seconds / 2)
+        say("Bootstrapped 100% (done): Done")
+
+    while True:
+        time.sleep(60)
+
+if __name__ == "__main__":
+    main()
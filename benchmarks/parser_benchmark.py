@@ -0,0 +1,229 @@
+"""
+Runs the mobile.bg parsers over the saved HTML fixtures with every available BeautifulSoup backend,
+checks that each backend produces exactly the golden output and reports pages/sec.
+Exits with 1 when a backend doesn't match the golden output, --check runs only that comparison (the pre-merge check
+of any parser change, there is no test suite).
+With --allocations it also reports the peak traced memory and the blocks still allocated per page (tracemalloc),
+with --profile it writes a cProfile (or pyinstrument) profile per parser to --profile-folder.
+A corpus of captured pages is used by naming them like the fixture they stand for (brands*.html, post*.html...).
+
+    python -m benchmarks.parser_benchmark
+    python -m benchmarks.parser_benchmark --check   # before merging a parser change
+    python -m benchmarks.parser_benchmark --corpus path/to/captured/pages --allocations
+    python -m benchmarks.parser_benchmark --profile cprofile --iterations 50
+    python -m benchmarks.parser_benchmark --update-golden   # after an intended parser change
+"""
+import argparse
+import cProfile
+import gc
+import glob
+import json
+import os
+import pstats
+import time
+import tracemalloc
+
+from src.mobile_bg import parser_service
+from src.mobile_bg.parser_service import parse_brands, parse_models, extract_last_page, parse_listings, parse_post
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(__file__), "fixtures")
+GOLDEN_FILE = os.path.join(FIXTURES_FOLDER, "golden.json")
+POST_URL = "https://www.mobile.bg/obiava-11738475928374651-audi-a4-2-0-tdi"
+
+CASES = [
+    ("parse_brands", "brands.html", lambda html: parse_brands(html)),
+    ("parse_models", "models.html", lambda html: parse_models(html)),
+    ("extract_last_page", "listings.html", lambda html: extract_last_page(html)),
+    ("extract_last_page_single", "listings_single_page.html", lambda html: extract_last_page(html)),
+    ("parse_listings", "listings.html", lambda html: parse_listings(html, "Audi", "A4")),
+    ("parse_post", "post.html", lambda html: parse_post(html, POST_URL, "Audi", "A4")),
+]
+
+
+def load_fixture(name, folder=FIXTURES_FOLDER):
+    with open(os.path.join(folder, name), encoding="utf-8") as file:
+        return file.read()
+
+def load_corpus(folder):
+    # Every case runs on all pages named like its fixture, e.g. post.html, post_2.html...
+    corpus = {}
+    for name, fixture, _ in CASES:
+        stem = os.path.splitext(fixture)[0]
+        corpus[name] = [load_fixture(os.path.basename(path), folder)
+                        for path in sorted(glob.glob(os.path.join(folder, f"{stem}*.html")))]
+    return corpus
+
+def available_backends():
+    backends = ["html.parser"]
+    for backend, module in (("lxml", "lxml"), ("html5lib", "html5lib")):
+        try:
+            __import__(module)
+            backends.append(backend)
+        except ImportError:
+            pass
+    return backends
+
+def run_cases(backend):
+    parser_service.PARSER_FEATURES = backend
+    return {name: func(load_fixture(fixture)) for name, fixture, func in CASES}
+
+def check_golden(backend, golden):
+    # JSON round trip so tuples/lists compare the same way they were saved
+    outputs = json.loads(json.dumps(run_cases(backend), ensure_ascii=False))
+    return [name for name in golden if outputs.get(name) != golden[name]]
+
+def benchmark(backend, corpus, iterations):
+    parser_service.PARSER_FEATURES = backend
+    results = {}
+    for name, _, func in CASES:
+        pages = corpus[name]
+        if not pages:
+            continue
+        started = time.perf_counter()
+        for _ in range(iterations):
+            for html in pages:
+                func(html)
+        results[name] = iterations * len(pages) / (time.perf_counter() - started)
+    return results
+
+def measure_allocations(backend, corpus):
+    """
+    Peak traced memory while parsing a page, and the blocks still allocated after it: its result plus the
+    tree, which is only freed by the cyclic GC. One pass only, tracing slows the parsers down too much to time them.
+    """
+    parser_service.PARSER_FEATURES = backend
+    results = {}
+
+    tracemalloc.start()
+    for name, _, func in CASES:
+        pages = corpus[name]
+        if not pages:
+            continue
+        peak_kb = blocks = 0
+
+        for html in pages:
+            gc.collect()
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+            result = func(html)
+
+            peak_kb += (tracemalloc.get_traced_memory()[1] - baseline) / 1024
+            blocks += sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+            del result
+
+        results[name] = {"peak_kb": peak_kb / len(pages), "blocks": blocks / len(pages)}
+    tracemalloc.stop()
+
+    return results
+
+def profile(backend, corpus, iterations, profiler, folder):
+    """
+    Writes <case>.prof (cProfile) or <case>.html (pyinstrument) per parser and prints the top functions.
+    """
+    parser_service.PARSER_FEATURES = backend
+    os.makedirs(folder, exist_ok=True)
+
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("⚠️ pyinstrument is not installed, falling back to cProfile")
+            profiler = "cprofile"
+
+    for name, _, func in CASES:
+        pages = corpus[name]
+        if not pages:
+            continue
+
+        if profiler == "pyinstrument":
+            session = Profiler()
+            session.start()
+        else:
+            session = cProfile.Profile()
+            session.enable()
+
+        for _ in range(iterations):
+            for html in pages:
+                func(html)
+
+        if profiler == "pyinstrument":
+            session.stop()
+            profile_file = os.path.join(folder, f"{name}.html")
+            with open(profile_file, "w", encoding="utf-8") as file:
+                file.write(session.output_html())
+        else:
+            session.disable()
+            profile_file = os.path.join(folder, f"{name}.prof")
+            session.dump_stats(profile_file)
+            print(f"\n{name}:")
+            pstats.Stats(session).sort_stats("tottime").print_stats(8)
+
+        print(f"Profile written to {profile_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--corpus", default=FIXTURES_FOLDER, help="folder with brands*.html, models*.html, listings*.html, post*.html")
+    parser.add_argument("--allocations", action="store_true", help="also report tracemalloc peak KB and blocks per page")
+    parser.add_argument("--profile", choices=("cprofile", "pyinstrument"), help="profile every parser with the configured backend")
+    parser.add_argument("--profile-folder", default="debug/profiles")
+    parser.add_argument("--update-golden", action="store_true", help="rewrite golden.json from the html.parser output")
+    parser.add_argument("--check", action="store_true", help="only compare every backend with golden.json, exit 1 on a mismatch")
+    args = parser.parse_args()
+
+    if args.update_golden:
+        with open(GOLDEN_FILE, "w", encoding="utf-8") as file:
+            json.dump(run_cases("html.parser"), file, ensure_ascii=False, indent=2)
+        print(f"Golden output written to {GOLDEN_FILE}")
+        return
+
+    with open(GOLDEN_FILE, encoding="utf-8") as file:
+        golden = json.load(file)
+
+    backends = available_backends()
+    mismatches = {backend: check_golden(backend, golden) for backend in backends}
+
+    if args.check:
+        report_golden(mismatches)
+        return
+
+    configured_backend = parser_service.PARSER_FEATURES
+    corpus = load_corpus(args.corpus)
+
+    if args.profile:
+        profile(configured_backend, corpus, args.iterations, args.profile, args.profile_folder)
+        report_golden(mismatches)
+        return
+
+    results = {backend: benchmark(backend, corpus, args.iterations) for backend in backends}
+
+    print(f"{'pages/sec':<26}" + "".join(f"{backend:>14}" for backend in backends))
+    for name, _, _ in CASES:
+        if corpus[name]:
+            print(f"{name:<26}" + "".join(f"{results[backend][name]:>14.1f}" for backend in backends))
+
+    if args.allocations:
+        allocations = {backend: measure_allocations(backend, corpus) for backend in backends}
+        print(f"\n{'peak KB / blocks per page':<26}" + "".join(f"{backend:>20}" for backend in backends))
+        for name, _, _ in CASES:
+            if corpus[name]:
+                print(f"{name:<26}" + "".join(f"{allocations[backend][name]['peak_kb']:>12.1f} / {allocations[backend][name]['blocks']:>5.0f}"
+                                              for backend in backends))
+
+    print()
+    report_golden(mismatches)
+
+def report_golden(mismatches):
+    """
+    Prints the golden comparison of every backend and exits with 1 when any of them doesn't match.
+    """
+    for backend, failed in mismatches.items():
+        print(f"{backend:<14} golden output: {'OK' if not failed else 'MISMATCH in ' + ', '.join(failed)}")
+
+    if any(mismatches.values()):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
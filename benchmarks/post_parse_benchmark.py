@@ -0,0 +1,70 @@
+"""
+Compares parse_post on the full page against the focused mode that only builds the .ad2023 tree.
+Reports ms/post, the peak traced allocation and the peak RSS of a fresh process per mode.
+
+    python -m benchmarks.post_parse_benchmark
+    python -m benchmarks.post_parse_benchmark --corpus path/to/captured/posts
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import time
+import tracemalloc
+
+from src.mobile_bg.parser_service import parse_post
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_corpus(folder):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(folder, "post*.html"))):
+        with open(path, encoding="utf-8", errors="replace") as file:
+            pages.append(file.read())
+    return pages
+
+def run_mode(folder, focused, iterations):
+    pages = load_corpus(folder)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for html in pages:
+            parse_post(html, "https://www.mobile.bg/obiava", "Brand", "Model", focused=focused)
+    elapsed = time.perf_counter() - started
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss_mb = max_rss / 1024 / (1024 if os.uname().sysname == "Darwin" else 1)
+
+    return {
+        "posts": len(pages) * iterations,
+        "ms_per_post": elapsed * 1000 / (len(pages) * iterations),
+        "traced_peak_mb": traced_peak / 1024 / 1024,
+        "max_rss_mb": max_rss_mb,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=FIXTURES_FOLDER, help="folder with post*.html pages")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    if not load_corpus(args.corpus):
+        raise SystemExit(f"No post*.html pages found in {args.corpus}")
+
+    # Every mode runs in its own fresh process so the peak RSS of one doesn't hide the other
+    context = multiprocessing.get_context("spawn")
+    print(f"{'mode':<10}{'posts':>8}{'ms/post':>10}{'traced peak MB':>16}{'max RSS MB':>12}")
+    for name, focused in (("full", False), ("focused", True)):
+        with context.Pool(1) as pool:
+            result = pool.apply(run_mode, (args.corpus, focused, args.iterations))
+        print(f"{name:<10}{result['posts']:>8}{result['ms_per_post']:>10.3f}"
+              f"{result['traced_peak_mb']:>16.2f}{result['max_rss_mb']:>12.1f}")
+
+if __name__ == "__main__":
+    main()
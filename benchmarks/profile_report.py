@@ -0,0 +1,30 @@
+"""
+Merges the per-process worker profiles of a run (PROFILING_ENABLED = True writes them to <run folder>/profiles)
+and prints the functions the workers spent the most time in.
+
+    python -m benchmarks.profile_report output/mobilebg/2025-03-01_10-00-00/profiles
+    python -m benchmarks.profile_report output/mobilebg/2025-03-01_10-00-00/profiles --pattern "post-*" --sort tottime
+    python -m benchmarks.profile_report output/mobilebg/2025-03-01_10-00-00/profiles --output merged.prof
+"""
+import argparse
+
+from src.shared.utils.profiler import merge_profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder")
+    parser.add_argument("--pattern", default="*.prof", help="e.g. brand-model-* for the profiles of phase 2 only")
+    parser.add_argument("--sort", default="cumulative", help="any pstats sort key: cumulative, tottime, ncalls...")
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--output", help="Save the merged profile, e.g. for snakeviz")
+    args = parser.parse_args()
+
+    stats = merge_profiles(args.folder, args.pattern, args.output)
+    if stats is None:
+        raise SystemExit(1)
+
+    stats.strip_dirs().sort_stats(args.sort).print_stats(args.limit)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Local stand-in for mobile.bg built from the saved HTML fixtures, so the crawler can be benchmarked with no network.
+Serves the brands page, a models page per brand, listing pages per model and a post page per listing, with
+links rewritten to point back at the server. Every listing page gets its own post numbers, so posts don't dedup away.
+Latency, server errors and challenge pages can be injected.
+
+    python -m benchmarks.stand_in_server --port 8800 --brands 5 --models 4 --pages 3 --latency 0.05
+"""
+import argparse
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(__file__), "fixtures")
+BASE_PATH = "/obiavi/avtomobili-dzhipove/namira-se-v-balgariya"
+CATEGORY_PATH = "/obiavi/avtomobili-dzhipove/"
+FIXTURE_POST_NUMBER = "11738475928374651"
+LISTINGS_PER_PAGE = 24  # Listings parse_listings finds on listings.html
+
+CHALLENGE_PAGE = ('<html><head><title>Just a moment...</title></head>'
+                  '<body><div id="cf-chl-widget" class="challenge-platform"></div></body></html>')
+
+POST_PATTERN = re.compile(r"^/obiava-(\d+)")
+LISTING_POST_NUMBER_PATTERN = re.compile(r"117\d{14}")
+ENTRY_PATTERN = re.compile(r"^<nobr>.*</nobr>$", re.MULTILINE)
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_FOLDER, name), encoding="utf-8") as file:
+        return file.read()
+
+def keep_entries(html, limit, container=0):
+    """
+    Keeps the first `limit` entries of the container-th .marki list. Brands and models are one <nobr> per line,
+    the "--Всички--" entries don't count towards the limit.
+    """
+    start = [match.start() for match in re.finditer('<div class="marki">', html)][container]
+    end = html.index("</div>", start)
+    kept = 0
+
+    def replace(match):
+        nonlocal kept
+        if "--Всички" in match.group(0):
+            return match.group(0)
+        kept += 1
+        return match.group(0) if kept <= limit else ""
+
+    return html[:start] + ENTRY_PATTERN.sub(replace, html[start:end]) + html[end:]
+
+
+class StandInSite:
+    """
+    Renders the pages of the stand-in site: brands x models x pages listing pages of LISTINGS_PER_PAGE posts each.
+    Thread safe, the server handles every request on its own thread.
+    """
+
+    def __init__(self, brands=3, models=3, pages=3, latency=0.0, error_rate=0.0, challenge_rate=0.0, seed=0):
+        self.pages = pages
+        self.latency = latency
+        self.error_rate = error_rate
+        self.challenge_rate = challenge_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.brands_html = keep_entries(load_fixture("brands.html"), brands)
+        # The real listing count of the pages, which fits them, so models aren't sharded
+        self.models_html = re.sub(r"<n>\(\d+\)</n>", f"<n>({pages * LISTINGS_PER_PAGE})</n>",
+                                  keep_entries(load_fixture("models.html"), models, container=1))
+        self.listings_html = load_fixture("listings.html").replace("<div>27</div>", f"<div>{pages}</div>")
+        self.post_html = load_fixture("post.html")
+
+        self.stats = {"requests": 0, "pages": 0, "errors": 0, "challenges": 0, "not_found": 0, "bytes": 0}
+
+    def render(self, path, host):
+        """
+        Returns (status, html) for a request path, after the configured latency.
+        """
+        with self.lock:
+            self.stats["requests"] += 1
+            delay = self.random.uniform(0, 2 * self.latency) if self.latency else 0
+            roll = self.random.random()
+
+        if delay:
+            time.sleep(delay)
+
+        if roll < self.error_rate:
+            return self.__count("errors", 503, "Service Unavailable")
+        if roll < self.error_rate + self.challenge_rate:
+            return self.__count("challenges", 200, CHALLENGE_PAGE)
+
+        html = self.__page(path)
+        if html is None:
+            return self.__count("not_found", 404, "Not Found")
+
+        return self.__count("pages", 200, html.replace("//www.mobile.bg", f"//{host}"))
+
+    def __page(self, path):
+        match = POST_PATTERN.match(path)
+        if match:
+            return self.post_html.replace(FIXTURE_POST_NUMBER, match.group(1))
+
+        route = urlsplit(path).path
+        if route == BASE_PATH:
+            return self.brands_html
+        if not route.startswith(CATEGORY_PATH):
+            return None
+
+        segments = route[len(CATEGORY_PATH):].strip("/").split("/")
+        if len(segments) == 1:
+            # The fixture lists Audi's models, every brand gets them under its own URL
+            return self.models_html.replace(f"{CATEGORY_PATH}audi/", f"{CATEGORY_PATH}{segments[0]}/")
+
+        page = int(segments[2][2:]) if len(segments) == 3 and segments[2].startswith("p-") else 1
+        if len(segments) > 3 or page > self.pages:
+            return None
+
+        # Post numbers unique to this page (query string included), the last digits keep them apart within it
+        prefix = f"{zlib.crc32(path.encode('utf-8')) % 10 ** 8:08d}"
+        return LISTING_POST_NUMBER_PATTERN.sub(lambda number: f"11{prefix}{number.group(0)[-7:]}", self.listings_html)
+
+    def __count(self, stat, status, html):
+        with self.lock:
+            self.stats[stat] += 1
+            self.stats["bytes"] += len(html)
+        return status, html
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+
+def create_server(site, host="127.0.0.1", port=0):
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            status, html = site.render(self.path, self.headers.get("Host") or f"{host}:{self.server.server_port}")
+            body = html.encode("utf-8")
+
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            ""
+
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    return server
+
+def serve(site_options, port_queue, stop_event, stats_queue, port=0):
+    """
+    Process target: serves the site until stop_event is set, then reports the request stats.
+    Running it in its own process keeps the server's CPU time and GIL out of the crawler's numbers.
+    """
+    site = StandInSite(**site_options)
+    server = create_server(site, port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port_queue.put(server.server_port)
+
+    stop_event.wait()
+    server.shutdown()
+    stats_queue.put(site.get_stats())
+
+def add_site_arguments(parser):
+    parser.add_argument("--brands", type=int, default=3)
+    parser.add_argument("--models", type=int, default=3, help="Models per brand")
+    parser.add_argument("--pages", type=int, default=3, help=f"Listing pages per model, {LISTINGS_PER_PAGE} posts each")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean seconds per response (uniform 0-2x)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 503 responses")
+    parser.add_argument("--challenge-rate", type=float, default=0.0, help="Share of challenge pages")
+    parser.add_argument("--seed", type=int, default=0)
+
+def get_site_options(args):
+    return {"brands": args.brands, "models": args.models, "pages": args.pages, "latency": args.latency,
+            "error_rate": args.error_rate, "challenge_rate": args.challenge_rate, "seed": args.seed}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8800)
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    server = create_server(StandInSite(**get_site_options(args)), port=args.port)
+    print(f"Serving http://127.0.0.1:{args.port}{BASE_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
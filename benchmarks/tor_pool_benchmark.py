@@ -0,0 +1,89 @@
+"""
+Starts, bootstraps and stops a TorPool of fake Tor processes (benchmarks/fake_tor.py) and checks that instances which
+don't bootstrap are dropped and that every process is gone after stop(). Exits non-zero when a check fails.
+POSIX only, the fake binary is run through its shebang.
+
+    python -m benchmarks.tor_pool_benchmark
+    python -m benchmarks.tor_pool_benchmark --size 8 --stall 2 --ignore-term
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from src.shared.utils.network_util import is_port_open
+from src.shared.utils.tor_proxy_manager import TorPool
+
+FAKE_TOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_tor.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=4)
+    parser.add_argument("--stall", type=int, default=1, help="instances that never finish bootstrapping")
+    parser.add_argument("--ignore-term", action="store_true", help="fake Tors ignore SIGTERM and have to be killed")
+    parser.add_argument("--bootstrap-seconds", type=float, default=1)
+    parser.add_argument("--bootstrap-timeout", type=float, default=5)
+    parser.add_argument("--stop-timeout", type=float, default=2)
+    parser.add_argument("--socks-base-port", type=int, default=19060)
+    parser.add_argument("--control-base-port", type=int, default=19160)
+    args = parser.parse_args()
+
+    stalled_ports = [args.socks_base_port + i for i in range(args.size - args.stall, args.size)]
+    os.environ["FAKE_TOR_BOOTSTRAP_SECONDS"] = str(args.bootstrap_seconds)
+    os.environ["FAKE_TOR_STALL_PORTS"] = ",".join(map(str, stalled_ports))
+    os.environ["FAKE_TOR_IGNORE_TERM"] = "1" if args.ignore_term else "0"
+
+    failures = []
+    with tempfile.TemporaryDirectory() as data_folder:
+        pool = TorPool(size=args.size, tor_path=FAKE_TOR, socks_base_port=args.socks_base_port,
+                       control_base_port=args.control_base_port, data_folder=data_folder,
+                       bootstrap_timeout=args.bootstrap_timeout, stop_timeout=args.stop_timeout)
+
+        started_at = time.perf_counter()
+        # A pool where no instance bootstraps has to raise instead of handing out dead proxies
+        try:
+            pool.start()
+            if args.stall >= args.size:
+                failures.append("start() did not raise although no instance bootstrapped")
+        except Exception as e:
+            if args.stall < args.size:
+                failures.append(f"start() raised: {e}")
+        start_seconds = time.perf_counter() - started_at
+
+        # Instances that didn't bootstrap are already stopped here, the open port check below covers them
+        processes = [instance.process for instance in pool.instances if instance.process]
+        ready_ports = sorted(instance.port for instance in pool.ready_instances)
+        if ready_ports != [port for port in range(args.socks_base_port, args.socks_base_port + args.size)
+                           if port not in stalled_ports]:
+            failures.append(f"ready instances {ready_ports}, stalled ports {stalled_ports}")
+        if pool.ready_instances and pool.proxies != pool.ready_instances[0].proxies:
+            failures.append(f"proxies {pool.proxies} is not a ready instance")
+        worker_ports = [int(proxy.rsplit(":", 1)[1]) for proxy in pool.get_worker_proxies(args.size)] \
+            if pool.ready_instances else []
+        if set(worker_ports) & set(stalled_ports):
+            failures.append("a worker got the proxy of an instance that did not bootstrap")
+
+        started_at = time.perf_counter()
+        pool.stop()
+        stop_seconds = time.perf_counter() - started_at
+
+        alive = [process.pid for process in processes if process.poll() is None]
+        if alive:
+            failures.append(f"processes still running after stop(): {alive}")
+        open_ports = [port for port in range(args.socks_base_port, args.socks_base_port + args.size)
+                      if is_port_open("127.0.0.1", port)]
+        if open_ports:
+            failures.append(f"ports still open after stop(): {open_ports}")
+
+    print(f"{'instances':<20}{args.size:>10}")
+    print(f"{'ready':<20}{len(ready_ports):>10}")
+    print(f"{'start_seconds':<20}{start_seconds:>10.2f}")
+    print(f"{'stop_seconds':<20}{stop_seconds:>10.2f}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
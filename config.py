@@ -2,16 +2,75 @@ import os
 
 # General
 NUM_WORKERS = 8  # Number of parallel processes (based on your CPU threads)
-BATCH_SIZE = 100
+BATCH_SIZE = 100  # Posts per transaction of the DB writer
 DEFAULT_RETRIES = 3
 CHROME_DEBUG_PORT = 9222
 LOGGING_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 BASE_URL = "https://www.mobile.bg/obiavi/avtomobili-dzhipove/namira-se-v-balgariya"
 DB_TIMEOUT=5
+DB_CACHE_CONNECTIONS = True  # Reuse one connection per process/thread/database instead of connecting on every query
+DB_PRAGMAS = {
+    "synchronous": "NORMAL",  # Safe with WAL, skips the fsync on every commit
+    "cache_size": -65536,  # 64 MB page cache
+    "mmap_size": 268435456,  # 256 MB memory mapped I/O
+    "temp_store": "MEMORY",
+}
+DB_WRITER_ENABLED = True  # Send posts to a single writer instead of every worker opening posts.db itself
+DB_WRITER_FLUSH_INTERVAL = 2  # Seconds before a partial batch is written anyway
+DB_WRITER_QUEUE_SIZE = 10000
+DB_WRITER_LOG_INTERVAL = 30
+SCRAPER_ENGINE = "pool"  # "pool" (multiprocessing + SeleniumBase) or "async" (asyncio HTTP crawler)
+
+PARSER_BACKEND = "lxml"  # BeautifulSoup tree builder: "lxml" (fast, falls back if missing) or "html.parser"
+PARSER_FOCUSED_POST = True  # Only build the tree of the .ad2023 container when parsing a post
+
+# Crawl frontier (resumable task queue in frontier.db next to brands.db/posts.db)
+FRONTIER_MAX_ATTEMPTS = 3  # A task is marked failed after this many attempts
+FRONTIER_IDLE_SLEEP = 1  # Seconds a worker waits when nothing is claimable but other workers are still busy
+PIPELINE_ENABLED = True  # Stream phase 2 into phase 3 in one pool instead of waiting for every brand first (Pool engine)
+
+# Distributed crawl: a coordinator publishes the phase 3 tasks, workers on any number of machines claim them
+WORK_QUEUE_URL = "sqlite:///output/mobilebg/work_queue.db"  # "redis://host:6379/0" (needs the redis package) for several machines
+WORK_QUEUE_PREFIX = "onion"  # Key prefix of the Redis backend
+WORK_QUEUE_LEASE = 120  # Seconds a claimed task stays with a worker that stopped heartbeating before it is requeued
+WORK_QUEUE_HEARTBEAT_INTERVAL = 30
+WORK_QUEUE_REQUEUE_INTERVAL = 30  # Seconds between two sweeps for expired leases
+WORK_QUEUE_RESULT_BATCH = 500  # Results the coordinator takes off the queue at a time
+WORK_QUEUE_WAIT_TIMEOUT = 600  # Seconds a worker waits for the coordinator to publish tasks
+
+# Query sharding of models whose listings don't fit in mobile.bg's pagination
+SHARDING_ENABLED = True
+MOBILE_BG_MAX_PAGES = 150  # Last page mobile.bg paginates to, listings past it are only reachable through narrower searches
+MOBILE_BG_LISTINGS_PER_PAGE = 24  # Listings on a full page (as on the saved listings.html), only used when the first page can't tell
+SHARD_YEAR_RANGE = (1950, 2030)  # The outermost bounds are left open, so older/newer cars still land in the edge shards
+SHARD_PRICE_RANGE = (0, 500000)
+SHARD_QUERY_PARAMS = {"year": ("year", "year1"), "price": ("price", "price1")}  # Search form fields (from, to)
+
+# Raw HTML archive (archive.db next to brands.db/posts.db), lets a run be re-parsed offline
+ARCHIVE_ENABLED = True
+ARCHIVE_CODEC = "zlib"  # "zlib" or "zstd" (needs the zstandard package, falls back to zlib)
+ARCHIVE_COMPRESSION_LEVEL = 6
+REPARSE_WINDOW = 2000  # Archived pages handed to the parser processes at a time by the offline re-parse
+REPARSE_LOG_INTERVAL = 10  # Seconds between progress logs of the offline re-parse
+
+# Pre-fetch dedup of posts found on listing pages
+POST_DEDUP_ENABLED = True
+POST_DEDUP_REVISIT_CHANGED = True  # Still fetch known posts whose title or price on the listing page changed
+KNOWN_POSTS_DBS = []  # posts.db files of earlier runs whose posts shouldn't be fetched again
+
+# Per-stage metrics (fetch, browser, parse, store...) aggregated across the pool workers
+METRICS_ENABLED = True
+METRICS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]  # Histogram bounds in seconds
+METRICS_PUSH_INTERVAL = 5  # Seconds between two snapshots a worker sends to the collector
+METRICS_SNAPSHOT_INTERVAL = 30  # Seconds between two metrics.json snapshots in the run folder
+METRICS_PORT = None  # e.g. 9400 to serve Prometheus text on http://localhost:9400/metrics
+METRICS_HOST = "127.0.0.1"  # Interface the metrics endpoint binds to, "0.0.0.0" exposes it (and the proxy labels) to the network
+PROFILING_ENABLED = False  # cProfile the tasks of every pool worker into profiles/ of the run folder (slows the run down)
 
 # Paths
 SCREENSHOTS_FOLDER = "debug/screenshots"
 MOBILE_BG_OUTPUT_FOLDER="output/mobilebg"
+MOBILE_BG_INCREMENTAL_DB = "output/mobilebg/incremental_posts.db"  # posts.db kept across incremental runs
 
 # Extensions
 PNG_EXTENSION = ".png"
@@ -20,9 +79,17 @@ JPEG_EXTENSION = ".jpeg"
 # JS Scripts
 JS_SCROLL_TO_BOTTOM_SCRIPT = "window.scrollTo(0, document.body.scrollHeight);"
 JS_SCROLL_TO_TOP_SCRIPT = "window.scrollTo(0, 0);"
+JS_TRANSFER_SIZE_SCRIPT = ("return performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))"
+                           ".reduce((total, entry) => total + (entry.transferSize || 0), 0);")
 
 # Tor Settings
-NUM_TOR_INSTANCES = 10 # NOT IMPLEMENTED (Also it may be not necessary since single instance is working fine with 8 parallel processes)
+TOR_POOL_ENABLED = False  # Launch NUM_TOR_INSTANCES separate Tor processes and give every worker its own one
+NUM_TOR_INSTANCES = 10
+TOR_POOL_SOCKS_BASE_PORT = 9060  # Instance i listens on TOR_POOL_SOCKS_BASE_PORT + i
+TOR_POOL_CONTROL_BASE_PORT = 9160  # Instance i is controlled on TOR_POOL_CONTROL_BASE_PORT + i
+TOR_POOL_DATA_FOLDER = "tor_data"  # Every instance gets its own data directory in here
+TOR_BOOTSTRAP_TIMEOUT = 120
+TOR_STOP_TIMEOUT = 10  # Seconds Tor gets to shut down after SIGTERM before it is killed
 TOR_PORT = 9050
 TOR_HOST = "127.0.0.1"
 TOR_CONTROL_PORT = 9051
@@ -30,9 +97,52 @@ TOR_PATH = r"C:\\tor-14.0.7\\tor\\tor.exe"
 TOR_PROXY = f"socks5://{TOR_HOST}:{TOR_PORT}"
 TOR_IP_CHECKER_URL = "https://check.torproject.org/api/ip"
 TOR_PROXIES = {  "http": TOR_PROXY,  "https": TOR_PROXY  }
+TOR_ISOLATE_STREAMS = True  # Unique SOCKS credentials per RequestService, Tor's IsolateSOCKSAuth gives each one its own circuit
+TOR_CIRCUIT_LATENCY_FACTOR = 3  # Roll the circuit when a request is this many times slower than the running average...
+TOR_CIRCUIT_MIN_SLOW_SECONDS = 10  # ...and slower than this
+
+# Plain HTTP fetch settings (tried before falling back to SeleniumBase)
+HTTP_FETCH_ENABLED = True
+HTTP_TIMEOUT = 20
+HTTP_POOL_SIZE = 10
+HTTP_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36"
+HTTP_CHALLENGE_MARKERS = ("challenge-platform", "cf-chl", "cf-turnstile", "Just a moment...")
+BROWSER_FALLBACK_ENABLED = True  # Escalate pages the HTTP path couldn't get to SeleniumBase
+
+# HTTP response cache (shared by all runs) for the pages that barely change between them
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_FILE = "output/cache/http_cache.db"
+HTTP_CACHE_MAX_MB = 200  # Least recently used pages are evicted past this size
+HTTP_CACHE_TTLS = [  # (URL regex, seconds), the first match wins, URLs matching none aren't cached
+    (r"^https://www\.mobile\.bg/obiavi/avtomobili-dzhipove/[^/?]+$", 24 * 3600),  # BASE_URL and brand pages
+]
+HTTP_CACHE_FORCE_REFRESH = False  # Ignore cached pages (they are still refreshed), same as refresh_cache=True
+
+# Adaptive rate control (AIMD), per worker and proxy in the Pool engine, per crawler in the async engine
+ADAPTIVE_RATE_ENABLED = True
+ADAPTIVE_WINDOW = 20  # Results judged together before the limit is raised
+ADAPTIVE_TARGET_LATENCY = 8  # Seconds, a window slower than this on average doesn't raise the limit
+ADAPTIVE_MAX_ERROR_RATE = 0.25  # A window with more failed (not blocked) requests than this doesn't raise the limit
+ADAPTIVE_DECREASE_FACTOR = 0.5
+ADAPTIVE_DECREASE_COOLDOWN = 10  # Seconds between two cuts, so one burst of blocks counts once
+ADAPTIVE_BLOCK_STATUSES = (403, 429)  # Responses treated like a captcha, a 503 only when it is a challenge page
+WORKER_INITIAL_RATE = 1.0  # Requests/sec of a Pool worker
+WORKER_MIN_RATE = 0.5
+WORKER_MAX_RATE = 5.0
+WORKER_RATE_INCREASE = 0.25
+BACKOFF_BASE = 1  # Seconds, failed attempts and blocks in a row wait random(0, BACKOFF_BASE * 2^n)
+BACKOFF_MAX = 60
+
+# Async crawler settings
+ASYNC_MAX_CONCURRENCY = 200  # Requests in flight across the whole crawler
+ASYNC_PER_HOST_LIMIT = 50  # Requests in flight per host
+ASYNC_INITIAL_CONCURRENCY = 20  # Starting point of the adaptive limit, which grows up to ASYNC_MAX_CONCURRENCY
+ASYNC_CONCURRENCY_INCREASE = 5
+ASYNC_BROWSER_FALLBACK = True  # Escalate unusable responses to a single SeleniumBase driver thread
 
 # NYM settings
 NYM_CLIENT_PORT = 1081
+NYM_STARTUP_TIMEOUT = 60
 NYM_USE_REPLY_SUBS = "true"
 NYM_CLIENT_ID = "mobilebg_client_1"
 NYM_CLIENT_PATH = os.path.join(os.getcwd(), "src", "nym-socks5-client.exe")
@@ -44,4 +154,16 @@ SELENIUMBASE_INCOGNITO_MODE = True
 SELENIUMBASE_HEADLESS_MODE = True
 SELENIUMBASE_DISABLE_CSR_MODE = True
 SELENIUMBASE_DISPLAY_WIDTH = 1920
-SELENIUMBASE_DISPLAY_HEIGHT = 1080
\ No newline at end of file
+SELENIUMBASE_DISPLAY_HEIGHT = 1080
+SELENIUMBASE_REUSE_DRIVER = True  # Keep one warm driver per worker process instead of a new Chrome per page
+SELENIUMBASE_MAX_PAGES_PER_DRIVER = 50  # Recycle the driver after this many pages
+SELENIUMBASE_MAX_DRIVER_AGE = 600  # Recycle the driver after this many seconds
+SELENIUMBASE_LEAN_MODE = True  # Block images/fonts/media/trackers, eager page loads, wait for the content instead of scrolling
+SELENIUMBASE_WAIT_TIMEOUT = 10  # Seconds to wait for the .ads2023/.ad2023/.marki container in lean mode
+SELENIUMBASE_BLOCKED_URLS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3",
+    "*googletagmanager.com*", "*google-analytics.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*adservice.google.com*", "*facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*gemius.pl*",
+]
\ No newline at end of file
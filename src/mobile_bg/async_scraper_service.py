@@ -0,0 +1,216 @@
+import asyncio
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from config import NUM_WORKERS, POST_DEDUP_ENABLED, POST_DEDUP_REVISIT_CHANGED, KNOWN_POSTS_DBS, SHARDING_ENABLED, \
+    ASYNC_MAX_CONCURRENCY
+from src.mobile_bg.db_service import write_posts_batch, touch_item
+from src.mobile_bg.post_index import PostIndex
+from src.mobile_bg.query_shards import shard_url, needs_sharding, split_shard
+from src.mobile_bg.parser_service import parse_listings, parse_post, parse_listings_page, extract_post_number, \
+    LISTINGS_PAGE_MARKERS, POST_PAGE_MARKERS
+from src.shared.service.async_request_service import AsyncRequestService
+from src.shared.service.logger_service import LoggingService
+from src.shared.service.metrics_service import timed, paused_for_fork
+from src.shared.utils.db_writer import DbWriter
+from src.shared.service.archive_service import create_archive_database, archive_item, write_archive_batch, \
+    get_archive_stats
+
+logger = LoggingService().initialize_logger()
+
+# Posts are drained first, like the frontier tasks of the Pool engine, so the job queue stays small
+JOB_PRIORITIES = {"model": 1, "page": 2, "post": 3}
+
+def crawl_listings(proxy, models, posts_file, archive_file=None):
+    """
+    Asyncio alternative to the Pool based phase 3.
+    Listing and post pages of all models are fetched concurrently from this process by ASYNC_MAX_CONCURRENCY worker
+    tasks sharing one job queue, HTML is parsed in a process pool and posts are written in batches by a single DbWriter.
+    With an archive_file every fetched page is also kept there.
+    """
+    asyncio.run(__crawl_listings(proxy, models, posts_file, archive_file))
+
+async def __crawl_listings(proxy, models, posts_file, archive_file=None):
+    writer = DbWriter(posts_file, write_posts_batch)
+    archive_writer = None
+    if archive_file:
+        create_archive_database(archive_file)
+        archive_writer = DbWriter(archive_file, write_archive_batch)
+
+    try:
+        with ProcessPoolExecutor(max_workers=NUM_WORKERS) as parsers:
+            # The parsers are forked on the first job, before any thread of this process is started
+            with paused_for_fork():
+                parsers.submit(int).result()
+            writer.start()
+            if archive_writer:
+                archive_writer.start()
+
+            async with AsyncRequestService(proxy) as client:
+                post_index = PostIndex.load([posts_file, *KNOWN_POSTS_DBS]) if POST_DEDUP_ENABLED else None
+                crawler = _Crawler(client, parsers, writer, post_index, archive_writer)
+
+                await crawler.run(models)
+
+                logger.info(f"📊 Fetch path stats: {client.get_fetch_stats()} 📊")
+    finally:
+        writer.stop()
+        if archive_writer:
+            archive_writer.stop()
+            logger.info(f"📦 Archive: {get_archive_stats(archive_file)} 📦")
+
+class _Crawler:
+    def __init__(self, client, parsers, writer, post_index=None, archive_writer=None):
+        self.client = client
+        self.parsers = parsers
+        self.writer = writer
+        self.post_index = post_index
+        self.archive_writer = archive_writer
+        self.seen_urls = set()
+        self.jobs = asyncio.PriorityQueue()
+        self.job_ids = itertools.count()
+
+    async def run(self, models, workers=ASYNC_MAX_CONCURRENCY):
+        """
+        Crawls the models with a fixed number of worker tasks, models, pages and posts are queued as jobs
+        instead of all becoming coroutines up front.
+        """
+        for model in models:
+            self.__submit("model", model)
+
+        tasks = [asyncio.create_task(self.__work()) for _ in range(workers)]
+        try:
+            await self.jobs.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def __submit(self, kind, *args):
+        # The job id keeps the queue in submission order within a priority (and never compares the dicts)
+        self.jobs.put_nowait((-JOB_PRIORITIES[kind], next(self.job_ids), kind, args))
+
+    async def __work(self):
+        handlers = {"model": self.crawl_model, "page": self.crawl_page, "post": self.crawl_post}
+
+        while True:
+            _, _, kind, args = await self.jobs.get()
+            try:
+                await handlers[kind](*args)
+            except Exception as e:
+                logger.warn(f"❌ Failed {kind} job: {e} ❌")
+            finally:
+                self.jobs.task_done()
+
+    async def __run(self, executor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    async def __put(self, writer, item):
+        # DbWriter.put blocks while the writer's queue is full, which must not stall the event loop
+        await self.__run(None, writer.put, item)
+
+    async def __fetch(self, url, expected_markers, kind, meta):
+        html, fetch_path, status = await self.client.fetch_page_with_path(url, expected_markers)
+
+        if html and self.archive_writer:
+            # zlib releases the GIL, so compressing on the default thread pool keeps the event loop free
+            item = await self.__run(None, archive_item, url, html, kind, fetch_path, status, meta)
+            await self.__put(self.archive_writer, item)
+
+        return html
+
+    @staticmethod
+    def __payload(model, shard=None):
+        # Same payload as the frontier tasks of the Pool engine, so archived pages re-parse the same way
+        payload = {"brand_name": model["brand_name"], "model_name": model["name"]}
+        if shard:
+            payload.update({"model_url": model["url"], "shard": shard})
+        return payload
+
+    async def crawl_model(self, model, shard=None):
+        brand_name = model["brand_name"]
+        model_name = model["name"]
+        model_url = model["url"]
+
+        try:
+            first_page = await self.__fetch(shard_url(model_url, shard), LISTINGS_PAGE_MARKERS, "listings",
+                                            self.__payload(model, shard))
+            if not first_page:
+                logger.warn(f"❌ Failed to fetch first page of {model_name}. Skipping. ❌")
+                return
+
+            with timed("parse_listings", engine="async"):
+                last_page, first_page_listings = await self.__run(self.parsers, parse_listings_page, first_page, brand_name, model_name)
+            logger.info(f"📌 Last page found for {brand_name} - {model_name}{f' {shard}' if shard else ''}: {last_page} 📌")
+
+            if SHARDING_ENABLED and needs_sharding(last_page, None if shard else model.get("count"),
+                                                   len(first_page_listings)):
+                shards = split_shard(shard)
+                if shards:
+                    logger.info(f"🧩 Splitting {model_name} into shards: {shards} 🧩")
+                    for new_shard in shards:
+                        self.__submit("model", model, new_shard)
+                    return
+                logger.warn(f"⚠️ {brand_name} - {model_name} {shard} can't be split further, some listings are unreachable ⚠️")
+
+            for page_number in range(2, last_page + 1):
+                self.__submit("page", model, shard_url(model_url, shard, page_number), shard)
+            await self.crawl_posts(model, first_page_listings)
+
+            logger.info(f"✅ Queued listings for {brand_name} - {model_name}. ✅")
+
+        except Exception as e:
+            logger.warn(f"❌ Failed to scrape listings for {brand_name}: {e} ❌")
+
+    async def crawl_page(self, model, page_url, shard=None):
+        html = await self.__fetch(page_url, LISTINGS_PAGE_MARKERS, "listings", self.__payload(model, shard))
+
+        if not html:
+            logger.warn(f"❌ Failed to fetch page {page_url}. Skipping. ❌")
+            return
+
+        with timed("parse_listings", engine="async"):
+            page_listings = await self.__run(self.parsers, parse_listings, html, model["brand_name"], model["name"])
+
+        await self.crawl_posts(model, page_listings)
+
+    async def crawl_posts(self, model, listings):
+        listings = [listing for listing in listings if listing["url"] not in self.seen_urls]
+        self.seen_urls.update(listing["url"] for listing in listings)
+
+        if self.post_index is not None:
+            fetched, skipped = [], []
+            for listing in listings:
+                (fetched if self.post_index.should_fetch(listing, POST_DEDUP_REVISIT_CHANGED) else skipped).append(listing)
+
+            if skipped:
+                # Known posts still on the listing pages aren't fetched again, only marked as seen
+                await self.__put(self.writer, touch_item(extract_post_number(listing["url"]) for listing in skipped))
+            listings = fetched
+
+        for listing in listings:
+            self.__submit("post", model, listing)
+
+    async def crawl_post(self, model, listing):
+        post_url = listing["url"]
+
+        try:
+            payload = {
+                **self.__payload(model),
+                "listing": {key: listing.get(key) for key in ("title", "price", "image")},
+                "update_existing": self.post_index is not None and self.post_index.is_known(listing)
+            }
+            html = await self.__fetch(post_url, POST_PAGE_MARKERS, "post", payload)
+
+            if not html:
+                logger.warn(f"❌ Failed to fetch post: {post_url} ❌")
+                return
+
+            with timed("parse_post", engine="async"):
+                post_details = await self.__run(self.parsers, parse_post, html, post_url, model["brand_name"], model["name"])
+            post_details["listing"] = payload["listing"]
+            post_details["update_existing"] = payload["update_existing"]
+            await self.__put(self.writer, post_details)
+
+        except Exception:
+            logger.warn(f"❌ Failed to fetch post: {post_url} ❌")
\ No newline at end of file
@@ -2,7 +2,8 @@ import random
 import time
 from typing import List, Dict
 
-from src.shared.utils.db_util import init_db, insert_dict, insert_batch_dicts, fetch_all, fetch_one
+from src.shared.utils.db_util import init_db, insert_dict, upsert_dict, insert_batch_dicts, fetch_all, fetch_one, \
+    execute, add_missing_columns
 from src.shared.service.logger_service import LoggingService
 
 logger = LoggingService().initialize_logger()
@@ -49,6 +50,31 @@ POSTS_DB_SCHEMA="""
             extra TEXT,
             FOREIGN KEY (post_number) REFERENCES listings(post_number) ON DELETE CASCADE
         );
+
+        -- What the listing page showed for the post when it was stored, used to skip unchanged posts next time
+        CREATE TABLE IF NOT EXISTS seen_listings (
+            post_number TEXT PRIMARY KEY,
+            title TEXT,
+            price TEXT,
+            image TEXT,
+            last_seen REAL,
+            first_seen REAL,
+            removed_at REAL
+        );
+
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_number TEXT,
+            previous_price TEXT,
+            price TEXT,
+            changed_at REAL
+        );
+
+        CREATE INDEX IF NOT EXISTS images_post_number ON images (post_number);
+        CREATE INDEX IF NOT EXISTS car_parameters_post_number ON car_parameters (post_number);
+        CREATE INDEX IF NOT EXISTS technical_data_post_number ON technical_data (post_number);
+        CREATE INDEX IF NOT EXISTS extras_post_number ON extras (post_number);
+        CREATE INDEX IF NOT EXISTS price_history_post_number ON price_history (post_number);
         """
 
 BRANDS_DB_SCHEMA = """
@@ -66,11 +92,16 @@ CREATE TABLE IF NOT EXISTS models (
     count INTEGER DEFAULT 0,
     FOREIGN KEY (brand_name) REFERENCES brands(name) ON DELETE CASCADE
 );
+
+-- Brands.db files from before the unique index can hold the models of a brand task that ran twice
+DELETE FROM models WHERE id NOT IN (SELECT MIN(id) FROM models GROUP BY brand_name, url);
+CREATE UNIQUE INDEX IF NOT EXISTS models_brand_url ON models (brand_name, url);
 """
 
 # Create Database + Tables queries
 def create_posts_database(file):
     init_db(file, POSTS_DB_SCHEMA)
+    add_missing_columns(file, "seen_listings", {"first_seen": "REAL", "removed_at": "REAL"})
     logger.info(f"✅ Database created at: {file}")
 
 def create_brands_database(file: str):
@@ -81,37 +112,7 @@ def create_brands_database(file: str):
 def insert_post(file, data, retries=5, delay=0.5):
     for attempt in range(retries):
         try:
-            insert_dict(file,"listings", {
-                "post_number": data["post_number"],
-                "brand": data["brand"],
-                "model": data["model"],
-                "title": data["title"],
-                "link": data["link"],
-                "subtitle": data["subtitle"],
-                "location": data["location"],
-                "current_price": data["current_price"],
-                "additional_info": data["additional_info"]
-            })
-
-            insert_batch_dicts(file, "images", [
-                {"post_number": data["post_number"], "image_url": img}
-                for img in data.get("images", [])
-            ])
-
-            insert_batch_dicts(file, "car_parameters", [
-                {"post_number": data["post_number"], "key": k, "value": v}
-                for k, v in data.get("car_parameters", {}).items()
-            ])
-
-            insert_batch_dicts(file, "technical_data", [
-                {"post_number": data["post_number"], "key": k, "value": v}
-                for k, v in data.get("technical_data", {}).items()
-            ])
-
-            insert_batch_dicts(file, "extras", [
-                {"post_number": data["post_number"], "extra": extra}
-                for extra in data.get("extras", [])
-            ])
+            __insert_post_rows(file, data)
 
             logger.info(f"✅ Inserted post: {data['title']} ({data['post_number']})")
             return
@@ -121,6 +122,131 @@ def insert_post(file, data, retries=5, delay=0.5):
 
     logger.warn(f"Failed to insert post: {data['title']} ({data['post_number']}) after {retries} retries.")
 
+def write_posts_batch(conn, posts) -> int:
+    """
+    Writes a batch of posts on an open connection, used by the DB writer to store many posts in one transaction.
+    Returns the number of rows written.
+    """
+    rows = 0
+    for data in posts:
+        if "touch" in data:
+            rows += touch_seen_listings(None, data["touch"], conn)
+        else:
+            rows += __insert_post_rows(None, data, conn)
+
+    return rows
+
+def touch_item(post_numbers):
+    """
+    DB writer item that marks posts as still listed without storing them again.
+    """
+    return {"touch": list(post_numbers)}
+
+def touch_seen_listings(file, post_numbers, conn=None) -> int:
+    now = time.time()
+    for post_number in post_numbers:
+        execute(file, "UPDATE seen_listings SET last_seen = ?, removed_at = NULL WHERE post_number = ?",
+                (now, post_number), conn=conn)
+    return len(post_numbers)
+
+def mark_removed_listings(file, seen_before, skipped_models=()) -> int:
+    """
+    Marks every post that no listing page showed since seen_before as removed, returns how many were marked.
+    The posts of skipped_models ((brand, model) whose listings weren't all reachable) are left alone.
+    """
+    condition = "last_seen < ? AND removed_at IS NULL"
+    params = (seen_before,)
+    for brand, model in skipped_models:
+        condition += " AND post_number NOT IN (SELECT post_number FROM listings WHERE brand = ? AND model = ?)"
+        params += (brand, model)
+
+    count = fetch_one(file, f"SELECT COUNT(*) FROM seen_listings WHERE {condition}", params)[0]
+    execute(file, f"UPDATE seen_listings SET removed_at = ? WHERE {condition}", (time.time(), *params))
+    return count
+
+def __delete_post_rows(file, post_number, conn=None):
+    for table in ("images", "car_parameters", "technical_data", "extras", "listings"):
+        execute(file, f"DELETE FROM {table} WHERE post_number = ?", (post_number,), conn=conn)
+
+def __insert_post_rows(file, data, conn=None) -> int:
+    # A post that is stored again (a changed post that was revisited, a post listed under two models, a task retried
+    # after its post was written...) replaces what was stored for it instead of appending its child rows a second time
+    if data.get("update_existing") or fetch_one(file, "SELECT 1 FROM listings WHERE post_number = ?",
+                                                 (data["post_number"],), conn=conn):
+        __delete_post_rows(file, data["post_number"], conn)
+
+    insert_dict(file,"listings", {
+        "post_number": data["post_number"],
+        "brand": data["brand"],
+        "model": data["model"],
+        "title": data["title"],
+        "link": data["link"],
+        "subtitle": data["subtitle"],
+        "location": data["location"],
+        "current_price": data["current_price"],
+        "additional_info": data["additional_info"]
+    }, conn=conn)
+
+    images = [
+        {"post_number": data["post_number"], "image_url": img}
+        for img in data.get("images", [])
+    ]
+    insert_batch_dicts(file, "images", images, conn=conn)
+
+    car_parameters = [
+        {"post_number": data["post_number"], "key": k, "value": v}
+        for k, v in data.get("car_parameters", {}).items()
+    ]
+    insert_batch_dicts(file, "car_parameters", car_parameters, conn=conn)
+
+    technical_data = [
+        {"post_number": data["post_number"], "key": k, "value": v}
+        for k, v in data.get("technical_data", {}).items()
+    ]
+    insert_batch_dicts(file, "technical_data", technical_data, conn=conn)
+
+    extras = [
+        {"post_number": data["post_number"], "extra": extra}
+        for extra in data.get("extras", [])
+    ]
+    insert_batch_dicts(file, "extras", extras, conn=conn)
+
+    rows = 1 + len(images) + len(car_parameters) + len(technical_data) + len(extras)
+
+    listing = data.get("listing")
+    if listing:
+        rows += __upsert_seen_listing(file, data["post_number"], listing, conn)
+
+    return rows
+
+def __upsert_seen_listing(file, post_number, listing, conn=None) -> int:
+    now = time.time()
+    rows = 1
+
+    previous = fetch_one(file, "SELECT price, first_seen FROM seen_listings WHERE post_number = ?", (post_number,), conn=conn)
+    previous_price, first_seen = previous if previous else (None, None)
+
+    if previous_price is not None and previous_price != listing.get("price"):
+        insert_dict(file, "price_history", {
+            "post_number": post_number,
+            "previous_price": previous_price,
+            "price": listing.get("price"),
+            "changed_at": now
+        }, conn=conn)
+        rows += 1
+
+    upsert_dict(file, "seen_listings", {
+        "post_number": post_number,
+        "title": listing.get("title"),
+        "price": listing.get("price"),
+        "image": listing.get("image"),
+        "last_seen": now,
+        "first_seen": first_seen or now,
+        "removed_at": None
+    }, conn=conn)
+
+    return rows
+
 def insert_brand(file: str, brand: dict):
     insert_dict(file, "brands", {
         "name": brand["name"],
@@ -158,6 +284,22 @@ def insert_models_bulk(db_path: str, brand_name: str, models: List[Dict[str, str
     insert_batch_dicts(db_path, "models", model_records)
 
 # Fetch queries
+def fetch_seen_listings(db_path: str):
+    """
+    Yields (post_number, title, price) for every stored post. Databases from before seen_listings existed
+    only know the post numbers, title and price are None for those.
+    """
+    tables = {row[0] for row in fetch_all(db_path, "SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    if "seen_listings" in tables:
+        yield from fetch_all(db_path, "SELECT post_number, title, price FROM seen_listings")
+
+    if "listings" in tables:
+        query = "SELECT post_number, NULL, NULL FROM listings"
+        if "seen_listings" in tables:
+            query += " WHERE post_number NOT IN (SELECT post_number FROM seen_listings)"
+        yield from fetch_all(db_path, query)
+
 def fetch_all_brands(db_path: str):
     rows = fetch_all(db_path, "SELECT name, url, count FROM brands")
     return [{"name": name, "url": url, "count": count} for name, url, count in rows]
@@ -166,8 +308,8 @@ def get_brands_count(db_path: str) -> int:
     result = fetch_one(db_path, "SELECT COUNT(*) FROM brands")
     return result[0] if result else 0
 
-def fetch_all_models(db_path: str) -> List[Dict[str, str]]:
-    rows = fetch_all(db_path, "SELECT brand_name, name, url, count FROM models")
+def fetch_all_models(db_path: str, largest_first: bool = False) -> List[Dict[str, str]]:
+    rows = fetch_all(db_path, "SELECT brand_name, name, url, count FROM models" + (" ORDER BY count DESC" if largest_first else ""))
 
     return [
         {
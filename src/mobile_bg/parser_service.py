@@ -1,9 +1,51 @@
 import re
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+
+from config import PARSER_BACKEND, PARSER_FOCUSED_POST
+
+# Markers every page type must contain to be parsable, used to validate responses before parsing
+BRANDS_PAGE_MARKERS = ("marki",)
+LISTINGS_PAGE_MARKERS = ("ads2023",)
+POST_PAGE_MARKERS = ("ad2023",)
+
+# mobile.bg links are protocol relative ("//www.mobile.bg/..."), the offline benchmark serves them over plain http
+URL_SCHEME = "https:"
+
+def __resolve_backend(backend):
+    if backend == "lxml":
+        try:
+            import lxml
+        except ImportError:
+            print("⚠️ lxml is not installed, falling back to html.parser")
+            return "html.parser"
+    return backend
+
+PARSER_FEATURES = __resolve_backend(PARSER_BACKEND)
+
+POST_NUMBER_PATTERN = re.compile(r"obiava-(\d+)")
+
+# Everything parse_post reads is inside this container, the rest of the page doesn't need a tree
+POST_STRAINER = SoupStrainer("div", class_="ad2023")
+
+def make_soup(html, features=None, parse_only=None):
+    """
+    Builds the tree with the configured backend. Already parsed soups are passed through,
+    so one parse can be shared by several parse functions.
+    """
+    if isinstance(html, BeautifulSoup):
+        return html
+    return BeautifulSoup(html, features or PARSER_FEATURES, parse_only=parse_only)
+
+def extract_post_number(url):
+    """
+    Post number from a post URL (".../obiava-11738475928374651-audi-a4"), None if the URL doesn't contain one.
+    """
+    match = POST_NUMBER_PATTERN.search(url or "")
+    return match.group(1) if match else None
 
 def parse_brands(html):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     brands = []
 
     for brand in soup.select(".marki nobr a"):
@@ -13,7 +55,7 @@ def parse_brands(html):
             continue
 
         count = brand.find("n").text.strip().replace("(", "").replace(")", "")
-        url = "https:" + brand["href"]
+        url = URL_SCHEME + brand["href"]
         brands.append({"name": name, "url": url, "count": count})
 
     brands.sort(key=lambda x: x["count"], reverse=True)
@@ -21,7 +63,7 @@ def parse_brands(html):
     return brands
 
 def parse_models(html):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
 
     marki_divs = soup.find_all("div", class_="marki")
 
@@ -39,13 +81,13 @@ def parse_models(html):
             continue
 
         count = model.find("n").text.strip().replace("(", "").replace(")", "")
-        url = "https:" + model["href"]
+        url = URL_SCHEME + model["href"]
         models.append({"name": name, "url": url, "count": count})
 
     return models
 
 def extract_last_page(html):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
 
     pagination = soup.select_one(".pagination")
 
@@ -70,7 +112,7 @@ def extract_last_page(html):
     return 1
 
 def parse_listings(html, brand, model):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     listings = []
 
     for item in soup.select(".ads2023 .item"):
@@ -78,7 +120,7 @@ def parse_listings(html, brand, model):
             break
 
         try:
-            post_url = "https:" + item.select_one(".zaglavie a.title")["href"]
+            post_url = URL_SCHEME + item.select_one(".zaglavie a.title")["href"]
 
             title = item.select_one(".zaglavie a.title").text.strip()
 
@@ -86,7 +128,7 @@ def parse_listings(html, brand, model):
             price = price_element.text.strip() if price_element else "N/A"
 
             image_element = item.select_one(".photo .big img")
-            image_url = "https:" + image_element["src"] if image_element else None
+            image_url = URL_SCHEME + image_element["src"] if image_element else None
 
             listings.append({
                 "brand": brand,
@@ -104,12 +146,12 @@ def parse_listings(html, brand, model):
     if shortlist_container:
         for item in shortlist_container.select(".item"):
             try:
-                post_url = "https:" + item.select_one(".zaglavie a.title")["href"]
+                post_url = URL_SCHEME + item.select_one(".zaglavie a.title")["href"]
                 title = item.select_one(".zaglavie a.title").text.strip()
                 price_element = item.select_one(".price div")
                 price = price_element.text.strip() if price_element else "N/A"
                 image_element = item.select_one(".photo .big img")
-                image_url = "https:" + image_element["src"] if image_element else None
+                image_url = URL_SCHEME + image_element["src"] if image_element else None
 
                 listings.append({
                     "title": title,
@@ -123,8 +165,15 @@ def parse_listings(html, brand, model):
 
     return listings
 
-def parse_post(html, url, brand, model):
-    soup = BeautifulSoup(html, 'html.parser')
+def parse_listings_page(html, brand, model):
+    """
+    Parses a listings page once and returns both its last page number and its listings.
+    """
+    soup = make_soup(html)
+    return extract_last_page(soup), parse_listings(soup, brand, model)
+
+def parse_post(html, url, brand, model, focused=PARSER_FOCUSED_POST):
+    soup = make_soup(html, parse_only=POST_STRAINER if focused else None)
 
     wrapper = soup.select_one(".ad2023")
 
@@ -189,7 +238,7 @@ def parse_post(html, url, brand, model):
         for img in image_divs:
             img_url = img.get("src")
             if img_url:
-                full_url = f"https:{img_url}"
+                full_url = f"{URL_SCHEME}{img_url}"
                 images.append(full_url)
 
     car_params_div = left.select_one(".mainCarParams")
@@ -205,10 +254,9 @@ def parse_post(html, url, brand, model):
     if tech_data_div:
         tech_items = tech_data_div.select(".item")
         for item in tech_items:
-            key_div = item.select("div")[0] if len(item.select("div")) > 0 else None
-            value_div = item.select("div")[1] if len(item.select("div")) > 1 else None
-            if key_div and value_div:
-                technical_data[key_div.text.strip()] = value_div.text.strip()
+            divs = item.select("div")
+            if len(divs) > 1:
+                technical_data[divs[0].text.strip()] = divs[1].text.strip()
 
     more_info_div = left.select_one(".moreInfo .text")
     if more_info_div:
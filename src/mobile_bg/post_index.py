@@ -0,0 +1,75 @@
+import os
+import zlib
+from array import array
+from bisect import bisect_left
+
+from src.mobile_bg.db_service import fetch_seen_listings
+from src.mobile_bg.parser_service import extract_post_number
+from src.shared.service.logger_service import LoggingService
+
+logger = LoggingService().initialize_logger()
+
+UNKNOWN_SIGNATURE = -1
+
+
+def listing_signature(title, price):
+    if title is None and price is None:
+        return UNKNOWN_SIGNATURE
+    return zlib.crc32(f"{title}|{price}".encode("utf-8"))
+
+class PostIndex:
+    """
+    Compact, read-only index of already stored posts: two sorted int64 arrays (post number and a CRC of the
+    listing page title/price), about 16 bytes per post, so every worker can hold millions of them.
+    """
+
+    def __init__(self, entries=()):
+        pairs = sorted((int(post_number), signature) for post_number, signature in entries)
+        self.post_numbers = array("q", (post_number for post_number, _ in pairs))
+        self.signatures = array("q", (signature for _, signature in pairs))
+
+    def __len__(self):
+        return len(self.post_numbers)
+
+    @classmethod
+    def load(cls, db_paths):
+        entries = []
+        for db_path in db_paths:
+            if not db_path or not os.path.exists(db_path):
+                continue
+            for post_number, title, price in fetch_seen_listings(db_path):
+                if post_number and post_number.isdigit():
+                    entries.append((post_number, listing_signature(title, price)))
+
+        index = cls(entries)
+        logger.info(f"📚 Loaded {len(index)} known posts from {len(db_paths)} database(s) 📚")
+        return index
+
+    def get_signature(self, post_number):
+        post_number = int(post_number)
+        position = bisect_left(self.post_numbers, post_number)
+        if position < len(self.post_numbers) and self.post_numbers[position] == post_number:
+            return self.signatures[position]
+        return None
+
+    def is_known(self, listing):
+        post_number = extract_post_number(listing["url"])
+        return post_number is not None and self.get_signature(post_number) is not None
+
+    def should_fetch(self, listing, revisit_changed=True):
+        """
+        True for posts that are not stored yet and, with revisit_changed, for stored posts whose
+        title or price on the listing page changed since.
+        """
+        post_number = extract_post_number(listing["url"])
+        if post_number is None:
+            return True
+
+        signature = self.get_signature(post_number)
+        if signature is None:
+            return True
+
+        if not revisit_changed or signature == UNKNOWN_SIGNATURE:
+            return False
+
+        return signature != listing_signature(listing.get("title"), listing.get("price"))
\ No newline at end of file
@@ -0,0 +1,58 @@
+import math
+from urllib.parse import urlencode
+
+from config import MOBILE_BG_MAX_PAGES, MOBILE_BG_LISTINGS_PER_PAGE, SHARD_YEAR_RANGE, SHARD_PRICE_RANGE, \
+    SHARD_QUERY_PARAMS
+
+# Dimensions a search is split by, in order: years first, then prices once a shard is down to a single year
+SHARD_DIMENSIONS = (("year", SHARD_YEAR_RANGE), ("price", SHARD_PRICE_RANGE))
+
+
+def shard_url(model_url, shard=None, page=1):
+    """
+    Listing page URL of a model narrowed to the shard's ranges, e.g. {"year": [2010, 2015]}.
+    """
+    url = model_url if page == 1 else f"{model_url}/p-{page}"
+
+    params = {}
+    for dimension, full_range in SHARD_DIMENSIONS:
+        if not shard or dimension not in shard:
+            continue
+
+        low, high = shard[dimension]
+        from_param, to_param = SHARD_QUERY_PARAMS[dimension]
+
+        if low > full_range[0]:
+            params[from_param] = low
+        if high < full_range[1]:
+            params[to_param] = high
+
+    return f"{url}?{urlencode(params)}" if params else url
+
+def needs_sharding(last_page, count=None, first_page_size=None):
+    """
+    True when the search shows the last page mobile.bg paginates to, or when its listing count
+    (only known for whole models) is more than its pages can show.
+    first_page_size is how many listings the parsed first page had, which is the page size whenever there are more pages.
+    """
+    if last_page >= MOBILE_BG_MAX_PAGES:
+        return True
+
+    per_page = first_page_size if first_page_size and last_page > 1 else MOBILE_BG_LISTINGS_PER_PAGE
+    return bool(count) and count > last_page * per_page
+
+def split_shard(shard=None):
+    """
+    Splits the shard in two halves of the first dimension that is still splittable, returns [] when none is.
+    """
+    shard = shard or {}
+
+    for dimension, full_range in SHARD_DIMENSIONS:
+        low, high = shard.get(dimension, full_range)
+        if low >= high:
+            continue
+
+        middle = math.floor((low + high) / 2)
+        return [{**shard, dimension: [low, middle]}, {**shard, dimension: [middle + 1, high]}]
+
+    return []
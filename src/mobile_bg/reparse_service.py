@@ -0,0 +1,109 @@
+import time
+from itertools import islice
+from multiprocessing import Pool
+
+from config import NUM_WORKERS, REPARSE_WINDOW, REPARSE_LOG_INTERVAL
+from src.mobile_bg.db_service import create_posts_database, write_posts_batch
+from src.mobile_bg.parser_service import parse_post, parse_listings_page, extract_post_number
+from src.shared.service.archive_service import iter_archived_pages, read_html
+from src.shared.service.logger_service import LoggingService
+from src.shared.utils.db_writer import DbWriter
+
+logger = LoggingService().initialize_logger()
+
+
+def reparse_archive(archive_file, posts_file):
+    """
+    Rebuilds posts_file from the post pages in archive_file with the current parser, no network involved.
+    Pages are streamed from the archive a window at a time and parsed by a process pool while the previous
+    window is being written, so memory stays flat whatever the size of the archive.
+    The archived listing pages are re-parsed first, what they showed for each post (title, price, image) is what
+    its listing fields are rebuilt from, the payload stored with the post task is only used for posts none of them showed.
+    """
+    create_posts_database(posts_file)
+    writer = DbWriter(posts_file, write_posts_batch)
+
+    stats = {"listing_pages": 0, "pages": 0, "posts": 0, "failed": 0}
+    started_at = time.time()
+
+    try:
+        with Pool(processes=NUM_WORKERS) as pool:
+            # Started after the workers are forked, so none of them inherits the writer thread
+            writer.start()
+
+            # Listing pages are archived in fetch order, so the latest one that showed a post wins
+            listings = {}
+            for page_listings in __map_windows(pool, __reparse_listings_page,
+                                               iter_archived_pages(archive_file, kinds=("listings",))):
+                stats["listing_pages"] += 1
+                if page_listings is None:
+                    stats["failed"] += 1
+                    continue
+                listings.update(page_listings)
+            logger.info(f"📃 Re-parsed {stats['listing_pages']} listing pages, {len(listings)} posts listed 📃")
+
+            last_log = time.time()
+            for post_details in __map_windows(pool, __reparse_post, iter_archived_pages(archive_file, kinds=("post",))):
+                stats["pages"] += 1
+                if post_details is None:
+                    stats["failed"] += 1
+                    continue
+
+                post_details["listing"] = listings.get(extract_post_number(post_details["link"]), post_details["listing"])
+                writer.put(post_details)
+                stats["posts"] += 1
+
+                if time.time() - last_log >= REPARSE_LOG_INTERVAL:
+                    last_log = time.time()
+                    logger.info(f"📊 Re-parsed {stats['pages']} pages ({stats['pages'] / (last_log - started_at):.0f} pages/sec) 📊")
+
+            pool.close()
+            pool.join()
+
+    finally:
+        writer.stop()
+
+    elapsed = time.time() - started_at
+    stats["pages_per_sec"] = round((stats["listing_pages"] + stats["pages"]) / elapsed, 1) if elapsed else 0
+    return stats
+
+def __map_windows(pool, function, pages):
+    """
+    Yields function(page) for every page, REPARSE_WINDOW pages at a time, the next window is parsed while this one is consumed.
+    """
+    pending = pool.map_async(function, list(islice(pages, REPARSE_WINDOW)))
+
+    while True:
+        window = pending.get()
+        if not window:
+            return
+
+        pending = pool.map_async(function, list(islice(pages, REPARSE_WINDOW)))
+        yield from window
+
+def __reparse_listings_page(page):
+    payload = page["meta"]
+
+    try:
+        _, listings = parse_listings_page(read_html(page), payload.get("brand_name"), payload.get("model_name"))
+    except Exception as e:
+        logger.warn(f"❌ Failed to re-parse listings page: {page['url']} - {e} ❌")
+        return None
+
+    return {extract_post_number(listing["url"]): {key: listing.get(key) for key in ("title", "price", "image")}
+            for listing in listings}
+
+def __reparse_post(page):
+    payload = page["meta"]
+
+    try:
+        post_details = parse_post(read_html(page), page["url"], payload.get("brand_name"), payload.get("model_name"))
+    except Exception as e:
+        logger.warn(f"❌ Failed to re-parse post: {page['url']} - {e} ❌")
+        return None
+
+    # Replaced by what the re-parsed listing pages showed for the post, when one of them did
+    post_details["listing"] = payload.get("listing")
+    # A post can be archived more than once (e.g. by incremental runs), the latest fetch replaces the earlier ones
+    post_details["update_existing"] = True
+    return post_details
@@ -1,32 +1,71 @@
 import os
-from multiprocessing import Pool
+from multiprocessing import Pool, Queue
+from queue import Empty
 
 from src.mobile_bg.db_service import *
 from src.shared.service.logger_service import LoggingService
-from src.shared.service.request_service import RequestService
-from src.mobile_bg.parser_service import parse_listings, parse_brands, parse_models, parse_post, extract_last_page
-from config import BASE_URL, NUM_WORKERS, MOBILE_BG_OUTPUT_FOLDER
-from src.shared.utils.tor_proxy_manager import TorManager
+from src.shared.service.request_service import get_request_service, close_request_services
+from src.shared.service.metrics_service import MetricsCollector, init_worker_metrics, timed, observe, push_metrics, \
+    paused_for_fork
+from src.shared.service.cache_service import set_force_refresh, is_force_refresh
+from src.shared.service.archive_service import create_archive_database, archive_item, archive_page, \
+    write_archive_batch, get_archive_stats
+from src.shared.service.frontier_service import create_frontier_database, enqueue_tasks, reset_in_flight, \
+    get_frontier_stats, get_truncated_payloads, FAILED
+from src.shared.service.work_queue_service import create_work_queue, get_worker_id, SqliteWorkQueue, LeaseKeeper, \
+    LeaseLost, ResultQueue
+from src.mobile_bg.parser_service import parse_listings, parse_brands, parse_models, parse_post, parse_listings_page, \
+    extract_post_number, BRANDS_PAGE_MARKERS, LISTINGS_PAGE_MARKERS, POST_PAGE_MARKERS
+from src.mobile_bg.async_scraper_service import crawl_listings
+from src.mobile_bg.reparse_service import reparse_archive
+from src.mobile_bg.post_index import PostIndex
+from src.mobile_bg.query_shards import shard_url, needs_sharding, split_shard
+from config import BASE_URL, NUM_WORKERS, MOBILE_BG_OUTPUT_FOLDER, SCRAPER_ENGINE, TOR_POOL_ENABLED, DB_WRITER_ENABLED, \
+    FRONTIER_IDLE_SLEEP, POST_DEDUP_ENABLED, POST_DEDUP_REVISIT_CHANGED, KNOWN_POSTS_DBS, MOBILE_BG_INCREMENTAL_DB, \
+    SHARDING_ENABLED, ARCHIVE_ENABLED, DEFAULT_RETRIES, HTTP_CACHE_FORCE_REFRESH, METRICS_ENABLED, \
+    PROFILING_ENABLED, WORK_QUEUE_URL, WORK_QUEUE_LEASE, WORK_QUEUE_RESULT_BATCH, WORK_QUEUE_WAIT_TIMEOUT, \
+    WORK_QUEUE_REQUEUE_INTERVAL, PIPELINE_ENABLED
+from src.shared.utils.db_writer import DbWriter
+from src.shared.utils.profiler import WorkerProfiler
+from src.shared.utils.tor_proxy_manager import TorManager, TorPool
 
 logger = LoggingService().initialize_logger()
 
-def scrape_mobile_bg():
-    tor = TorManager()
+# Proxy handed to this worker process by the pool initializer (its own Tor instance when TorPool is used)
+_worker_proxy = None
+# Queue of the DB writer posts are sent to, None when the workers write to posts.db themselves
+_post_queue = None
+# Index of already stored posts, loaded once per worker process on first use
+_post_index = None
+# Queue of the archive writer fetched pages are sent to, None when the process writes to archive.db itself
+_archive_queue = None
+# Aggregates the stage metrics of all pool workers, lives in the main process for the duration of a run
+_metrics_collector = None
+# Heartbeats the lease of the task this worker process runs, handlers check it before storing or enqueuing results
+_lease_keeper = None
+
+def scrape_mobile_bg(engine=SCRAPER_ENGINE, folder=None, refresh_cache=False):
+    """
+    Runs all phases in a new timestamped folder, or resumes the run in the given folder
+    from where its frontier left off. refresh_cache ignores the cached brand and model pages.
+    """
+    tor = __create_tor()
+    set_force_refresh(refresh_cache or HTTP_CACHE_FORCE_REFRESH)
 
     try:
         tor.start()
         proxy = tor.proxies["http"]
 
-        brands_file, posts_file = __setup_output_folders()
+        brands_file, posts_file = __setup_output_folders(folder=folder)
+        __start_metrics(os.path.dirname(brands_file))
 
         __init_databases(brands_file, posts_file)
 
-        __phase_one_brands(proxy, brands_file)
+        if get_brands_count(brands_file) == 0:
+            __phase_one_brands(proxy, brands_file)
 
         if get_brands_count(brands_file) > 0:
-            __phase_two_models(proxy, brands_file)
-
-            __phase_three_listings(proxy, brands_file, posts_file)
+            __phases_two_and_three(proxy, brands_file, posts_file, engine, tor.get_worker_proxies(NUM_WORKERS))
 
         else:
             raise Exception(f"❌ Phase 1: Scraping all brands did not return a response ❌")
@@ -38,19 +77,63 @@ def scrape_mobile_bg():
 
     finally:
         tor.stop()
+        __stop_metrics()
         logger.info("🎉 Scraping completed successfully! 🚀")
         return True
 
 
+def scrape_mobile_bg_incremental(engine=SCRAPER_ENGINE, refresh_cache=False):
+    """
+    Re-crawls the site into the long-lived MOBILE_BG_INCREMENTAL_DB: only new and changed posts are fetched,
+    price changes are appended to price_history and posts no longer listed get their removed_at set.
+    """
+    tor = __create_tor()
+    set_force_refresh(refresh_cache or HTTP_CACHE_FORCE_REFRESH)
+    started_at = time.time()
+
+    try:
+        tor.start()
+        proxy = tor.proxies["http"]
+
+        brands_file, _ = __setup_output_folders()
+        __start_metrics(os.path.dirname(brands_file))
+        posts_file = MOBILE_BG_INCREMENTAL_DB
+        os.makedirs(os.path.dirname(posts_file) or ".", exist_ok=True)
+
+        __init_databases(brands_file, posts_file)
+
+        __phase_one_brands(proxy, brands_file)
+
+        if get_brands_count(brands_file) == 0:
+            raise Exception(f"❌ Phase 1: Scraping all brands did not return a response ❌")
+
+        __phases_two_and_three(proxy, brands_file, posts_file, engine, tor.get_worker_proxies(NUM_WORKERS))
+
+        __mark_removed_posts(brands_file, posts_file, started_at, engine)
+
+    except Exception as e:
+        tor.stop()
+        logger.warn(str(e))
+        return False
+
+    finally:
+        tor.stop()
+        __stop_metrics()
+        logger.info("🎉 Incremental scraping completed successfully! 🚀")
+        return True
+
+
 # Separate functions for each phases
-def scrape_mobile_bg_phase_one_only():
-    tor = TorManager()
+def scrape_mobile_bg_phase_one_only(refresh_cache=False):
+    tor = __create_tor()
+    set_force_refresh(refresh_cache or HTTP_CACHE_FORCE_REFRESH)
 
     try:
         tor.start()
         proxy = tor.proxies["http"]
 
         brands_file, posts_file = __setup_output_folders()
+        __start_metrics(os.path.dirname(brands_file))
 
         __init_databases(brands_file, posts_file)
 
@@ -63,11 +146,13 @@ def scrape_mobile_bg_phase_one_only():
 
     finally:
         tor.stop()
+        __stop_metrics()
         logger.info("🎉 Phase one successfully finished! 🚀")
         return True
 
-def scrape_mobile_bg_phase_two_only(folder: str):
-    tor = TorManager()
+def scrape_mobile_bg_phase_two_only(folder: str, refresh_cache=False):
+    tor = __create_tor()
+    set_force_refresh(refresh_cache or HTTP_CACHE_FORCE_REFRESH)
 
     output_folder = os.path.join(MOBILE_BG_OUTPUT_FOLDER, folder)
 
@@ -79,8 +164,9 @@ def scrape_mobile_bg_phase_two_only(folder: str):
 
         tor.start()
         proxy = tor.proxies["http"]
+        __start_metrics(output_folder)
 
-        __phase_two_models(proxy, brands_file)
+        __phase_two_models(proxy, brands_file, tor.get_worker_proxies(NUM_WORKERS))
 
     except Exception as e:
         tor.stop()
@@ -89,11 +175,12 @@ def scrape_mobile_bg_phase_two_only(folder: str):
 
     finally:
         tor.stop()
+        __stop_metrics()
         logger.info("🎉 Phase one successfully finished! 🚀")
         return True
 
-def scrape_mobile_bg_phase_three_only(folder: str):
-    tor = TorManager()
+def scrape_mobile_bg_phase_three_only(folder: str, engine=SCRAPER_ENGINE):
+    tor = __create_tor()
 
     output_folder = os.path.join(MOBILE_BG_OUTPUT_FOLDER, folder)
 
@@ -103,8 +190,9 @@ def scrape_mobile_bg_phase_three_only(folder: str):
     try:
         tor.start()
         proxy = tor.proxies["http"]
+        __start_metrics(output_folder)
 
-        __phase_three_listings(proxy, brands_file, posts_file)
+        __phase_three_listings(proxy, brands_file, posts_file, engine, tor.get_worker_proxies(NUM_WORKERS))
 
     except Exception as e:
         tor.stop()
@@ -113,14 +201,191 @@ def scrape_mobile_bg_phase_three_only(folder: str):
 
     finally:
         tor.stop()
+        __stop_metrics()
         logger.info("🎉 Phase one successfully finished! 🚀")
         return True
 
 
+def scrape_mobile_bg_coordinator(queue_url=WORK_QUEUE_URL, folder=None, refresh_cache=False):
+    """
+    Coordinator of a distributed crawl: runs phases 1-2 here, publishes the models to the work queue at queue_url
+    and stores the posts the worker nodes (scrape_mobile_bg_worker) send back, until the queue is drained.
+    Resuming a run (folder) keeps the tasks already in the queue.
+    """
+    tor = __create_tor()
+    set_force_refresh(refresh_cache or HTTP_CACHE_FORCE_REFRESH)
+
+    try:
+        tor.start()
+        proxy = tor.proxies["http"]
+
+        brands_file, posts_file = __setup_output_folders(folder=folder)
+        __start_metrics(os.path.dirname(brands_file))
+        __init_databases(brands_file, posts_file)
+
+        if get_brands_count(brands_file) == 0:
+            __phase_one_brands(proxy, brands_file)
+
+        if get_brands_count(brands_file) > 0:
+            __phase_two_models(proxy, brands_file, tor.get_worker_proxies(NUM_WORKERS))
+
+            __coordinate_phase_three(queue_url, brands_file, posts_file, resume=folder is not None)
+
+        else:
+            raise Exception(f"❌ Phase 1: Scraping all brands did not return a response ❌")
+
+    except Exception as e:
+        tor.stop()
+        logger.warn(str(e))
+        return False
+
+    finally:
+        tor.stop()
+        __stop_metrics()
+        logger.info("🎉 Distributed scraping completed successfully! 🚀")
+        return True
+
+def scrape_mobile_bg_worker(queue_url=WORK_QUEUE_URL, refresh_cache=False):
+    """
+    Worker node of a distributed crawl: claims model, page and post tasks from the work queue at queue_url through
+    its own Tor until the queue is drained. Posts go back to the coordinator, the archive, metrics and profiles
+    stay in a local timestamped folder.
+    """
+    tor = __create_tor()
+    set_force_refresh(refresh_cache or HTTP_CACHE_FORCE_REFRESH)
+
+    try:
+        tor.start()
+        proxy = tor.proxies["http"]
+
+        brands_file, _ = __setup_output_folders()
+        __start_metrics(os.path.dirname(brands_file))
+
+        __wait_for_tasks(queue_url)
+        logger.info(f"🛠️ Working on {queue_url} as {get_worker_id()}... 🛠️")
+
+        __run_frontier_workers(proxy, ("model", "page", "post"), brands_file, None, tor.get_worker_proxies(NUM_WORKERS),
+                               queue_url=queue_url)
+
+    except Exception as e:
+        tor.stop()
+        logger.warn(str(e))
+        return False
+
+    finally:
+        tor.stop()
+        __stop_metrics()
+        logger.info("🎉 Worker finished, the work queue is drained! 🚀")
+        return True
+
+
+def reparse_mobile_bg_from_archive(folder: str, posts_file_name: str = None):
+    """
+    Rebuilds the posts of a run from its archive.db with the current parser into a new posts database
+    in the same folder, without Tor or Chrome.
+    """
+    output_folder = os.path.join(MOBILE_BG_OUTPUT_FOLDER, folder)
+    archive_file = os.path.join(output_folder, "archive.db")
+    posts_file = os.path.join(output_folder, posts_file_name or f"posts_reparsed_{time.strftime('%Y-%m-%d_%H-%M-%S')}.db")
+
+    try:
+        if not os.path.exists(archive_file):
+            raise FileNotFoundError(f"❌ Archive file not found: {archive_file} ❌")
+
+        logger.info(f"🔁 Re-parsing {archive_file} into {posts_file}... 🔁")
+        stats = reparse_archive(archive_file, posts_file)
+
+    except Exception as e:
+        logger.warn(str(e))
+        return False
+
+    logger.info(f"🎉 Re-parse finished: {stats} 🚀")
+    return True
+
+
 # Private Utility functions
-def __setup_output_folders(base_path=MOBILE_BG_OUTPUT_FOLDER):
-    timestamp = time.strftime('%Y-%m-%d_%H-%M-%S')
-    output_folder = os.path.join(base_path, timestamp)
+def __create_tor():
+    return TorPool() if TOR_POOL_ENABLED else TorManager()
+
+def __create_pool(worker_proxies=None, post_queue=None, archive_queue=None, queue_url=None):
+    proxy_queue = Queue()
+    for worker_proxy in worker_proxies or []:
+        proxy_queue.put(worker_proxy)
+
+    metrics_queue = _metrics_collector.queue if _metrics_collector else None
+
+    # The workers are forked here, start threads of this process (e.g. the DB writers) only once the pool exists
+    with paused_for_fork():
+        return Pool(processes=NUM_WORKERS, initializer=__init_worker,
+                    initargs=(proxy_queue, post_queue, archive_queue, is_force_refresh(), metrics_queue, queue_url))
+
+def __init_worker(proxy_queue, post_queue=None, archive_queue=None, force_refresh=False, metrics_queue=None,
+                  queue_url=None):
+    global _worker_proxy, _post_queue, _archive_queue
+
+    set_force_refresh(force_refresh)
+    init_worker_metrics(metrics_queue)
+
+    try:
+        _worker_proxy = proxy_queue.get(timeout=1)
+    except Empty:
+        _worker_proxy = None
+
+    # On a worker node of a distributed crawl the posts go back to the coordinator through the work queue
+    _post_queue = ResultQueue(create_work_queue(queue_url)) if queue_url else post_queue
+    _archive_queue = archive_queue
+
+def __fetch_page(proxy, brands_file, url, kind, payload=None, expected_markers=(), max_retries=DEFAULT_RETRIES):
+    """
+    Fetches a page and, with ARCHIVE_ENABLED, keeps its HTML in archive.db together with the payload
+    needed to parse it again offline.
+    """
+    html, fetch_path, status = get_request_service(proxy).fetch_page_with_path(url, max_retries, expected_markers)
+
+    if html and ARCHIVE_ENABLED:
+        item = archive_item(url, html, kind, fetch_path, status, payload)
+        if _archive_queue is not None:
+            _archive_queue.put(item)
+        else:
+            archive_page(__archive_file(brands_file), item)
+
+    return html
+
+def __start_metrics(output_folder):
+    global _metrics_collector
+
+    if METRICS_ENABLED and _metrics_collector is None:
+        _metrics_collector = MetricsCollector(output_folder).start()
+
+def __stop_metrics():
+    global _metrics_collector
+
+    if _metrics_collector:
+        _metrics_collector.stop()
+        _metrics_collector = None
+
+def __check_lease():
+    # Nothing a task whose lease was lost produces is kept, the worker that claims it next produces it again
+    if _lease_keeper is not None:
+        _lease_keeper.check()
+
+@timed("store_post")
+def __store_post(posts_file, post_details):
+    __check_lease()
+    if _post_queue is not None:
+        _post_queue.put(post_details)
+    else:
+        insert_post(posts_file, post_details)
+
+def __touch_posts(posts_file, post_numbers):
+    __check_lease()
+    if _post_queue is not None:
+        _post_queue.put(touch_item(post_numbers))
+    else:
+        touch_seen_listings(posts_file, post_numbers)
+
+def __setup_output_folders(base_path=MOBILE_BG_OUTPUT_FOLDER, folder=None):
+    output_folder = os.path.join(base_path, folder or time.strftime('%Y-%m-%d_%H-%M-%S'))
 
     os.makedirs(output_folder, exist_ok=True)
 
@@ -129,6 +394,13 @@ def __setup_output_folders(base_path=MOBILE_BG_OUTPUT_FOLDER):
 def __init_databases(brands_file, posts_file):
     create_brands_database(brands_file)
     create_posts_database(posts_file)
+    create_frontier_database(__frontier_file(brands_file))
+
+    if ARCHIVE_ENABLED:
+        create_archive_database(__archive_file(brands_file))
+
+def __archive_file(brands_file):
+    return os.path.join(os.path.dirname(brands_file), "archive.db")
 
 
 # Phases
@@ -136,7 +408,7 @@ def __phase_one_brands(proxy, brands_file):
     logger.info("🔍 Phase 1: Scraping all brands... 🔍")
 
     try:
-        brands = parse_brands(RequestService(proxy).fetch_page_seleniumbase(BASE_URL))
+        brands = parse_brands(__fetch_page(proxy, brands_file, BASE_URL, "brands", expected_markers=BRANDS_PAGE_MARKERS))
         insert_brands_bulk(brands_file, brands)
 
         logger.info("✅ Phase 1 Complete: Brands saved. ✅")
@@ -144,96 +416,433 @@ def __phase_one_brands(proxy, brands_file):
     except Exception as e:
         logger.warn(f"❌ Phase 1: Scraping all brands failed... Reason: {str(e)}❌")
 
-def __phase_two_models(proxy, brands_file):
+    finally:
+        # Phase 1 runs in the main process, don't keep its browser alive during the parallel phases
+        close_request_services()
+
+def __phase_two_models(proxy, brands_file, worker_proxies=None):
     try:
         logger.info("🔍 Phase 2: Scraping all models in parallel... 🔍")
 
-        with Pool(processes=NUM_WORKERS) as pool:
-            pool.starmap(__scrape_models, [(proxy, brand, brands_file) for brand in fetch_all_brands(brands_file)])
+        frontier_file = __prepare_frontier(brands_file)
+        enqueue_tasks(frontier_file, "brand", __brand_tasks(brands_file))
+
+        __run_frontier_workers(proxy, ("brand",), brands_file, None, worker_proxies)
 
-        logger.info("✅ Phase 2 Complete: Models saved. ✅")
+        logger.info(f"✅ Phase 2 Complete: Models saved. {get_frontier_stats(frontier_file).get('brand', {})} ✅")
 
     except Exception as e:
         raise Exception(f"❌ Phase 2: Scraping all models failed... Reason: {str(e)}❌")
 
-def __phase_three_listings(proxy, brands_file, posts_file):
+def __phase_three_listings(proxy, brands_file, posts_file, engine=SCRAPER_ENGINE, worker_proxies=None):
     try:
-        logger.info("🔍 Phase 3: Scraping all listings in parallel... 🔍")
+        logger.info(f"🔍 Phase 3: Scraping all listings in parallel ({engine} engine)... 🔍")
 
-        with Pool(processes=NUM_WORKERS) as pool:
-            pool.starmap(__scrape_listings, [(proxy, model, posts_file)
-                                             for model in fetch_all_models(brands_file)])
+        if engine == "async":
+            crawl_listings(proxy, fetch_all_models(brands_file, largest_first=True), posts_file,
+                           __archive_file(brands_file) if ARCHIVE_ENABLED else None)
+            logger.info("✅ Phase 3 Complete: Listings saved. ✅")
+            return
+
+        frontier_file = __prepare_frontier(brands_file)
+        enqueue_tasks(frontier_file, "model", __model_tasks(brands_file))
 
-        logger.info("✅ Phase 3 Complete: Listings saved. ✅")
+        __run_listing_workers(proxy, ("model", "page", "post"), brands_file, posts_file, worker_proxies)
+
+        logger.info(f"✅ Phase 3 Complete: Listings saved. {get_frontier_stats(frontier_file)} ✅")
 
     except Exception as e:
         raise Exception(f"❌ Phase 3: Scraping all listings failed... Reason: {str(e)}❌")
 
-
-# Scraping functions
-def __scrape_models(proxy, brand, brands_file):
-    brand_name = brand["name"]
-    brand_url = brand["url"]
+def __phases_two_and_three(proxy, brands_file, posts_file, engine=SCRAPER_ENGINE, worker_proxies=None):
+    """
+    Streams phase 2 into phase 3: one pool works on brands, models, listing pages and posts at once, so the models
+    of a brand are crawled as soon as its models page is parsed instead of after the slowest brand.
+    Workers always claim the most downstream task pending (post > page > model > brand), so new brands and models are
+    only started once the work they produced has been claimed, which keeps the frontier small.
+    """
+    if engine == "async" or not PIPELINE_ENABLED:
+        # The async crawler starts from the complete list of models
+        __phase_two_models(proxy, brands_file, worker_proxies)
+        __phase_three_listings(proxy, brands_file, posts_file, engine, worker_proxies)
+        return
 
     try:
-        logger.info(f"🔍 Scraping models for brand: {brand_name} 🔍")
+        logger.info("🔍 Phases 2-3: Streaming brands into models, listings and posts in parallel... 🔍")
+
+        frontier_file = __prepare_frontier(brands_file)
+        enqueue_tasks(frontier_file, "brand", __brand_tasks(brands_file))
+        # Models of brands a resumed run already scraped, the rest are enqueued by their brand task
+        enqueue_tasks(frontier_file, "model", __model_tasks(brands_file))
+
+        __run_listing_workers(proxy, ("brand", "model", "page", "post"), brands_file, posts_file, worker_proxies)
 
-        models = parse_models(RequestService(proxy).fetch_page_seleniumbase(brand_url))
-        insert_models_bulk(brands_file, brand_name, models)
+        logger.info(f"✅ Phases 2-3 Complete: Models and listings saved. {get_frontier_stats(frontier_file)} ✅")
 
     except Exception as e:
-        logger.info(f"❌ Failed to scrape models for {brand_name}: {e} ❌")
+        raise Exception(f"❌ Phases 2-3: Scraping all models and listings failed... Reason: {str(e)}❌")
 
-    finally:
-        logger.info(f"Exiting models scraping for: {brand_name}")
+def __run_listing_workers(proxy, kinds, brands_file, posts_file, worker_proxies=None):
+    writer = DbWriter(posts_file, write_posts_batch) if DB_WRITER_ENABLED else None
+    __run_frontier_workers(proxy, kinds, brands_file, posts_file, worker_proxies, writer)
+
+def __brand_tasks(brands_file):
+    return [
+        {"url": brand["url"], "payload": {"brand_name": brand["name"]}, "priority": TASK_PRIORITIES["brand"]}
+        for brand in fetch_all_brands(brands_file)
+    ]
 
-def __scrape_listings(proxy, model, listings_folder):
-    brand_name = model["brand_name"]
-    model_name = model["name"]
-    model_url = model["url"]
 
-    # logger.info(f"🔍 Scraping listings for {brand_name} - {model_name} 🔍")
+def __model_tasks(brands_file):
+    return [__model_task(model["brand_name"], model) for model in fetch_all_models(brands_file)]
 
+def __model_task(brand_name, model):
+    # Models with the most listings are claimed first so their pages fan out while the small ones fill the gaps
+    return {"url": model["url"], "payload": {"brand_name": brand_name, "model_name": model["name"]},
+            "priority": TASK_PRIORITIES["model"], "weight": int(model.get("count") or 0)}
+
+def __coordinate_phase_three(queue_url, brands_file, posts_file, resume=False):
+    """
+    Publishes the model tasks to the work queue and writes the posts the worker nodes send back to posts.db
+    until no task is left, neither pending nor in flight. Tasks of workers that stopped heartbeating are requeued.
+    """
     try:
-        first_page_response = RequestService(proxy).fetch_page_seleniumbase(url=model_url, max_retries=3)
-        if not first_page_response:
-            logger.warn(f"❌ Failed to fetch first page of {model_name}. Skipping. ❌")
-            return
+        logger.info(f"📡 Phase 3: Publishing all models to {queue_url}... 📡")
+
+        queue = create_work_queue(queue_url)
+        queue.create()
+        if not resume:
+            queue.clear()
+        queue.enqueue("model", __model_tasks(brands_file))
+
+        writer = DbWriter(posts_file, write_posts_batch).start()
+        kinds = ("model", "page", "post")
+        last_check = time.time()
+
+        try:
+            while True:
+                results = queue.pop_results(WORK_QUEUE_RESULT_BATCH)
+                for item in results:
+                    writer.put(item)
+                if results:
+                    continue
+
+                if queue.count_unfinished(kinds) == 0:
+                    # Workers push results before completing their task, so once drained nothing more is on the way
+                    while results := queue.pop_results(WORK_QUEUE_RESULT_BATCH):
+                        for item in results:
+                            writer.put(item)
+                    break
+
+                if time.time() - last_check >= WORK_QUEUE_REQUEUE_INTERVAL:
+                    requeued = queue.requeue_expired()
+                    if requeued:
+                        logger.info(f"♻️ Requeued {requeued} tasks of workers that stopped heartbeating (failed once out of attempts) ♻️")
+                    logger.info(f"📊 Work queue: {queue.get_stats()} 📊")
+                    last_check = time.time()
+
+                time.sleep(FRONTIER_IDLE_SLEEP)
+        finally:
+            writer.stop()
+
+        logger.info(f"✅ Phase 3 Complete: Listings saved. {queue.get_stats()} ✅")
 
-        last_page = extract_last_page(first_page_response)
-        logger.info(f"📌 Last page found: {last_page} 📌")
+    except Exception as e:
+        raise Exception(f"❌ Phase 3: Coordinating the work queue failed... Reason: {str(e)}❌")
 
-        for page_number in range(1, last_page + 1):
-            response = RequestService(proxy).fetch_page_seleniumbase(url=f"{model_url}/p-{page_number}" if page_number > 1 else model_url, max_retries=3)
+def __wait_for_tasks(queue_url):
+    queue = create_work_queue(queue_url)
+    deadline = time.time() + WORK_QUEUE_WAIT_TIMEOUT
 
-            if not response:
-                logger.warn(f"❌ Failed to fetch page {page_number}. Skipping. ❌")
-                continue
+    while not queue.get_stats():
+        if time.time() >= deadline:
+            raise Exception(f"❌ No tasks were published to {queue_url} within {WORK_QUEUE_WAIT_TIMEOUT}s ❌")
+        logger.info(f"⏳ Waiting for the coordinator to publish tasks to {queue_url}... ⏳")
+        time.sleep(5)
 
-            page_listings = parse_listings(response, brand_name, model_name)
+def __mark_removed_posts(brands_file, posts_file, started_at, engine=SCRAPER_ENGINE):
+    # A listing page that failed would make all of its posts look removed
+    stats = get_frontier_stats(__frontier_file(brands_file))
+    failed = sum(stats.get(kind, {}).get(FAILED, 0) for kind in ("brand", "model", "page"))
 
-            if not page_listings:
-                logger.info(f"✅ No more listings found for {model_name}. ✅")
-                break
+    if engine == "async" or failed:
+        logger.warn(f"⚠️ Not marking removed posts, the crawl was not complete ({failed} failed listing tasks) ⚠️")
+        return
 
-            for listing in page_listings:
-                post_url = listing["url"]
-                try:
-                    post_response = RequestService(proxy).fetch_page_seleniumbase(url=post_url, max_retries=3)
+    truncated = {(payload["brand_name"], payload["model_name"])
+                 for payload in get_truncated_payloads(__frontier_file(brands_file))}
+    if truncated:
+        logger.warn(f"⚠️ Not marking the posts of {len(truncated)} models with unreachable listings as removed ⚠️")
 
-                    if post_response:
-                        post_details = parse_post(post_response, post_url, brand_name, model_name)
+    logger.info(f"🗑️ Marked {mark_removed_listings(posts_file, started_at, truncated)} posts as removed 🗑️")
 
-                        insert_post(listings_folder, post_details)
-                    else:
-                        logger.warn(f"❌ Failed to fetch post: {post_url} ❌")
-                except:
-                    logger.warn(f"❌ Failed to fetch post: {post_url} ❌")
 
-        logger.info(f"✅ Saved listings for {brand_name} - {model_name}. ✅")
+# Frontier workers
+def __frontier_file(brands_file):
+    return os.path.join(os.path.dirname(brands_file), "frontier.db")
 
-    except Exception as e:
-        logger.warn(f"❌ Failed to scrape listings for {brand_name}: {e} ❌")
+def __prepare_frontier(brands_file):
+    frontier_file = __frontier_file(brands_file)
+    create_frontier_database(frontier_file)
+
+    # No worker is running yet, so anything still in flight belongs to a run that died
+    reset_in_flight(frontier_file)
+
+    return frontier_file
 
+def __run_frontier_workers(proxy, kinds, brands_file, posts_file, worker_proxies=None, post_writer=None, queue_url=None):
+    archive_writer = None
+    if ARCHIVE_ENABLED:
+        create_archive_database(__archive_file(brands_file))
+        archive_writer = DbWriter(__archive_file(brands_file), write_archive_batch)
+    writers = [writer for writer in (post_writer, archive_writer) if writer]
+
+    try:
+        with __create_pool(worker_proxies, post_writer.queue if post_writer else None,
+                           archive_writer.queue if archive_writer else None, queue_url) as pool:
+            # Started after the fork, so no worker inherits the writer threads or a lock they hold
+            for writer in writers:
+                writer.start()
+
+            utilization = pool.starmap(__frontier_worker,
+                                       [(proxy, kinds, brands_file, posts_file, queue_url)] * NUM_WORKERS)
+
+            # Let the workers exit gracefully so their reused drivers get closed
+            pool.close()
+            pool.join()
     finally:
-        logger.info(f"Exiting listing scraping for: {brand_name}")
\ No newline at end of file
+        for writer in writers:
+            writer.stop()
+        if archive_writer:
+            logger.info(f"📦 Archive: {get_archive_stats(__archive_file(brands_file))} 📦")
+
+    __log_worker_utilization(utilization)
+
+def __frontier_worker(proxy, kinds, brands_file, posts_file, queue_url=None):
+    """
+    Claims tasks of the given kinds until the frontier has none left, neither pending nor in flight at another worker
+    (tasks in flight can still enqueue more work). Returns how the worker spent its time.
+    Claimed tasks are leased and heartbeated while they run, so the tasks of a worker that dies are claimed again.
+    With a queue_url the frontier is the work queue of a distributed crawl instead of the run's frontier.db.
+    """
+    global _lease_keeper
+
+    proxy = _worker_proxy or proxy
+    frontier = create_work_queue(queue_url) if queue_url else SqliteWorkQueue(__frontier_file(brands_file))
+    worker = get_worker_id()
+    _lease_keeper = LeaseKeeper(frontier, worker).start()
+    utilization = {"pid": os.getpid(), "tasks": 0, "failed": 0, "busy": 0.0, "idle": 0.0}
+    profiler = WorkerProfiler(os.path.join(os.path.dirname(brands_file), "profiles"), "-".join(kinds), PROFILING_ENABLED)
+    started_at = time.time()
+
+    while True:
+        with timed("frontier_claim"):
+            task = frontier.claim(kinds, worker, WORK_QUEUE_LEASE)
+
+        if task is None:
+            if frontier.count_unfinished(kinds) == 0:
+                break
+            time.sleep(FRONTIER_IDLE_SLEEP)
+            utilization["idle"] += FRONTIER_IDLE_SLEEP
+            continue
+
+        task_started_at = time.time()
+        try:
+            with _lease_keeper.track(task["id"]), profiler.task():
+                TASK_HANDLERS[task["kind"]](proxy, task, frontier, brands_file, posts_file)
+
+            # False when the lease expired meanwhile, the task is back in the queue for another worker
+            if not frontier.complete(task["id"], worker):
+                raise LeaseLost(f"Lost the lease of task {task['id']}")
+
+        except LeaseLost:
+            logger.warn(f"⚠️ {task['kind'].capitalize()} task was requeued while it ran, leaving it: {task['url']} ⚠️")
+            utilization["failed"] += 1
+
+        except Exception as e:
+            logger.warn(f"❌ {task['kind'].capitalize()} task failed (attempt {task['attempts']}): {task['url']} - {e} ❌")
+            frontier.fail(task["id"], str(e), worker)
+            utilization["failed"] += 1
+
+        utilization["tasks"] += 1
+        utilization["busy"] += time.time() - task_started_at
+        observe(f"task_{task['kind']}", time.time() - task_started_at)
+
+    utilization["elapsed"] = time.time() - started_at
+    _lease_keeper.stop()
+
+    logger.info(f"📊 Driver stats: {get_request_service(proxy).get_driver_stats()} 📊")
+    logger.info(f"📊 Fetch path stats: {get_request_service(proxy).get_fetch_stats()} 📊")
+    push_metrics(force=True)
+
+    profile_file = profiler.dump()
+    if profile_file:
+        logger.info(f"📊 Worker profile written to {profile_file} 📊")
+
+    return utilization
+
+def __log_worker_utilization(utilization):
+    if not utilization:
+        return
+
+    # Workers finish when the frontier drains, so the slowest one is the wall time of the whole phase
+    wall_time = max(worker["elapsed"] for worker in utilization) or 1
+
+    lines = [f"{'worker':>8} {'tasks':>7} {'failed':>7} {'busy s':>9} {'idle s':>9} {'util':>6}"]
+    for worker in sorted(utilization, key=lambda w: w["pid"]):
+        lines.append(f"{worker['pid']:>8} {worker['tasks']:>7} {worker['failed']:>7} {worker['busy']:>9.1f} "
+                     f"{worker['idle']:>9.1f} {worker['busy'] / wall_time:>6.0%}")
+
+    total_busy = sum(worker["busy"] for worker in utilization)
+    lines.append(f"Pool utilization: {total_busy / (wall_time * len(utilization)):.0%} over {wall_time:.1f}s")
+
+    logger.info("📊 Worker utilization:\n" + "\n".join(lines))
+
+
+# Scraping functions
+def __scrape_models(proxy, task, frontier, brands_file, posts_file):
+    brand_name = task["payload"]["brand_name"]
+
+    logger.info(f"🔍 Scraping models for brand: {brand_name} 🔍")
+
+    html = __fetch_page(proxy, brands_file, task["url"], "models", task["payload"], BRANDS_PAGE_MARKERS)
+    if not html:
+        raise Exception(f"Failed to fetch models page of {brand_name}")
+
+    with timed("parse_models"):
+        models = parse_models(html)
+    __check_lease()
+    insert_models_bulk(brands_file, brand_name, models)
+
+    # Picked up right away when phases 2 and 3 stream into each other, by phase 3 otherwise
+    frontier.enqueue("model", [__model_task(brand_name, model) for model in models])
+
+def __scrape_first_page(proxy, task, frontier, brands_file, posts_file):
+    """
+    Handles a model task, which is either a whole model or one of its shards (the model's search narrowed
+    to a year/price range, payload "shard").
+    """
+    brand_name = task["payload"]["brand_name"]
+    model_name = task["payload"]["model_name"]
+    model_url = task["payload"].get("model_url", task["url"])
+    shard = task["payload"].get("shard")
+
+    html = __fetch_page(proxy, brands_file, task["url"], "listings", task["payload"], LISTINGS_PAGE_MARKERS, max_retries=3)
+    if not html:
+        raise Exception(f"Failed to fetch first page of {model_name}")
+
+    # The first page is parsed once for both the pagination and its listings, and not fetched again
+    with timed("parse_listings"):
+        last_page, listings = parse_listings_page(html, brand_name, model_name)
+    logger.info(f"📌 Last page found for {brand_name} - {model_name}{f' {shard}' if shard else ''}: {last_page} 📌")
+
+    # Only whole models have a listing count, shards are judged by their pagination alone
+    truncated = needs_sharding(last_page, None if shard else task["weight"], len(listings))
+    if truncated and SHARDING_ENABLED:
+        if __enqueue_shards(frontier, task, model_url, shard):
+            return
+        logger.warn(f"⚠️ {brand_name} - {model_name} {shard} can't be split further, some listings are unreachable ⚠️")
+    elif truncated:
+        logger.warn(f"⚠️ {brand_name} - {model_name} has more listings than its pages show, some are unreachable ⚠️")
+
+    __check_lease()
+    if truncated:
+        # Its posts past the last page are never seen, so none of them may be marked as removed
+        frontier.mark_truncated(task["id"])
+    frontier.enqueue("page", [
+        {"url": shard_url(model_url, shard, page_number), "payload": task["payload"], "priority": TASK_PRIORITIES["page"],
+         "weight": task["weight"]}
+        for page_number in range(2, last_page + 1)
+    ])
+    __enqueue_posts(frontier, posts_file, task["payload"], listings, task["weight"])
+
+def __enqueue_shards(frontier, task, model_url, shard=None):
+    shards = split_shard(shard)
+    if not shards:
+        return False
+
+    logger.info(f"🧩 Splitting {task['payload']['model_name']} into shards: {shards} 🧩")
+
+    # The listings of this search are all in its shards, so its own pages are not crawled
+    __check_lease()
+    frontier.enqueue("model", [
+        {"url": shard_url(model_url, new_shard), "payload": {**task["payload"], "model_url": model_url, "shard": new_shard},
+         "priority": TASK_PRIORITIES["model"], "weight": task["weight"] // len(shards)}
+        for new_shard in shards
+    ])
+    return True
+
+def __scrape_page(proxy, task, frontier, brands_file, posts_file):
+    html = __fetch_page(proxy, brands_file, task["url"], "listings", task["payload"], LISTINGS_PAGE_MARKERS, max_retries=3)
+    if not html:
+        raise Exception("Failed to fetch listings page")
+
+    with timed("parse_listings"):
+        listings = parse_listings(html, task["payload"]["brand_name"], task["payload"]["model_name"])
+    __enqueue_posts(frontier, posts_file, task["payload"], listings, task["weight"])
+
+def __get_post_index(posts_file):
+    global _post_index
+
+    if _post_index is None:
+        _post_index = PostIndex.load([posts_file, *KNOWN_POSTS_DBS])
+
+    return _post_index
+
+def __enqueue_posts(frontier, posts_file, payload, listings, weight=0):
+    post_index = __get_post_index(posts_file) if POST_DEDUP_ENABLED else None
+
+    if post_index is not None:
+        new_listings, skipped = [], []
+        for listing in listings:
+            (new_listings if post_index.should_fetch(listing, POST_DEDUP_REVISIT_CHANGED) else skipped).append(listing)
+
+        if skipped:
+            logger.info(f"⏭️ Skipping {len(skipped)}/{len(listings)} already stored posts ⏭️")
+
+        # Still listed, so they must not be marked as removed at the end of an incremental run, even the changed ones
+        # whose post task could still fail (touching keeps their stored title and price, so they are revisited again)
+        known = [extract_post_number(listing["url"]) for listing in listings if post_index.is_known(listing)]
+        if known:
+            __touch_posts(posts_file, known)
+        listings = new_listings
+
+    __check_lease()
+    frontier.enqueue("post", [
+        {
+            "url": listing["url"],
+            "payload": {
+                **payload,
+                "listing": {key: listing.get(key) for key in ("title", "price", "image")},
+                # A known post that changed replaces its stored rows instead of adding to them
+                "update_existing": post_index is not None and post_index.is_known(listing)
+            },
+            "priority": TASK_PRIORITIES["post"],
+            "weight": weight
+        }
+        for listing in listings
+    ])
+
+def __scrape_post(proxy, task, frontier, brands_file, posts_file):
+    post_url = task["url"]
+
+    html = __fetch_page(proxy, brands_file, post_url, "post", task["payload"], POST_PAGE_MARKERS, max_retries=3)
+    if not html:
+        raise Exception("Failed to fetch post")
+
+    with timed("parse_post"):
+        post_details = parse_post(html, post_url, task["payload"]["brand_name"], task["payload"]["model_name"])
+    post_details["listing"] = task["payload"].get("listing")
+    post_details["update_existing"] = task["payload"].get("update_existing", False)
+    __store_post(posts_file, post_details)
+
+
+# Posts are drained first so results keep flowing and the frontier stays small
+TASK_PRIORITIES = {"brand": 0, "model": 1, "page": 2, "post": 3}
+
+TASK_HANDLERS = {
+    "brand": __scrape_models,
+    "model": __scrape_first_page,
+    "page": __scrape_page,
+    "post": __scrape_post,
+}
\ No newline at end of file
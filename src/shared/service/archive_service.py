@@ -0,0 +1,144 @@
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from config import ARCHIVE_CODEC, ARCHIVE_COMPRESSION_LEVEL
+from src.shared.utils.db_util import init_db, insert_dict, fetch_all, fetch_one
+from src.shared.service.logger_service import LoggingService
+
+logger = LoggingService().initialize_logger()
+
+# Every fetched page is a row in pages, its HTML is stored once per distinct content in blobs
+ARCHIVE_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    size INTEGER,
+    data BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    fetched_at REAL,
+    status INTEGER,
+    fetch_path TEXT,
+    hash TEXT NOT NULL,
+    meta TEXT,
+    FOREIGN KEY (hash) REFERENCES blobs(hash)
+);
+
+CREATE INDEX IF NOT EXISTS pages_kind ON pages (kind, id);
+"""
+
+
+def __resolve_codec(codec):
+    if codec == "zstd":
+        try:
+            import zstandard
+            return "zstd"
+        except ImportError:
+            logger.warn("⚠️ zstandard is not installed, archiving with zlib instead ⚠️")
+    return "zlib"
+
+CODEC = __resolve_codec(ARCHIVE_CODEC)
+
+def compress(data: bytes, codec: str = CODEC, level: int = ARCHIVE_COMPRESSION_LEVEL) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, level)
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def create_archive_database(db_path: str):
+    init_db(db_path, ARCHIVE_DB_SCHEMA)
+    logger.info(f"✅ Archive database created at: {db_path}")
+
+def archive_item(url: str, html: str, kind: str, fetch_path: Optional[str] = None, status: Optional[int] = None,
+                 meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Builds an archive entry, hashing and compressing the HTML where it is called (the worker)
+    so the archive writer only has to insert it.
+    """
+    raw = html.encode("utf-8")
+    return {
+        "url": url,
+        "kind": kind,
+        "fetched_at": time.time(),
+        "status": status,
+        "fetch_path": fetch_path,
+        "hash": hashlib.sha256(raw).hexdigest(),
+        "meta": json.dumps(meta or {}, ensure_ascii=False),
+        "codec": CODEC,
+        "size": len(raw),
+        "data": compress(raw),
+    }
+
+def write_archive_batch(conn: sqlite3.Connection, items: List[Dict[str, Any]]) -> int:
+    """
+    Writes a batch of archive entries on an open connection, used by the DB writer. Returns the number of rows written.
+    """
+    rows = 0
+    for item in items:
+        rows += __insert_item(None, item, conn)
+    return rows
+
+def archive_page(db_path: str, item: Dict[str, Any]) -> None:
+    __insert_item(db_path, item)
+
+def __insert_item(db_path, item, conn=None) -> int:
+    # The same HTML (e.g. an unchanged page fetched again) is stored once
+    insert_dict(db_path, "blobs", {key: item[key] for key in ("hash", "codec", "size", "data")}, conn=conn)
+    insert_dict(db_path, "pages", {key: item[key] for key in ("url", "kind", "fetched_at", "status", "fetch_path",
+                                                               "hash", "meta")}, conn=conn)
+    return 2
+
+def iter_archived_pages(db_path: str, kinds: Optional[Iterable[str]] = None, chunk_size: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Streams archived pages in fetch order, reading chunk_size rows at a time so the archive is never loaded whole.
+    The HTML is returned compressed ("data" + "codec"), decompress it where it is parsed.
+    """
+    kinds = list(kinds or [])
+    kind_filter = f"AND p.kind IN ({', '.join(['?'] * len(kinds))})" if kinds else ""
+    last_id = 0
+
+    while True:
+        rows = fetch_all(db_path, f"""
+            SELECT p.id, p.url, p.kind, p.fetched_at, p.status, p.fetch_path, p.meta, b.codec, b.data
+            FROM pages p JOIN blobs b ON b.hash = p.hash
+            WHERE p.id > ? {kind_filter}
+            ORDER BY p.id
+            LIMIT ?
+        """, (last_id, *kinds, chunk_size))
+
+        if not rows:
+            return
+
+        for page_id, url, kind, fetched_at, status, fetch_path, meta, codec, data in rows:
+            yield {"id": page_id, "url": url, "kind": kind, "fetched_at": fetched_at, "status": status,
+                   "fetch_path": fetch_path, "meta": json.loads(meta or "{}"), "codec": codec, "data": data}
+
+        last_id = rows[-1][0]
+
+def read_html(page: Dict[str, Any]) -> str:
+    return decompress(page["data"], page["codec"]).decode("utf-8")
+
+def get_archive_stats(db_path: str) -> Dict[str, Any]:
+    pages, distinct = fetch_one(db_path, "SELECT COUNT(*), COUNT(DISTINCT hash) FROM pages")
+    raw_size, stored_size = fetch_one(db_path, "SELECT COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs")
+    return {
+        "pages": pages,
+        "distinct_pages": distinct,
+        "raw_mb": round(raw_size / 1048576, 1),
+        "stored_mb": round(stored_size / 1048576, 1),
+        "ratio": round(raw_size / stored_size, 1) if stored_size else 0,
+    }
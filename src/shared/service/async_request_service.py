@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import *
+from src.shared.service.logger_service import LoggingService
+from src.shared.service.request_service import RequestService, decode_html
+from src.shared.utils.tor_proxy_manager import get_isolated_proxy
+from src.shared.utils.rate_controller import AimdController, AsyncAdaptiveLimiter
+from src.shared.service.metrics_service import observe, increment
+
+logger = LoggingService().initialize_logger()
+
+class AsyncRequestService:
+    """
+    Asyncio counterpart of RequestService.
+    Keeps hundreds of requests in flight over a single pooled client, bounded by a global and a per-host semaphore.
+    With ADAPTIVE_RATE_ENABLED the global bound follows an AIMD controller: it grows from ASYNC_INITIAL_CONCURRENCY
+    up to max_concurrency while responses are fast and is cut when blocks or errors show up.
+    """
+
+    def __init__(self, proxy,
+                 max_concurrency=ASYNC_MAX_CONCURRENCY,
+                 per_host_limit=ASYNC_PER_HOST_LIMIT,
+                 browser_fallback=ASYNC_BROWSER_FALLBACK):
+        self.proxy = proxy
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.browser_fallback = browser_fallback
+
+        self.client = None
+        self.concurrency = AimdController(min(ASYNC_INITIAL_CONCURRENCY, max_concurrency), 1, max_concurrency,
+                                          ASYNC_CONCURRENCY_INCREASE) if ADAPTIVE_RATE_ENABLED else None
+        self.semaphore = AsyncAdaptiveLimiter(self.concurrency) if self.concurrency else asyncio.Semaphore(max_concurrency)
+        self.host_semaphores = defaultdict(lambda: asyncio.Semaphore(self.per_host_limit))
+
+        # SeleniumBase is blocking and not thread safe, so all fallbacks go through one dedicated thread
+        self.browser = RequestService(proxy) if browser_fallback else None
+        self.browser_executor = ThreadPoolExecutor(max_workers=1) if browser_fallback else None
+
+        self.fetch_counts = {"http": 0, "browser": 0, "failed": 0}
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(
+            # Its own circuit, separate from the browser fallback and any other worker
+            proxy=get_isolated_proxy(self.proxy) if TOR_ISOLATE_STREAMS else self.proxy,
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            headers={
+                "User-Agent": HTTP_USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "bg-BG,bg;q=0.9,en;q=0.8",
+            },
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.client.aclose()
+        self.client = None
+
+        if self.browser_executor:
+            self.browser_executor.submit(self.browser.close).result()
+            self.browser_executor.shutdown()
+
+    def get_fetch_stats(self):
+        total = sum(self.fetch_counts.values())
+        return {
+            **self.fetch_counts,
+            "http_hit_rate": round(self.fetch_counts["http"] / total, 2) if total else 0,
+            "browser_rate": round(self.fetch_counts["browser"] / total, 2) if total else 0,
+            **({"concurrency_" + key: value for key, value in self.concurrency.get_stats().items()}
+               if self.concurrency else {}),
+        }
+
+    async def fetch_page_http(self, url, expected_markers=(), max_retries=DEFAULT_RETRIES):
+        # Returns (html, status), (None, None) when no attempt returned a usable page
+        host = urlsplit(url).netloc
+
+        for attempt in range(max_retries):
+            if attempt and self.concurrency:
+                await asyncio.sleep(self.concurrency.get_backoff_delay(attempt))
+
+            try:
+                async with self.semaphore, self.host_semaphores[host]:
+                    started = time.time()
+                    response = await self.client.get(url)
+                    observe("fetch_http", time.time() - started, engine="async")
+
+                if response.status_code != 200:
+                    # Challenge pages usually come with a 403/503 rather than a 200
+                    self.__record(False, blocked=response.status_code in ADAPTIVE_BLOCK_STATUSES or (
+                        RequestService.is_challenge_page(
+                            decode_html(response.content, response.headers.get("Content-Type", "")))))
+                    increment(f"http_{response.status_code}", engine="async")
+                    continue
+
+                html = decode_html(response.content, response.headers.get("Content-Type", ""))
+                if RequestService.is_challenge_page(html):
+                    self.__record(False, blocked=True)
+                    increment("challenge_page", engine="async")
+                    continue
+
+                self.__record(True, time.time() - started)
+                if RequestService.is_usable_page(html, expected_markers):
+                    return html, response.status_code
+
+            except httpx.TimeoutException:
+                self.__record(False, blocked=True)
+                increment("http_timeout", engine="async")
+                continue
+
+            except httpx.HTTPError as e:
+                self.__record(False)
+                increment("http_error", engine="async", error=type(e).__name__)
+                continue
+
+        return None, None
+
+    def __record(self, ok, latency=None, blocked=False):
+        if self.concurrency:
+            self.concurrency.record(ok, latency, blocked)
+
+    async def fetch_page(self, url, expected_markers=(), max_retries=DEFAULT_RETRIES):
+        return (await self.fetch_page_with_path(url, expected_markers, max_retries))[0]
+
+    async def fetch_page_with_path(self, url, expected_markers=(), max_retries=DEFAULT_RETRIES):
+        html, status = await self.fetch_page_http(url, expected_markers, max_retries)
+        if html:
+            self.fetch_counts["http"] += 1
+            return html, "http", status
+
+        if self.browser_fallback:
+            loop = asyncio.get_running_loop()
+            html = await loop.run_in_executor(self.browser_executor, self.browser.fetch_page_seleniumbase, url, max_retries,
+                                              expected_markers)
+
+        self.fetch_counts["browser" if html else "failed"] += 1
+        return html, "browser" if html else None, None
\ No newline at end of file
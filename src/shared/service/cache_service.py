@@ -0,0 +1,150 @@
+import os
+import re
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from config import HTTP_CACHE_FILE, HTTP_CACHE_MAX_MB, HTTP_CACHE_TTLS, HTTP_CACHE_FORCE_REFRESH
+from src.shared.utils.db_util import init_db, execute, fetch_one, fetch_all, upsert_dict
+from src.shared.service.logger_service import LoggingService
+
+logger = LoggingService().initialize_logger()
+
+HTTP_CACHE_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL,
+    expires_at REAL,
+    last_access REAL,
+    size INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+"""
+
+CACHE_TTLS = [(re.compile(pattern), ttl) for pattern, ttl in HTTP_CACHE_TTLS]
+
+# Set by the entry points (and handed to the pool workers) to ignore what is cached for this run
+_force_refresh = HTTP_CACHE_FORCE_REFRESH
+
+def set_force_refresh(force_refresh: bool) -> None:
+    global _force_refresh
+    _force_refresh = force_refresh
+
+def is_force_refresh() -> bool:
+    return _force_refresh
+
+def get_ttl(url: str) -> int:
+    for pattern, ttl in CACHE_TTLS:
+        if pattern.search(url):
+            return ttl
+    return 0
+
+
+class ResponseCache:
+    """
+    On-disk cache of pages that barely change between runs (the brand and model index pages).
+    Entries live for the TTL of the first HTTP_CACHE_TTLS pattern their URL matches, expired entries with an
+    ETag/Last-Modified are revalidated with a conditional request, and the least recently used entries are
+    evicted once the cache grows past HTTP_CACHE_MAX_MB.
+    """
+
+    def __init__(self, db_path: str = HTTP_CACHE_FILE, max_mb: float = HTTP_CACHE_MAX_MB):
+        self.db_path = db_path
+        self.max_bytes = int(max_mb * 1048576)
+        self.initialized = False
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stored": 0, "evicted": 0}
+
+    def __init_db(self):
+        if not self.initialized:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            init_db(self.db_path, HTTP_CACHE_DB_SCHEMA)
+            self.initialized = True
+
+    @staticmethod
+    def is_cacheable(url: str) -> bool:
+        return get_ttl(url) > 0
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"html", "etag", "last_modified", "fresh"} for a cached URL, None when it isn't cached
+        or the run forces a refresh.
+        """
+        if _force_refresh or not self.is_cacheable(url):
+            return None
+
+        self.__init_db()
+        row = fetch_one(self.db_path, "SELECT body, etag, last_modified, expires_at FROM responses WHERE url = ?", (url,))
+        if not row:
+            self.stats["misses"] += 1
+            return None
+
+        body, etag, last_modified, expires_at = row
+        now = time.time()
+        execute(self.db_path, "UPDATE responses SET last_access = ? WHERE url = ?", (now, url))
+
+        fresh = expires_at > now
+        self.stats["hits" if fresh else "misses"] += 1
+        return {"html": zlib.decompress(body).decode("utf-8"), "etag": etag, "last_modified": last_modified,
+                "fresh": fresh}
+
+    @staticmethod
+    def get_conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url: str, html: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        if not self.is_cacheable(url):
+            return
+
+        self.__init_db()
+        body = zlib.compress(html.encode("utf-8"))
+        now = time.time()
+
+        upsert_dict(self.db_path, "responses", {
+            "url": url,
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": now,
+            "expires_at": now + get_ttl(url),
+            "last_access": now,
+            "size": len(body),
+        })
+        self.stats["stored"] += 1
+
+        self.__evict()
+
+    def refresh(self, url: str) -> None:
+        """
+        Extends a revalidated entry (the server answered 304 Not Modified) by another TTL.
+        """
+        now = time.time()
+        execute(self.db_path, "UPDATE responses SET expires_at = ?, last_access = ? WHERE url = ?",
+                (now + get_ttl(url), now, url))
+        self.stats["revalidated"] += 1
+
+    def __evict(self):
+        total = fetch_one(self.db_path, "SELECT COALESCE(SUM(size), 0) FROM responses")[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = []
+        for url, size in fetch_all(self.db_path, "SELECT url, size FROM responses ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((url,))
+            total -= size
+
+        execute(self.db_path, "DELETE FROM responses WHERE url = ?", evicted, many=True)
+        self.stats["evicted"] += len(evicted)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats)
@@ -0,0 +1,202 @@
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import FRONTIER_MAX_ATTEMPTS
+from src.shared.utils.db_util import init_db, insert_batch_dicts, execute, execute_returning, fetch_all, fetch_one, \
+    add_missing_columns
+from src.shared.service.logger_service import LoggingService
+
+logger = LoggingService().initialize_logger()
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+FRONTIER_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL UNIQUE,
+    payload TEXT,
+    priority INTEGER DEFAULT 0,
+    weight INTEGER DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL,
+    worker TEXT,
+    lease_until REAL,
+    truncated INTEGER DEFAULT 0
+);
+
+-- Replaced by frontier_claim_order, which also covers the weight and id the claim orders by
+DROP INDEX IF EXISTS frontier_claim;
+
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item TEXT NOT NULL
+);
+"""
+
+def create_frontier_database(db_path: str):
+    init_db(db_path, FRONTIER_DB_SCHEMA)
+    add_missing_columns(db_path, "frontier", {"weight": "INTEGER DEFAULT 0", "worker": "TEXT", "lease_until": "REAL",
+                                              "truncated": "INTEGER DEFAULT 0"})
+    # Created after the migration, frontiers from before the weight column don't have it in their schema
+    execute(db_path, "CREATE INDEX IF NOT EXISTS frontier_claim_order ON frontier "
+                     "(state, kind, priority DESC, weight DESC, id)")
+    logger.info(f"✅ Frontier database created at: {db_path}")
+
+def enqueue_tasks(db_path: str, kind: str, tasks: Iterable[Dict[str, Any]]) -> None:
+    """
+    Adds tasks ({"url", "payload", "priority", "weight"}) to the frontier. Tasks of the same priority are claimed
+    heaviest first (e.g. the models with the most listings), so the long tails start early.
+    URLs that are already known are ignored, whatever their state, so completed work is never redone.
+    """
+    now = time.time()
+    insert_batch_dicts(db_path, "frontier", [
+        {
+            "kind": kind,
+            "url": task["url"],
+            "payload": json.dumps(task.get("payload", {}), ensure_ascii=False),
+            "priority": task.get("priority", 0),
+            "weight": task.get("weight", 0),
+            "state": PENDING,
+            "updated_at": now,
+        }
+        for task in tasks
+    ])
+
+def claim_task(db_path: str, kinds: Iterable[str], worker: Optional[str] = None,
+               lease: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Atomically moves the highest priority pending task of the given kinds to in_flight and returns it.
+    A single UPDATE ... RETURNING statement, so two processes can never claim the same task.
+    With a lease the task goes back to pending (requeue_expired) unless the worker heartbeats within `lease` seconds.
+    The best task of every kind is one seek on frontier_claim_order, only those few candidates are sorted.
+    """
+    kinds = list(kinds)
+    now = time.time()
+
+    candidates = " UNION ALL ".join([
+        "SELECT * FROM (SELECT id, priority, weight FROM frontier WHERE state = ? AND kind = ? "
+        "ORDER BY priority DESC, weight DESC, id LIMIT 1)"
+    ] * len(kinds))
+
+    rows = execute_returning(db_path, f"""
+        UPDATE frontier
+        SET state = ?, attempts = attempts + 1, updated_at = ?, worker = ?, lease_until = ?
+        WHERE id = (
+            SELECT id FROM ({candidates})
+            ORDER BY priority DESC, weight DESC, id
+            LIMIT 1
+        )
+        RETURNING id, kind, url, payload, attempts, weight
+    """, (IN_FLIGHT, now, worker, now + lease if lease else None, *[value for kind in kinds for value in (PENDING, kind)]))
+
+    if not rows:
+        return None
+
+    task_id, kind, url, payload, attempts, weight = rows[0]
+    return {"id": task_id, "kind": kind, "url": url, "payload": json.loads(payload or "{}"), "attempts": attempts,
+            "weight": weight or 0}
+
+def heartbeat_task(db_path: str, task_id: int, worker: str, lease: float) -> bool:
+    """
+    Extends the lease of a task the worker still holds. False when it lost the task, i.e. the lease expired
+    and the task was requeued or claimed by another worker.
+    """
+    rows = execute_returning(db_path, """
+        UPDATE frontier SET lease_until = ? WHERE id = ? AND worker = ? AND state = ? RETURNING id
+    """, (time.time() + lease, task_id, worker, IN_FLIGHT))
+    return bool(rows)
+
+def requeue_expired(db_path: str, max_attempts: int = FRONTIER_MAX_ATTEMPTS) -> int:
+    """
+    Returns in_flight tasks whose lease ran out (their worker died or hung) to pending. An expired lease is a failed
+    attempt like fail_task's (claim_task counted it), so a task that hangs or kills its worker every time ends up failed.
+    """
+    rows = execute_returning(db_path, """
+        UPDATE frontier
+        SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, last_error = ?, updated_at = ?, lease_until = NULL
+        WHERE state = ? AND lease_until < ? RETURNING id
+    """, (max_attempts, FAILED, PENDING, "Lease expired", time.time(), IN_FLIGHT, time.time()))
+    return len(rows)
+
+def complete_task(db_path: str, task_id: int, worker: Optional[str] = None) -> bool:
+    """
+    With a worker, only completes the task if that worker still holds it: in flight and claimed by it last.
+    A worker whose lease expired can't complete the task, even before another worker claimed it again.
+    Returns whether the task was completed.
+    """
+    held_by, params = __held_by(worker)
+    rows = execute_returning(db_path, f"""
+        UPDATE frontier SET state = ?, last_error = NULL, updated_at = ?, lease_until = NULL
+        WHERE id = ? AND {held_by} RETURNING id
+    """, (DONE, time.time(), task_id, *params))
+    return bool(rows)
+
+def fail_task(db_path: str, task_id: int, error: str, max_attempts: int = FRONTIER_MAX_ATTEMPTS,
+              worker: Optional[str] = None) -> bool:
+    """
+    Puts the task back to pending for another attempt, or marks it failed once it ran out of attempts.
+    Like complete_task, a worker can only fail a task it still holds.
+    """
+    held_by, params = __held_by(worker)
+    rows = execute_returning(db_path, f"""
+        UPDATE frontier
+        SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, last_error = ?, updated_at = ?, lease_until = NULL
+        WHERE id = ? AND {held_by} RETURNING id
+    """, (max_attempts, FAILED, PENDING, error, time.time(), task_id, *params))
+    return bool(rows)
+
+def __held_by(worker: Optional[str]):
+    if worker:
+        return "state = ? AND worker = ?", (IN_FLIGHT, worker)
+    return "state IN (?, ?)", (PENDING, IN_FLIGHT)
+
+def mark_truncated(db_path: str, task_id: int) -> None:
+    """
+    Flags a task whose search shows fewer listings than it has (past the last page mobile.bg paginates to),
+    so the crawl is known to be incomplete for it.
+    """
+    execute(db_path, "UPDATE frontier SET truncated = 1 WHERE id = ?", (task_id,))
+
+def get_truncated_payloads(db_path: str) -> List[Dict[str, Any]]:
+    return [json.loads(payload or "{}") for (payload,) in fetch_all(db_path, "SELECT payload FROM frontier WHERE truncated = 1")]
+
+def reset_in_flight(db_path: str) -> int:
+    """
+    Returns tasks left in_flight by a run that died back to pending. Only call it when no workers are running.
+    """
+    rows = execute_returning(db_path, "UPDATE frontier SET state = ? WHERE state = ? RETURNING id", (PENDING, IN_FLIGHT))
+    if rows:
+        logger.info(f"♻️ Resuming {len(rows)} tasks left in flight by a previous run ♻️")
+    return len(rows)
+
+def count_unfinished(db_path: str, kinds: Iterable[str]) -> int:
+    kinds = list(kinds)
+    placeholders = ", ".join(["?"] * len(kinds))
+    result = fetch_one(db_path, f"SELECT COUNT(*) FROM frontier WHERE state IN (?, ?) AND kind IN ({placeholders})",
+                       (PENDING, IN_FLIGHT, *kinds))
+    return result[0] if result else 0
+
+def get_frontier_stats(db_path: str) -> Dict[str, Dict[str, int]]:
+    stats: Dict[str, Dict[str, int]] = {}
+    for kind, state, count in fetch_all(db_path, "SELECT kind, state, COUNT(*) FROM frontier GROUP BY kind, state"):
+        stats.setdefault(kind, {})[state] = count
+    return stats
+
+def push_results(db_path: str, items: List[str]) -> None:
+    execute(db_path, "INSERT INTO results (item) VALUES (?)", [(item,) for item in items], many=True)
+
+def pop_results(db_path: str, limit: int) -> List[str]:
+    """
+    Takes up to `limit` of the oldest results off the results table.
+    """
+    rows = execute_returning(db_path, """
+        DELETE FROM results WHERE id IN (SELECT id FROM results ORDER BY id LIMIT ?) RETURNING id, item
+    """, (limit,))
+    return [item for _, item in sorted(rows)]
@@ -14,5 +14,6 @@ class LoggingService:
 
         logging.getLogger("stem").setLevel(logging.WARNING)
         logging.getLogger("stem.control").setLevel(logging.WARNING)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
 
         return logging.getLogger(__name__)
\ No newline at end of file
@@ -0,0 +1,322 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Queue
+from queue import Empty
+from typing import Any, Dict, List, Optional
+
+from config import METRICS_ENABLED, METRICS_BUCKETS, METRICS_PUSH_INTERVAL, METRICS_SNAPSHOT_INTERVAL, METRICS_PORT, \
+    METRICS_HOST
+from src.shared.service.logger_service import LoggingService
+
+logger = LoggingService().initialize_logger()
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms of one process, keyed by name and labels.
+    Thread safe, the DB writer threads record into the registry of the main process.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name, value=1, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * (len(METRICS_BUCKETS) + 1), "count": 0, "sum": 0.0}
+            histogram["buckets"][bisect_left(METRICS_BUCKETS, seconds)] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+
+    def snapshot(self) -> Dict[str, List]:
+        with self.lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, dict(labels), {**histogram, "buckets": list(histogram["buckets"])}]
+                               for (name, labels), histogram in self.histograms.items()],
+            }
+
+
+# Registry of this process and, in pool workers, the queue its snapshots are pushed to
+_registry = MetricsRegistry()
+_queue = None
+_last_push = 0
+# Collector running in this process, its threads are paused while worker processes are forked
+_collector = None
+
+def init_worker_metrics(queue) -> None:
+    """
+    Called by the pool initializer. Starts from an empty registry, a forked worker would otherwise
+    report what the main process recorded before the fork once more.
+    """
+    global _registry, _queue
+    _registry = MetricsRegistry()
+    _queue = queue
+
+def increment(event, value=1, **labels) -> None:
+    if METRICS_ENABLED:
+        _registry.increment("events_total", value, {"event": event, **labels})
+        push_metrics()
+
+def observe(stage, seconds, **labels) -> None:
+    if METRICS_ENABLED:
+        _registry.observe("stage_seconds", seconds, {"stage": stage, **labels})
+        push_metrics()
+
+@contextmanager
+def timed(stage, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started, **labels)
+
+def paused_for_fork():
+    """
+    Context manager to fork worker processes in, pauses the collector running in this process if there is one.
+    """
+    return _collector.paused() if _collector else nullcontext()
+
+def push_metrics(force=False) -> None:
+    """
+    Sends the cumulative snapshot of this worker to the collector, at most every METRICS_PUSH_INTERVAL seconds.
+    """
+    global _last_push
+
+    if _queue is None or (not force and time.time() - _last_push < METRICS_PUSH_INTERVAL):
+        return
+
+    _last_push = time.time()
+    try:
+        _queue.put_nowait((os.getpid(), _registry.snapshot()))
+    except Exception:
+        ""
+
+
+class MetricsCollector:
+    """
+    Aggregates the snapshots pushed by the pool workers with the registry of the main process.
+    Writes them to metrics.json every METRICS_SNAPSHOT_INTERVAL seconds, serves them as Prometheus text
+    on METRICS_HOST:METRICS_PORT when set, and logs a per-stage summary table when stopped.
+    """
+
+    def __init__(self, output_folder: Optional[str] = None, port: Optional[int] = METRICS_PORT,
+                 snapshot_interval: float = METRICS_SNAPSHOT_INTERVAL, host: str = METRICS_HOST):
+        self.snapshot_file = os.path.join(output_folder, "metrics.json") if output_folder else None
+        self.port = port
+        self.host = host
+        self.snapshot_interval = snapshot_interval
+
+        self.queue = Queue()
+        self.sources = {}  # pid -> latest cumulative snapshot of that worker
+        self.lock = threading.Lock()
+        self.thread = None
+        self.server = None
+
+    def start(self):
+        global _collector
+
+        self.__start_threads()
+        if self.port:
+            logger.info(f"📈 Serving metrics on http://{self.host}:{self.port}/metrics 📈")
+
+        _collector = self
+        return self
+
+    def stop(self):
+        global _collector
+
+        self.__stop_threads()
+        if _collector is self:
+            _collector = None
+
+        self.__write_snapshot()
+        logger.info("📊 Stage metrics:\n" + self.format_summary())
+
+    @contextmanager
+    def paused(self):
+        """
+        Stops the collector and server threads for the duration of the block, snapshots the workers push meanwhile
+        wait on the queue. Used around forking worker processes, which would otherwise inherit the server's socket
+        and any lock these threads hold at that moment.
+        """
+        running = self.thread is not None
+        self.__stop_threads()
+        try:
+            yield
+        finally:
+            if running:
+                self.__start_threads()
+
+    def __start_threads(self):
+        self.thread = threading.Thread(target=self.__run, name="metrics-collector", daemon=True)
+        self.thread.start()
+
+        if self.port:
+            self.server = ThreadingHTTPServer((self.host, self.port), self.__make_handler())
+            threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True).start()
+
+    def __stop_threads(self):
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __run(self):
+        last_snapshot = time.time()
+
+        while True:
+            try:
+                item = self.queue.get(timeout=1)
+            except Empty:
+                item = Empty
+
+            if item is None:
+                break
+
+            if item is not Empty:
+                pid, snapshot = item
+                with self.lock:
+                    self.sources[pid] = snapshot
+
+            if time.time() - last_snapshot >= self.snapshot_interval:
+                last_snapshot = time.time()
+                self.__write_snapshot()
+
+    def get_series(self) -> Dict[str, List]:
+        """
+        All series of all processes, each labelled with the worker (pid) it comes from.
+        """
+        with self.lock:
+            sources = {**self.sources, os.getpid(): _registry.snapshot()}
+
+        series = {"counters": [], "histograms": []}
+        for pid, snapshot in sources.items():
+            for kind in series:
+                for name, labels, value in snapshot[kind]:
+                    series[kind].append([name, {**labels, "worker": str(pid)}, value])
+        return series
+
+    def __write_snapshot(self):
+        if not self.snapshot_file:
+            return
+        try:
+            with open(self.snapshot_file, "w", encoding="utf-8") as file:
+                json.dump({"time": time.time(), "buckets": METRICS_BUCKETS, **self.get_series()}, file)
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to write metrics snapshot: {e}")
+
+    def format_prometheus(self) -> str:
+        series = self.get_series()
+        lines = ["# TYPE onion_events_total counter"]
+
+        for name, labels, value in series["counters"]:
+            lines.append(f"onion_{name}{{{_format_labels(labels)}}} {value}")
+
+        lines.append("# TYPE onion_stage_seconds histogram")
+        for name, labels, histogram in series["histograms"]:
+            cumulative = 0
+            for bound, count in zip([*METRICS_BUCKETS, "+Inf"], histogram["buckets"]):
+                cumulative += count
+                lines.append(f"onion_{name}_bucket{{{_format_labels({**labels, 'le': bound})}}} {cumulative}")
+            lines.append(f"onion_{name}_sum{{{_format_labels(labels)}}} {histogram['sum']}")
+            lines.append(f"onion_{name}_count{{{_format_labels(labels)}}} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def get_summary(self) -> List[Dict[str, Any]]:
+        """
+        Histograms merged per stage across workers and proxies, slowest stages (by total time) first.
+        """
+        stages = {}
+        for _, labels, histogram in self.get_series()["histograms"]:
+            stage = stages.setdefault(labels["stage"], {"buckets": [0] * (len(METRICS_BUCKETS) + 1), "count": 0,
+                                                         "sum": 0.0, "workers": set()})
+            stage["buckets"] = [a + b for a, b in zip(stage["buckets"], histogram["buckets"])]
+            stage["count"] += histogram["count"]
+            stage["sum"] += histogram["sum"]
+            stage["workers"].add(labels["worker"])
+
+        total = sum(stage["sum"] for stage in stages.values()) or 1
+        return sorted([
+            {
+                "stage": name,
+                "count": stage["count"],
+                "workers": len(stage["workers"]),
+                "total_s": stage["sum"],
+                "mean_ms": stage["sum"] * 1000 / stage["count"] if stage["count"] else 0,
+                "p50_s": _percentile(stage["buckets"], stage["count"], 0.5),
+                "p95_s": _percentile(stage["buckets"], stage["count"], 0.95),
+                "share": stage["sum"] / total,
+            }
+            for name, stage in stages.items()
+        ], key=lambda row: row["total_s"], reverse=True)
+
+    def format_summary(self) -> str:
+        lines = [f"{'stage':<18}{'count':>9}{'workers':>9}{'total s':>11}{'mean ms':>10}{'p50 <=':>9}{'p95 <=':>9}{'share':>7}"]
+        for row in self.get_summary():
+            lines.append(f"{row['stage']:<18}{row['count']:>9}{row['workers']:>9}{row['total_s']:>11.1f}"
+                         f"{row['mean_ms']:>10.1f}{row['p50_s']:>9}{row['p95_s']:>9}{row['share']:>7.0%}")
+
+        events = {}
+        for _, labels, value in self.get_series()["counters"]:
+            events[labels["event"]] = events.get(labels["event"], 0) + value
+        if events:
+            lines.append("events: " + ", ".join(f"{event}={value:g}" for event, value in sorted(events.items())))
+
+        return "\n".join(lines)
+
+    def __make_handler(self):
+        collector = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = collector.format_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                ""
+
+        return MetricsHandler
+
+
+def _format_labels(labels):
+    return ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+
+def _escape_label(value):
+    # Label values hold proxy URLs and exception names, escaped as the Prometheus text format requires
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _percentile(buckets, count, quantile):
+    # Upper bound of the bucket the quantile falls in, as precise as a Prometheus histogram gets
+    if not count:
+        return "-"
+    cumulative = 0
+    for bound, bucket_count in zip([*METRICS_BUCKETS, "inf"], buckets):
+        cumulative += bucket_count
+        if cumulative >= quantile * count:
+            return f"{bound}s" if bound != "inf" else f">{METRICS_BUCKETS[-1]}s"
+    return "-"
@@ -1,28 +1,207 @@
+import re
 import time
+from multiprocessing import util
+
+import requests
+from requests.adapters import HTTPAdapter
 from seleniumbase import Driver
 
 from config import *
 from src.shared.service.logger_service import LoggingService
+from src.shared.utils.tor_proxy_manager import get_isolated_proxy
+from src.shared.service.cache_service import ResponseCache
+from src.shared.utils.rate_controller import AimdController
+from src.shared.service.metrics_service import timed, observe, increment
 
 logger = LoggingService().initialize_logger()
 
+# One warm RequestService per proxy, per worker process
+_sessions = {}
+
+def get_request_service(proxy):
+    """
+    Returns the RequestService cached for this process and proxy.
+    The driver inside it is reused across pages and closed when the worker process exits.
+    """
+    if not _sessions:
+        util.Finalize(None, close_request_services, exitpriority=10)
+
+    if proxy not in _sessions:
+        _sessions[proxy] = RequestService(proxy)
+
+    return _sessions[proxy]
+
+def close_request_services():
+    for service in _sessions.values():
+        service.close()
+    _sessions.clear()
+
+def decode_html(content, content_type=""):
+    # mobile.bg doesn't always send a charset header, so look for it in the meta tags before guessing
+    match = re.search(r'charset=["\']?([\w-]+)', content_type, re.IGNORECASE)
+    if not match:
+        match = re.search(rb'charset=["\']?([\w-]+)', content[:2048], re.IGNORECASE)
+
+    encoding = match.group(1) if match else "utf-8"
+    if isinstance(encoding, bytes):
+        encoding = encoding.decode("ascii")
+
+    try:
+        return content.decode(encoding, errors="replace")
+    except LookupError:
+        return content.decode("utf-8", errors="replace")
+
 class RequestService:
-    def __init__(self, proxy):
+    def __init__(self, proxy,
+                 reuse_driver=SELENIUMBASE_REUSE_DRIVER,
+                 max_pages_per_driver=SELENIUMBASE_MAX_PAGES_PER_DRIVER,
+                 max_driver_age=SELENIUMBASE_MAX_DRIVER_AGE):
         self.driver = None
         self.proxy = proxy
         self.full_proxy = {  "http": self.proxy,  "https": self.proxy  }
 
+        self.reuse_driver = reuse_driver
+        self.max_pages_per_driver = max_pages_per_driver
+        self.max_driver_age = max_driver_age
+
+        self.driver_started_at = None
+        self.pages_on_driver = 0
+        self.cookies_dismissed = False
+        self.driver_page_counts = []  # Pages served by every recycled driver
+        self.browser_seconds = 0.0  # Time spent and bytes transferred by the pages the browser loaded
+        self.browser_bytes = 0
+
+        self.http_session = None
+        self.fetch_counts = {"http": 0, "browser": 0, "failed": 0, "cache": 0}
+        self.cache = ResponseCache() if HTTP_CACHE_ENABLED else None
+
+        # Requests/sec of this worker on this proxy, raised while pages come back fast and cut on blocks
+        self.rate = AimdController(WORKER_INITIAL_RATE, WORKER_MIN_RATE, WORKER_MAX_RATE, WORKER_RATE_INCREASE) \
+            if ADAPTIVE_RATE_ENABLED else None
+        self.last_request_at = 0
+
+        # The HTTP path gets its own Tor circuit through SOCKS auth, Chrome can't authenticate to SOCKS proxies
+        self.http_proxy = get_isolated_proxy(proxy) if TOR_ISOLATE_STREAMS else proxy
+        self.http_latency = None  # Running average of successful HTTP fetches on the current circuit
+        self.circuit_rotations = 0
+
     def __del__(self):
         self.__close_driver()
 
+    def close(self):
+        self.__close_driver()
+        if self.http_session:
+            self.http_session.close()
+            self.http_session = None
+
+    def get_fetch_stats(self):
+        total = sum(self.fetch_counts.values())
+        return {
+            **self.fetch_counts,
+            "http_hit_rate": round(self.fetch_counts["http"] / total, 2) if total else 0,
+            "browser_rate": round(self.fetch_counts["browser"] / total, 2) if total else 0,
+            "circuit_rotations": self.circuit_rotations,
+            **({"cache_" + key: value for key, value in self.cache.get_stats().items()} if self.cache else {}),
+            **({"rate_" + key: value for key, value in self.rate.get_stats().items()} if self.rate else {}),
+        }
+
+    def rotate_circuit(self, reason):
+        """
+        Moves the HTTP path to new SOCKS credentials so Tor builds a fresh circuit for this service only,
+        instead of a NEWNYM that would reset the circuits of every worker.
+        """
+        if not TOR_ISOLATE_STREAMS or self.http_proxy == self.proxy:
+            return
+
+        logger.info(f"🔀 Rotating Tor circuit ({reason}) 🔀")
+        self.http_proxy = get_isolated_proxy(self.proxy)
+        self.http_latency = None
+        self.circuit_rotations += 1
+
+        if self.http_session:
+            self.http_session.close()
+            self.http_session = None
+
+    def __pace(self, attempt=None):
+        # Waits out this worker's current request interval plus the backoff of the last blocks or failed attempts
+        if not self.rate:
+            return
+
+        delay = self.last_request_at + 1 / self.rate.value - time.time()
+        delay = max(0, delay) + self.rate.get_backoff_delay(attempt)
+        if delay > 0:
+            observe("rate_wait", delay, proxy=self.proxy)
+            time.sleep(delay)
+        self.last_request_at = time.time()
+
+    def __track_latency(self, elapsed):
+        if self.http_latency and elapsed > max(TOR_CIRCUIT_MIN_SLOW_SECONDS, self.http_latency * TOR_CIRCUIT_LATENCY_FACTOR):
+            self.rotate_circuit(f"latency spike: {elapsed:.1f}s against {self.http_latency:.1f}s average")
+            return
+
+        self.http_latency = elapsed if self.http_latency is None else 0.8 * self.http_latency + 0.2 * elapsed
+
+    def get_driver_stats(self):
+        counts = self.driver_page_counts + ([self.pages_on_driver] if self.driver else [])
+        return {
+            "drivers_started": len(counts),
+            "pages_fetched": sum(counts),
+            "avg_pages_per_driver": round(sum(counts) / len(counts), 2) if counts else 0,
+            "pages_on_current_driver": self.pages_on_driver,
+            "seconds_per_page": round(self.browser_seconds / sum(counts), 2) if sum(counts) else 0,
+            "kb_per_page": round(self.browser_bytes / 1024 / sum(counts), 1) if sum(counts) else 0,
+        }
+
+    def __open_driver(self):
+        if self.driver:
+            if self.pages_on_driver >= self.max_pages_per_driver:
+                self.__recycle_driver("page limit reached")
+            elif time.time() - self.driver_started_at >= self.max_driver_age:
+                self.__recycle_driver("max age reached")
+            else:
+                return
+
+        with timed("driver_start", proxy=self.proxy):
+            self.driver = Driver(
+                uc              =       SELENIUMBASE_UC_MODE,
+                incognito       =       SELENIUMBASE_INCOGNITO_MODE,
+                headless        =       SELENIUMBASE_HEADLESS_MODE,
+                disable_csp     =       SELENIUMBASE_DISABLE_CSR_MODE,
+                d_width         =       SELENIUMBASE_DISPLAY_WIDTH,
+                d_height        =       SELENIUMBASE_DISPLAY_HEIGHT,
+                proxy           =       self.proxy,
+                block_images    =       SELENIUMBASE_LEAN_MODE,
+                page_load_strategy =    "eager" if SELENIUMBASE_LEAN_MODE else "normal",
+            )
+        self.driver_started_at = time.time()
+        self.pages_on_driver = 0
+        self.cookies_dismissed = False
+
+        if SELENIUMBASE_LEAN_MODE:
+            self.__block_resources()
+
+    def __block_resources(self):
+        # The parsers only read the DOM, so fonts, media, ads and trackers are never downloaded
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": SELENIUMBASE_BLOCKED_URLS})
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to block resources through CDP: {e}")
+
+    def __recycle_driver(self, reason):
+        logger.info(f"♻️ Recycling WebDriver after {self.pages_on_driver} pages ({reason}) ♻️")
+        self.__close_driver()
+
     def __close_driver(self):
         if self.driver:
+            self.driver_page_counts.append(self.pages_on_driver)
             try:
                 self.driver.quit()
                 logger.info("🛑 WebDriver closed cleanly! 🛑")
             except Exception as e:
                 logger.warning(f"⚠️ WebDriver quit failed: {e}")
         self.driver = None
+        self.pages_on_driver = 0
 
     def __resolve_captcha(self):
         try:
@@ -32,6 +211,7 @@ class RequestService:
 
                 self.driver.uc_gui_handle_captcha()
                 # logger.info("✅ Captcha resolved! ✅")
+                return True
 
             # else:
                 # logger.info("✅ No Captcha tests appeared! ✅")
@@ -40,13 +220,19 @@ class RequestService:
             ""
             # logger.warning(f"⚠️ No captcha detected or failed to solve: {e}")
 
+        return False
+
     def __handle_cookie_popup(self):
+        if self.cookies_dismissed:
+            return
+
         try:
             # logger.info("🔍 Checking for cookie popup in SeleniumBase... 🔍")
 
             if self.driver.is_element_visible("#cookiescript_reject"):
 
                 self.driver.click("#cookiescript_reject")
+                self.cookies_dismissed = True
                 # logger.info("✅ Cookie popup dismissed! ✅")
 
             # else:
@@ -56,6 +242,24 @@ class RequestService:
             ""
             # logger.warning(f"⚠️ No cookie popup detected or failed to dismiss it. ⚠️")
 
+    def __wait_for_content(self, expected_markers=()):
+        # Page markers are the class names of the containers the parsers read
+        if not expected_markers:
+            return
+
+        try:
+            self.driver.wait_for_element_present(", ".join(f".{marker}" for marker in expected_markers),
+                                                 timeout=SELENIUMBASE_WAIT_TIMEOUT)
+        except Exception:
+            ""
+
+    def __track_page_load(self, started):
+        self.browser_seconds += time.time() - started
+        try:
+            self.browser_bytes += int(self.driver.execute_script(JS_TRANSFER_SIZE_SCRIPT) or 0)
+        except Exception:
+            ""
+
     def __scroll_page(self):
         try:
             # logger.info("🔄 Scrolling to trigger Lazy Loading... 🔄")
@@ -82,34 +286,181 @@ class RequestService:
         except Exception as e:
             logger.warning(f"⚠️ Failed to take screenshot: {e}")
 
-    def fetch_page_seleniumbase(self, url, max_retries=DEFAULT_RETRIES):
+    def __get_http_session(self):
+        if self.http_session is None:
+            self.http_session = requests.Session()
+
+            # socks5h so that DNS is resolved through the proxy as well
+            proxy = self.http_proxy.replace("socks5://", "socks5h://") if self.http_proxy else None
+            self.http_session.proxies = {"http": proxy, "https": proxy} if proxy else {}
+            self.http_session.headers.update({
+                "User-Agent": HTTP_USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "bg-BG,bg;q=0.9,en;q=0.8",
+            })
+
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            self.http_session.mount("http://", adapter)
+            self.http_session.mount("https://", adapter)
+
+        return self.http_session
+
+    @staticmethod
+    def is_challenge_page(html):
+        return any(marker in html for marker in HTTP_CHALLENGE_MARKERS)
+
+    @staticmethod
+    def is_usable_page(html, expected_markers=()):
+        if not html:
+            return False
+        if RequestService.is_challenge_page(html):
+            return False
+        return not expected_markers or any(marker in html for marker in expected_markers)
+
+    def fetch_page_http(self, url, expected_markers=()):
+        """
+        Fetches a page with a plain HTTP session over the proxy.
+        Returns None if the response is not usable (bad status, challenge page or missing markers).
+        """
+        return self.__fetch_http(url, expected_markers)[0]
+
+    def __fetch_http(self, url, expected_markers=(), headers=None):
+        # Returns (html, response), the response is kept for its status and cache validators
+        self.__pace()
+
+        try:
+            started = time.time()
+            response = self.__get_http_session().get(url, timeout=HTTP_TIMEOUT, headers=headers)
+
+            observe("fetch_http", time.time() - started, proxy=self.proxy)
+
+            if response.status_code != 200:
+                # Challenge and block pages usually come with a 403/503 rather than a 200
+                blocked = response.status_code in ADAPTIVE_BLOCK_STATUSES or (
+                    response.status_code != 304 and self.is_challenge_page(
+                        decode_html(response.content, response.headers.get("Content-Type", ""))))
+                self.__record(response.status_code == 304, time.time() - started, blocked=blocked)
+                increment(f"http_{response.status_code}", proxy=self.proxy)
+                if blocked:
+                    self.rotate_circuit(f"HTTP {response.status_code}")
+                return None, response
+
+            html = decode_html(response.content, response.headers.get("Content-Type", ""))
+
+            if self.is_challenge_page(html):
+                self.__record(False, blocked=True)
+                increment("challenge_page", proxy=self.proxy)
+                self.rotate_circuit("challenge page")
+                return None, response
+
+            self.__record(True, time.time() - started)
+            self.__track_latency(time.time() - started)
+            return (html if self.is_usable_page(html, expected_markers) else None), response
+
+        except requests.exceptions.Timeout:
+            self.__record(False, blocked=True)
+            increment("http_timeout", proxy=self.proxy)
+            self.rotate_circuit("timeout")
+            return None, None
+
+        except requests.exceptions.RequestException as e:
+            self.__record(False)
+            increment("http_error", proxy=self.proxy, error=type(e).__name__)
+            return None, None
+
+    def __record(self, ok, latency=None, blocked=False):
+        if self.rate:
+            self.rate.record(ok, latency, blocked)
+
+    def fetch_page(self, url, max_retries=DEFAULT_RETRIES, expected_markers=()):
+        """
+        Tries the plain HTTP path first and escalates to SeleniumBase only when it doesn't return a usable page.
+        """
+        return self.fetch_page_with_path(url, max_retries, expected_markers)[0]
+
+    def fetch_page_with_path(self, url, max_retries=DEFAULT_RETRIES, expected_markers=()):
+        """
+        Same as fetch_page, returns (html, fetch path, status) where the path is "cache", "http", "browser" or None when
+        all failed, and status is the HTTP status of the response the page came from (None for a fresh cache hit or
+        the browser, which don't expose one).
+        """
+        cached = self.cache.get(url) if self.cache else None
+        if cached and cached["fresh"]:
+            self.fetch_counts["cache"] += 1
+            increment("cache_hit")
+            return cached["html"], "cache", None
+
+        if HTTP_FETCH_ENABLED:
+            html, response = self.__fetch_http(url, expected_markers, ResponseCache.get_conditional_headers(cached))
+
+            if cached and response is not None and response.status_code == 304:
+                self.cache.refresh(url)
+                self.fetch_counts["cache"] += 1
+                return cached["html"], "cache", response.status_code
+
+            if html:
+                self.fetch_counts["http"] += 1
+                if self.cache:
+                    self.cache.put(url, html, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                return html, "http", response.status_code
+
+        if not BROWSER_FALLBACK_ENABLED:
+            self.fetch_counts["failed"] += 1
+            return None, None, None
+
+        html = self.fetch_page_seleniumbase(url, max_retries=max_retries, expected_markers=expected_markers)
+        self.fetch_counts["browser" if html else "failed"] += 1
+
+        if html and self.cache and self.is_usable_page(html, expected_markers):
+            self.cache.put(url, html)
+
+        return html, "browser" if html else None, None
+
+    def fetch_page_seleniumbase(self, url, max_retries=DEFAULT_RETRIES, expected_markers=()):
+        """
+        Loads a page in the reused Chrome. In lean mode images, fonts, media and third-party scripts are blocked,
+        the load is eager and it waits for the container of the expected markers instead of scrolling for lazy loading.
+        """
         for attempt in range(max_retries):
+            # Failed attempts are retried after a jittered, exponentially growing delay instead of immediately
+            self.__pace(attempt or None)
+
             try:
+                started = time.time()
                 # logger.info(f"🚀 Fetching page with SeleniumBase: {url} using: {self.proxy} 🚀")
 
-                self.driver = Driver(
-                    uc              =       SELENIUMBASE_UC_MODE,
-                    incognito       =       SELENIUMBASE_INCOGNITO_MODE,
-                    headless        =       SELENIUMBASE_HEADLESS_MODE,
-                    disable_csp     =       SELENIUMBASE_DISABLE_CSR_MODE,
-                    d_width         =       SELENIUMBASE_DISPLAY_WIDTH,
-                    d_height        =       SELENIUMBASE_DISPLAY_HEIGHT,
-                    proxy           =       self.proxy,
-                )
+                self.__open_driver()
 
                 # logger.info(f"🌍 Using Tor | Attempt: {attempt + 1} | IP: {get_current_tor_ip(self.full_proxy)} | Agent: {self.driver.get_user_agent()} 🌍")
 
-                self.driver.uc_open_with_reconnect(url)
+                with timed("page_open", proxy=self.proxy):
+                    self.driver.uc_open_with_reconnect(url)
 
-                self.__resolve_captcha()
+                with timed("captcha_and_cookies", proxy=self.proxy):
+                    captcha_appeared = self.__resolve_captcha()
 
-                self.__handle_cookie_popup()
+                    self.__handle_cookie_popup()
 
-                self.__resolve_captcha()
+                    captcha_appeared = self.__resolve_captcha() or captcha_appeared
 
-                self.__scroll_page()
+                with timed("content_wait" if SELENIUMBASE_LEAN_MODE else "scroll_page", proxy=self.proxy):
+                    if SELENIUMBASE_LEAN_MODE:
+                        self.__wait_for_content(expected_markers)
+                    else:
+                        self.__scroll_page()
 
                 html = self.driver.get_page_source()
+                self.pages_on_driver += 1
+                self.__track_page_load(started)
+                self.__record(not captcha_appeared, time.time() - started, blocked=captcha_appeared)
+                observe("fetch_browser", time.time() - started, proxy=self.proxy)
+
+                # A challenge means this browser fingerprint is flagged, start the next page on a fresh one
+                if captcha_appeared:
+                    increment("captcha", proxy=self.proxy)
+                    self.rotate_circuit("captcha appeared")
+                    if self.reuse_driver:
+                        self.__recycle_driver("captcha appeared")
 
                 logger.info(f"✅ Page {url} successfully retrieved with SeleniumBase! ✅")
                 return html
@@ -117,10 +468,13 @@ class RequestService:
             except Exception as e:
                 # logger.error(f"❌ SeleniumBase failed to fetch page: {url}.\n Trying again... \nReason: {str(e)}❌")
 
+                self.__record(False)
+                increment("browser_error", proxy=self.proxy, error=type(e).__name__)
                 self.__close_driver()
 
             finally:
-                self.__close_driver()
+                if not self.reuse_driver:
+                    self.__close_driver()
 
         logger.error(f"🚨 All retries failed! Unable to fetch page: {url} 🚨")
         return None
\ No newline at end of file
@@ -0,0 +1,384 @@
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import WORK_QUEUE_URL, WORK_QUEUE_PREFIX, WORK_QUEUE_LEASE, WORK_QUEUE_HEARTBEAT_INTERVAL, \
+    WORK_QUEUE_REQUEUE_INTERVAL, FRONTIER_MAX_ATTEMPTS
+from src.shared.service.frontier_service import create_frontier_database, enqueue_tasks, claim_task, heartbeat_task, \
+    requeue_expired, complete_task, fail_task, count_unfinished, get_frontier_stats, push_results, pop_results, \
+    mark_truncated
+from src.shared.utils.db_util import execute
+from src.shared.service.logger_service import LoggingService
+
+logger = LoggingService().initialize_logger()
+
+
+def create_work_queue(url: str = WORK_QUEUE_URL):
+    """
+    sqlite:///path/to/queue.db for workers on one host (or sharing the file), redis://host:port/db for several
+    machines. Any Redis-compatible server with Lua scripting (Redis, Valkey, KeyDB...) works.
+    """
+    if url.startswith("sqlite:///"):
+        return SqliteWorkQueue(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisWorkQueue(url)
+    raise ValueError(f"❌ Unsupported work queue URL: {url} ❌")
+
+def get_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SqliteWorkQueue:
+    """
+    The crawl frontier (frontier_service) behind the work queue interface, plus a results table the workers
+    send their results to. Expired leases are swept at most every WORK_QUEUE_REQUEUE_INTERVAL seconds.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.last_requeue = 0
+
+    def create(self) -> None:
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        create_frontier_database(self.db_path)
+
+    def clear(self) -> None:
+        execute(self.db_path, "DELETE FROM frontier")
+        execute(self.db_path, "DELETE FROM results")
+
+    def enqueue(self, kind: str, tasks: Iterable[Dict[str, Any]]) -> None:
+        enqueue_tasks(self.db_path, kind, tasks)
+
+    def claim(self, kinds: Iterable[str], worker: Optional[str] = None,
+              lease: Optional[float] = WORK_QUEUE_LEASE) -> Optional[Dict[str, Any]]:
+        if lease and time.time() - self.last_requeue >= WORK_QUEUE_REQUEUE_INTERVAL:
+            self.requeue_expired()
+        return claim_task(self.db_path, kinds, worker, lease)
+
+    def heartbeat(self, task_id, worker: str, lease: float = WORK_QUEUE_LEASE) -> bool:
+        return heartbeat_task(self.db_path, task_id, worker, lease)
+
+    def requeue_expired(self) -> int:
+        self.last_requeue = time.time()
+        return requeue_expired(self.db_path)
+
+    def complete(self, task_id, worker: Optional[str] = None) -> bool:
+        return complete_task(self.db_path, task_id, worker)
+
+    def fail(self, task_id, error: str, worker: Optional[str] = None) -> bool:
+        return fail_task(self.db_path, task_id, error, worker=worker)
+
+    def mark_truncated(self, task_id) -> None:
+        mark_truncated(self.db_path, task_id)
+
+    def count_unfinished(self, kinds: Iterable[str]) -> int:
+        return count_unfinished(self.db_path, kinds)
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return get_frontier_stats(self.db_path)
+
+    def push_results(self, items: List[Any]) -> None:
+        push_results(self.db_path, [json.dumps(item, ensure_ascii=False) for item in items])
+
+    def pop_results(self, limit: int) -> List[Any]:
+        return [json.loads(item) for item in pop_results(self.db_path, limit)]
+
+
+# Tasks are hashes, pending tasks sit in a sorted set per kind (best first), claimed ones in a sorted set of
+# lease deadlines. Every state change is one Lua script, so claims are atomic like the SQLite UPDATE ... RETURNING.
+REDIS_ENQUEUE_SCRIPT = """
+local p, now, added = ARGV[1], ARGV[2], 0
+for i = 3, #ARGV, 5 do
+    local kind, url, payload, priority, weight = ARGV[i], ARGV[i + 1], ARGV[i + 2], ARGV[i + 3], ARGV[i + 4]
+    if redis.call('HEXISTS', p .. ':urls', url) == 0 then
+        local id = string.format('%012d', redis.call('INCR', p .. ':seq'))
+        local score = -(tonumber(priority) * 10000000 + math.min(tonumber(weight), 9999999))
+        redis.call('HSET', p .. ':urls', url, id)
+        redis.call('HSET', p .. ':task:' .. id, 'kind', kind, 'url', url, 'payload', payload, 'weight', weight,
+                   'score', score, 'state', 'pending', 'attempts', 0, 'updated_at', now)
+        redis.call('ZADD', p .. ':pending:' .. kind, score, id)
+        redis.call('HINCRBY', p .. ':counts', kind .. ':pending', 1)
+        added = added + 1
+    end
+end
+return added
+"""
+
+REDIS_CLAIM_SCRIPT = """
+local p, now, lease_until, worker = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+local best_id, best_kind, best_score
+for i = 5, #ARGV do
+    local head = redis.call('ZRANGE', p .. ':pending:' .. ARGV[i], 0, 0, 'WITHSCORES')
+    if head[1] then
+        local score = tonumber(head[2])
+        if not best_id or score < best_score or (score == best_score and head[1] < best_id) then
+            best_id, best_kind, best_score = head[1], ARGV[i], score
+        end
+    end
+end
+if not best_id then
+    return false
+end
+local key = p .. ':task:' .. best_id
+redis.call('ZREM', p .. ':pending:' .. best_kind, best_id)
+redis.call('HSET', key, 'state', 'in_flight', 'worker', worker, 'updated_at', now)
+local attempts = redis.call('HINCRBY', key, 'attempts', 1)
+if lease_until ~= '' then
+    redis.call('ZADD', p .. ':leases', lease_until, best_id)
+end
+redis.call('HINCRBY', p .. ':counts', best_kind .. ':pending', -1)
+redis.call('HINCRBY', p .. ':counts', best_kind .. ':in_flight', 1)
+local task = redis.call('HMGET', key, 'url', 'payload', 'weight')
+return {best_id, best_kind, task[1], task[2], attempts, task[3]}
+"""
+
+REDIS_HEARTBEAT_SCRIPT = """
+local p, id, worker, lease_until = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+local task = redis.call('HMGET', p .. ':task:' .. id, 'state', 'worker')
+if task[1] ~= 'in_flight' or task[2] ~= worker then
+    return 0
+end
+redis.call('ZADD', p .. ':leases', lease_until, id)
+return 1
+"""
+
+# An expired lease is a failed attempt, the task is failed once it ran out of attempts
+REDIS_REQUEUE_SCRIPT = """
+local p, now, max_attempts = ARGV[1], ARGV[2], tonumber(ARGV[3])
+local expired = redis.call('ZRANGEBYSCORE', p .. ':leases', '-inf', '(' .. now)
+for _, id in ipairs(expired) do
+    local key = p .. ':task:' .. id
+    local task = redis.call('HMGET', key, 'kind', 'score', 'attempts')
+    local new_state = tonumber(task[3]) >= max_attempts and 'failed' or 'pending'
+    redis.call('ZREM', p .. ':leases', id)
+    redis.call('HSET', key, 'state', new_state, 'last_error', 'Lease expired', 'updated_at', now)
+    if new_state == 'pending' then
+        redis.call('ZADD', p .. ':pending:' .. task[1], task[2], id)
+    end
+    redis.call('HINCRBY', p .. ':counts', task[1] .. ':in_flight', -1)
+    redis.call('HINCRBY', p .. ':counts', task[1] .. ':' .. new_state, 1)
+end
+return #expired
+"""
+
+# ARGV[4] is "done" or "fail", a fail goes back to pending until the task ran out of attempts
+REDIS_FINISH_SCRIPT = """
+local p, id, worker, action, error, max_attempts, now = ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5], ARGV[6], ARGV[7]
+local key = p .. ':task:' .. id
+local task = redis.call('HMGET', key, 'state', 'worker', 'kind', 'attempts', 'score')
+local state, kind = task[1], task[3]
+if worker ~= '' then
+    if state ~= 'in_flight' or task[2] ~= worker then
+        return 0
+    end
+elseif state ~= 'pending' and state ~= 'in_flight' then
+    return 0
+end
+redis.call('ZREM', p .. ':pending:' .. kind, id)
+redis.call('ZREM', p .. ':leases', id)
+local new_state = 'done'
+if action == 'fail' then
+    new_state = tonumber(task[4]) >= tonumber(max_attempts) and 'failed' or 'pending'
+    redis.call('HSET', key, 'last_error', error)
+end
+if new_state == 'pending' then
+    redis.call('ZADD', p .. ':pending:' .. kind, task[5], id)
+end
+redis.call('HSET', key, 'state', new_state, 'updated_at', now)
+redis.call('HINCRBY', p .. ':counts', kind .. ':' .. state, -1)
+redis.call('HINCRBY', p .. ':counts', kind .. ':' .. new_state, 1)
+return 1
+"""
+
+REDIS_POP_RESULTS_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+end
+return items
+"""
+
+
+class RedisWorkQueue:
+    """
+    Work queue on a Redis-compatible server, for coordinators and workers on different machines.
+    Same interface and claim order as SqliteWorkQueue (priority, then weight, then age). All keys start with prefix,
+    so several crawls can share one server. Needs the redis package; a client (e.g. fakeredis) can be passed instead.
+    """
+
+    def __init__(self, url: Optional[str] = None, prefix: str = WORK_QUEUE_PREFIX, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("❌ The redis package is needed for a redis:// work queue (pip install redis) ❌")
+            client = redis.Redis.from_url(url, decode_responses=True)
+
+        self.client = client
+        self.prefix = prefix
+        self.last_requeue = 0
+
+        self.enqueue_script = client.register_script(REDIS_ENQUEUE_SCRIPT)
+        self.claim_script = client.register_script(REDIS_CLAIM_SCRIPT)
+        self.heartbeat_script = client.register_script(REDIS_HEARTBEAT_SCRIPT)
+        self.requeue_script = client.register_script(REDIS_REQUEUE_SCRIPT)
+        self.finish_script = client.register_script(REDIS_FINISH_SCRIPT)
+        self.pop_results_script = client.register_script(REDIS_POP_RESULTS_SCRIPT)
+
+    def create(self) -> None:
+        self.client.ping()
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=f"{self.prefix}:*", count=1000))
+        for start in range(0, len(keys), 1000):
+            self.client.delete(*keys[start:start + 1000])
+
+    def enqueue(self, kind: str, tasks: Iterable[Dict[str, Any]], batch_size: int = 500) -> None:
+        args = []
+        for task in tasks:
+            args += [kind, task["url"], json.dumps(task.get("payload", {}), ensure_ascii=False),
+                     task.get("priority", 0), task.get("weight", 0) or 0]
+            if len(args) >= batch_size * 5:
+                self.enqueue_script(args=[self.prefix, time.time(), *args])
+                args = []
+        if args:
+            self.enqueue_script(args=[self.prefix, time.time(), *args])
+
+    def claim(self, kinds: Iterable[str], worker: Optional[str] = None,
+              lease: Optional[float] = WORK_QUEUE_LEASE) -> Optional[Dict[str, Any]]:
+        if lease and time.time() - self.last_requeue >= WORK_QUEUE_REQUEUE_INTERVAL:
+            self.requeue_expired()
+
+        now = time.time()
+        row = self.claim_script(args=[self.prefix, now, now + lease if lease else "", worker or "", *kinds])
+        if not row:
+            return None
+
+        task_id, kind, url, payload, attempts, weight = row
+        return {"id": task_id, "kind": kind, "url": url, "payload": json.loads(payload or "{}"),
+                "attempts": int(attempts), "weight": int(weight or 0)}
+
+    def heartbeat(self, task_id, worker: str, lease: float = WORK_QUEUE_LEASE) -> bool:
+        return bool(self.heartbeat_script(args=[self.prefix, task_id, worker, time.time() + lease]))
+
+    def requeue_expired(self) -> int:
+        self.last_requeue = time.time()
+        return int(self.requeue_script(args=[self.prefix, time.time(), FRONTIER_MAX_ATTEMPTS]))
+
+    def complete(self, task_id, worker: Optional[str] = None) -> bool:
+        return bool(self.finish_script(args=[self.prefix, task_id, worker or "", "done", "", 0, time.time()]))
+
+    def fail(self, task_id, error: str, worker: Optional[str] = None) -> bool:
+        return bool(self.finish_script(args=[self.prefix, task_id, worker or "", "fail", error, FRONTIER_MAX_ATTEMPTS,
+                                             time.time()]))
+
+    def mark_truncated(self, task_id) -> None:
+        self.client.hset(f"{self.prefix}:task:{task_id}", "truncated", 1)
+
+    def count_unfinished(self, kinds: Iterable[str]) -> int:
+        fields = [f"{kind}:{state}" for kind in kinds for state in ("pending", "in_flight")]
+        return sum(int(count or 0) for count in self.client.hmget(f"{self.prefix}:counts", fields))
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        stats: Dict[str, Dict[str, int]] = {}
+        for field, count in self.client.hgetall(f"{self.prefix}:counts").items():
+            kind, state = field.split(":", 1)
+            if int(count):
+                stats.setdefault(kind, {})[state] = int(count)
+        return stats
+
+    def push_results(self, items: List[Any]) -> None:
+        self.client.rpush(f"{self.prefix}:results", *[json.dumps(item, ensure_ascii=False) for item in items])
+
+    def pop_results(self, limit: int) -> List[Any]:
+        return [json.loads(item) for item in self.pop_results_script(keys=[f"{self.prefix}:results"], args=[limit])]
+
+
+class LeaseLost(Exception):
+    """
+    Raised by LeaseKeeper.check() when the lease of the running task was lost, so its handler stops before
+    storing or enqueuing anything the next worker to claim the task would produce again.
+    """
+
+
+class LeaseKeeper:
+    """
+    One heartbeat thread per worker process: every WORK_QUEUE_HEARTBEAT_INTERVAL seconds it renews the lease of the
+    task the worker is running (track()), so slow tasks keep their lease and only the tasks of dead workers expire.
+    When a heartbeat finds the lease lost anyway it only sets `lost`, the handler checks it (check()) at the points
+    where it is about to store or enqueue its results.
+    """
+
+    def __init__(self, work_queue, worker: str, lease: float = WORK_QUEUE_LEASE,
+                 interval: float = WORK_QUEUE_HEARTBEAT_INTERVAL):
+        self.work_queue = work_queue
+        self.worker = worker
+        self.lease = lease
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.task_id = None
+        self.lost = False
+
+    def start(self):
+        self.thread = threading.Thread(target=self.__run, name="lease-keeper", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+
+    @contextmanager
+    def track(self, task_id):
+        with self.lock:
+            self.task_id = task_id
+            self.lost = False
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.task_id = None
+
+    def check(self) -> None:
+        if self.lost:
+            raise LeaseLost(f"Lost the lease of task {self.task_id}")
+
+    def __run(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                task_id = self.task_id
+            if task_id is None:
+                continue
+
+            try:
+                held = self.work_queue.heartbeat(task_id, self.worker, self.lease)
+            except Exception as e:
+                logger.warn(f"⚠️ Heartbeat of task {task_id} failed: {e} ⚠️")
+                continue
+
+            if not held:
+                with self.lock:
+                    if self.task_id == task_id:
+                        self.lost = True
+                        logger.warn(f"⚠️ Lost the lease of task {task_id}, another worker may run it too ⚠️")
+
+
+class ResultQueue:
+    """
+    Takes the place of a DB writer's queue on worker nodes: items go straight to the work queue's results,
+    before the task that produced them is completed, so nothing a finished task produced is lost with its worker.
+    """
+
+    def __init__(self, work_queue):
+        self.work_queue = work_queue
+
+    def put(self, item) -> None:
+        self.work_queue.push_results([item])
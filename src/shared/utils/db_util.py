@@ -1,36 +1,124 @@
+import atexit
 import os
 import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Tuple, Union
 
-from config import DB_TIMEOUT
+from config import DB_TIMEOUT, DB_CACHE_CONNECTIONS, DB_PRAGMAS
 
+# Connections are cached per process and thread, sqlite3 connections can't be shared across either
+_connections: Dict[Tuple[int, int, str], sqlite3.Connection] = {}
 
-def execute(db_path, query: str, params: Union[Tuple, List[Tuple]] = (), many: bool = False) -> None:
-    with sqlite3.connect(db_path, timeout=DB_TIMEOUT) as conn:
-        cursor = conn.cursor()
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    Opens a new connection with the tuned PRAGMAs applied.
+    """
+    conn = sqlite3.connect(db_path, timeout=DB_TIMEOUT, cached_statements=256)
+    for pragma, value in DB_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={value};")
+    return conn
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """
+    Returns the connection cached for this process, thread and database, opening it on first use.
+    Reusing it also reuses sqlite's prepared statements for identical SQL text.
+    """
+    key = (os.getpid(), threading.get_ident(), os.path.abspath(db_path))
+
+    conn = _connections.get(key)
+    if conn is None:
+        conn = _connections[key] = connect(db_path)
+
+    return conn
+
+def close_connections() -> None:
+    for key, conn in list(_connections.items()):
+        if key[0] == os.getpid():
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        del _connections[key]
+
+atexit.register(close_connections)
+
+@contextmanager
+def __connection(db_path):
+    if DB_CACHE_CONNECTIONS:
+        yield get_connection(db_path)
+        return
+
+    conn = sqlite3.connect(db_path, timeout=DB_TIMEOUT)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+@lru_cache(maxsize=256)
+def insert_query(table: str, keys: Tuple[str, ...], conflict: str = "IGNORE") -> str:
+    return f"INSERT OR {conflict} INTO {table} ({', '.join(keys)}) VALUES ({', '.join(['?'] * len(keys))})"
+
+def execute(db_path, query: str, params: Union[Tuple, List[Tuple]] = (), many: bool = False,
+            conn: Optional[sqlite3.Connection] = None) -> None:
+    # With a caller owned connection the statement joins its open transaction, committing is up to the caller
+    if conn is not None:
         if many:
-            cursor.executemany(query, params)
+            conn.executemany(query, params)
         else:
-            cursor.execute(query, params)
-        conn.commit()
+            conn.execute(query, params)
+        return
+
+    with __connection(db_path) as conn:
+        try:
+            if many:
+                conn.executemany(query, params)
+            else:
+                conn.execute(query, params)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def execute_returning(db_path, query: str, params: Tuple = ()) -> List[Tuple]:
+    """
+    Runs a single write statement with a RETURNING clause, commits it and returns the returned rows.
+    """
+    with __connection(db_path) as conn:
+        try:
+            rows = conn.execute(query, params).fetchall()
+            conn.commit()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
 
 def run_script(db_path: str, script: str) -> None:
-    with sqlite3.connect(db_path, timeout=DB_TIMEOUT) as conn:
-        cursor = conn.cursor()
-        cursor.executescript(script)
+    with __connection(db_path) as conn:
+        conn.executescript(script)
         conn.commit()
 
 def fetch_all(db_path, query: str, params: Tuple = ()) -> List[Tuple]:
-    with sqlite3.connect(db_path, timeout=DB_TIMEOUT) as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        return cursor.fetchall()
+    with __connection(db_path) as conn:
+        return conn.execute(query, params).fetchall()
+
+def fetch_one(db_path, query: str, params: Tuple = (), conn: Optional[sqlite3.Connection] = None) -> Optional[Tuple]:
+    if conn is not None:
+        return conn.execute(query, params).fetchone()
 
-def fetch_one(db_path, query: str, params: Tuple = ()) -> Optional[Tuple]:
-    with sqlite3.connect(db_path, timeout=DB_TIMEOUT) as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        return cursor.fetchone()
+    with __connection(db_path) as conn:
+        return conn.execute(query, params).fetchone()
+
+def add_missing_columns(db_path, table: str, columns: Dict[str, str]) -> None:
+    """
+    Adds the columns (name -> type) a table created by an older schema doesn't have yet.
+    """
+    existing = {row[1] for row in fetch_all(db_path, f"PRAGMA table_info({table})")}
+    for name, column_type in columns.items():
+        if name not in existing:
+            execute(db_path, f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
 
 def init_db(db_path, schema_sql: str):
     if not os.path.exists(db_path):
@@ -40,19 +128,18 @@ def init_db(db_path, schema_sql: str):
     execute(db_path, "PRAGMA journal_mode=WAL;")
     run_script(db_path, schema_sql)
 
-def insert_dict(db_path, table: str, data: Dict[str, Any]) -> None:
-    keys = ', '.join(data.keys())
-    placeholders = ', '.join(['?'] * len(data))
-    values = tuple(data.values())
-    query = f"INSERT OR IGNORE INTO {table} ({keys}) VALUES ({placeholders})"
-    execute(db_path, query, values)
+def insert_dict(db_path, table: str, data: Dict[str, Any], conn: Optional[sqlite3.Connection] = None) -> None:
+    query = insert_query(table, tuple(data.keys()))
+    execute(db_path, query, tuple(data.values()), conn=conn)
+
+def upsert_dict(db_path, table: str, data: Dict[str, Any], conn: Optional[sqlite3.Connection] = None) -> None:
+    query = insert_query(table, tuple(data.keys()), "REPLACE")
+    execute(db_path, query, tuple(data.values()), conn=conn)
 
-def insert_batch_dicts(db_path, table: str, data_list: List[Dict[str, Any]]) -> None:
+def insert_batch_dicts(db_path, table: str, data_list: List[Dict[str, Any]],
+                       conn: Optional[sqlite3.Connection] = None) -> None:
     if not data_list:
         return
-    keys = data_list[0].keys()
-    keys_str = ', '.join(keys)
-    placeholders = ', '.join(['?'] * len(keys))
+    query = insert_query(table, tuple(data_list[0].keys()))
     values = [tuple(d.values()) for d in data_list]
-    query = f"INSERT OR IGNORE INTO {table} ({keys_str}) VALUES ({placeholders})"
-    execute(db_path, query, values, many=True)
\ No newline at end of file
+    execute(db_path, query, values, many=True, conn=conn)
\ No newline at end of file
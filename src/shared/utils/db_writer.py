@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import threading
+import time
+from multiprocessing import Queue
+from queue import Empty
+from typing import Any, Callable, List
+
+from config import BATCH_SIZE, DB_WRITER_FLUSH_INTERVAL, DB_WRITER_QUEUE_SIZE, DB_WRITER_LOG_INTERVAL
+from src.shared.service.logger_service import LoggingService
+from src.shared.utils.db_util import connect
+from src.shared.service.metrics_service import observe, increment
+
+logger = LoggingService().initialize_logger()
+
+
+class DbWriter:
+    """
+    Single writer for a SQLite database.
+    Worker processes put items on `queue`, a thread in the owning process groups them into batches
+    and writes every batch with write_batch(conn, items) in one transaction on one long-lived connection.
+    """
+
+    def __init__(self, db_path: str, write_batch: Callable[[sqlite3.Connection, List[Any]], int],
+                 batch_size: int = BATCH_SIZE,
+                 flush_interval: float = DB_WRITER_FLUSH_INTERVAL,
+                 queue_size: int = DB_WRITER_QUEUE_SIZE,
+                 retries: int = 5):
+        self.db_path = db_path
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+
+        self.queue = Queue(maxsize=queue_size)
+        self.thread = None
+        self.error = None
+
+        self.items_written = 0
+        self.rows_written = 0
+        self.batches_written = 0
+        self.started_at = None
+        self.last_log = 0
+
+    def start(self):
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self.__run, name="db-writer", daemon=True)
+        self.thread.start()
+        return self
+
+    def put(self, item):
+        self.__check_alive()
+        self.queue.put(item)
+
+    def stop(self):
+        if self.thread:
+            self.__check_alive()
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            self.__check_alive()
+            logger.info(f"📊 DB writer finished: {self.get_stats()} 📊")
+
+    def __check_alive(self):
+        # Nothing drains the bounded queue once the thread is gone, the producers would block on it forever
+        if self.error is not None or (self.thread is not None and not self.thread.is_alive()):
+            raise RuntimeError(f"❌ DB writer of {self.db_path} died: {self.error} ❌")
+
+    def get_queue_depth(self):
+        try:
+            return self.queue.qsize()
+        except NotImplementedError:  # macOS
+            return -1
+
+    def get_stats(self):
+        elapsed = max(time.time() - self.started_at, 1e-9) if self.started_at else 0
+        return {
+            "items": self.items_written,
+            "rows": self.rows_written,
+            "batches": self.batches_written,
+            "rows_per_sec": round(self.rows_written / elapsed, 1) if elapsed else 0,
+            "queue_depth": self.get_queue_depth(),
+        }
+
+    def __run(self):
+        conn = None
+        batch = []
+        last_flush = time.time()
+
+        try:
+            conn = connect(self.db_path)
+            while True:
+                try:
+                    item = self.queue.get(timeout=max(self.flush_interval - (time.time() - last_flush), 0.01))
+                except Empty:
+                    item = Empty
+
+                if item is None:
+                    break
+
+                if item is not Empty:
+                    batch.append(item)
+
+                if len(batch) >= self.batch_size or (batch and time.time() - last_flush >= self.flush_interval):
+                    self.__flush(conn, batch)
+                    batch = []
+                    last_flush = time.time()
+
+                elif not batch:
+                    last_flush = time.time()
+
+            self.__flush(conn, batch)
+        except Exception as e:
+            self.error = e
+            logger.error(f"❌ DB writer of {self.db_path} stopped: {e} ❌")
+            raise
+        finally:
+            if conn:
+                conn.close()
+
+    def __flush(self, conn, batch):
+        if not batch:
+            return
+
+        for attempt in range(self.retries):
+            try:
+                self.__write(conn, batch)
+                break
+            except sqlite3.OperationalError as e:
+                logger.warn(f"⚠️ DB writer batch failed (attempt {attempt + 1}): {e} ⚠️")
+                time.sleep(0.5 * (attempt + 1))
+            except Exception as e:
+                # Not a locked database, most likely a bad item: write them one by one so only that item is lost
+                logger.warn(f"⚠️ DB writer batch failed: {e!r}, writing its {len(batch)} items one by one ⚠️")
+                self.__write_each(conn, batch)
+                break
+        else:
+            logger.error(f"❌ DB writer dropped a batch of {len(batch)} items after {self.retries} retries ❌")
+
+        if time.time() - self.last_log >= DB_WRITER_LOG_INTERVAL:
+            self.last_log = time.time()
+            logger.info(f"📊 DB writer: {self.get_stats()} 📊")
+
+    def __write(self, conn, batch):
+        started = time.perf_counter()
+        with conn:
+            rows = self.write_batch(conn, batch)
+        observe("db_write", time.perf_counter() - started, db=os.path.basename(self.db_path))
+        increment("db_rows", rows or 0, db=os.path.basename(self.db_path))
+
+        self.items_written += len(batch)
+        self.rows_written += rows or 0
+        self.batches_written += 1
+
+    def __write_each(self, conn, batch):
+        for item in batch:
+            try:
+                self.__write(conn, [item])
+            except Exception as e:
+                increment("db_dropped_items", db=os.path.basename(self.db_path))
+                logger.error(f"❌ DB writer dropped an item it could not write: {e!r} - {str(item)[:200]} ❌")
\ No newline at end of file
@@ -0,0 +1,26 @@
+import socket
+import time
+
+
+def is_port_open(host: str, port: int, timeout: float = 0.5) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+def wait_for_port(host: str, port: int, timeout: float, is_alive=lambda: True, interval: float = 0.25) -> bool:
+    """
+    Polls until something accepts connections on the port.
+    Gives up early when is_alive() returns False, e.g. because the process that should open the port exited.
+    """
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        if is_port_open(host, port):
+            return True
+        if not is_alive():
+            return False
+        time.sleep(interval)
+
+    return False
\ No newline at end of file
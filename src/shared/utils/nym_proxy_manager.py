@@ -1,8 +1,8 @@
 import subprocess
-import time
 
-from config import NYM_CLIENT_PATH, NYM_CLIENT_ID, NYM_USE_REPLY_SUBS, NYM_CLIENT_PORT, NYM_CLIENT_PROVIDER
+from config import NYM_CLIENT_PATH, NYM_CLIENT_ID, NYM_USE_REPLY_SUBS, NYM_CLIENT_PORT, NYM_CLIENT_PROVIDER, NYM_STARTUP_TIMEOUT
 from src.shared.service.logger_service import LoggingService
+from src.shared.utils.network_util import is_port_open, wait_for_port
 
 logger = LoggingService().initialize_logger()
 
@@ -13,9 +13,11 @@ class NymProxyManager:
     # https://explorer.nymtech.net/
     # https://harbourmaster.nymtech.net/
 
-    def __init__(self):
+    def __init__(self, port=NYM_CLIENT_PORT):
         self.process = None
-        self.proxy_address = "socks5://127.0.0.1:1083"
+        self.host = "127.0.0.1"
+        self.port = port
+        self.proxy_address = f"socks5://{self.host}:{self.port}"
         self.nym_executable = NYM_CLIENT_PATH
 
     def __del__(self):
@@ -51,19 +53,28 @@ class NymProxyManager:
         except Exception as e:
             logger.warn(f"⚠️ Error initializing Nym client: {e}")
 
-    def start(self, client_id=NYM_CLIENT_ID):
-        """Starts the Nym SOCKS5 client"""
+    def start(self, client_id=NYM_CLIENT_ID, timeout=NYM_STARTUP_TIMEOUT):
+        """Starts the Nym SOCKS5 client and waits until its SOCKS port accepts connections"""
         if self.process is None:
+            if is_port_open(self.host, self.port):
+                logger.info(f"🟢 Reusing Nym SOCKS5 Proxy already listening on port {self.port}. 🟢")
+                return True
+
             print("🚀 Starting Nym SOCKS5 Proxy... 🚀")
             self.process = subprocess.Popen(
                 [self.nym_executable, "run", "--id", client_id],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+                stdout=subprocess.DEVNULL,  # Not read anywhere, a full pipe would block the client
+                stderr=subprocess.DEVNULL,
             )
-            time.sleep(5)  # Wait for Nym to initialize
+
+            if not wait_for_port(self.host, self.port, timeout, is_alive=lambda: self.process.poll() is None):
+                logger.warning(f"⚠️ Nym SOCKS5 Proxy did not open port {self.port} within {timeout}s. ⚠️")
+                return False
+
             logger.info("✅ Nym Proxy Started Successfully! ✅")
 
+        return True
+
     def stop(self):
         if self.process:
             logger.info("🛑 Stopping Nym Proxy... 🛑")
@@ -0,0 +1,65 @@
+import cProfile
+import glob
+import os
+import pstats
+from contextlib import contextmanager
+from typing import Optional
+
+from config import PROFILING_ENABLED
+from src.shared.service.logger_service import LoggingService
+
+logger = LoggingService().initialize_logger()
+
+
+class WorkerProfiler:
+    """
+    cProfile of the tasks one worker process runs. Only the tasks are profiled, not the idle waits between them,
+    and the profile is dumped to <folder>/<name>-<pid>.prof so the profiles of all workers can be merged after the run.
+    Does nothing unless PROFILING_ENABLED.
+    """
+
+    def __init__(self, folder: str, name: str, enabled: bool = PROFILING_ENABLED):
+        self.folder = folder
+        self.name = name
+        self.profile = cProfile.Profile() if enabled else None
+        self.tasks = 0
+
+    @contextmanager
+    def task(self):
+        if not self.profile:
+            yield
+            return
+
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            self.tasks += 1
+
+    def dump(self) -> Optional[str]:
+        if not self.profile or not self.tasks:
+            return None
+
+        os.makedirs(self.folder, exist_ok=True)
+        profile_file = os.path.join(self.folder, f"{self.name}-{os.getpid()}.prof")
+        self.profile.dump_stats(profile_file)
+        return profile_file
+
+
+def merge_profiles(folder: str, pattern: str = "*.prof", output_file: Optional[str] = None) -> Optional[pstats.Stats]:
+    """
+    Adds up the per-process profiles in folder. The merged profile can be saved to output_file and opened
+    with pstats, snakeviz or gprof2dot like any single profile.
+    """
+    profile_files = sorted(glob.glob(os.path.join(folder, pattern)))
+    if not profile_files:
+        logger.warning(f"⚠️ No profiles matching {pattern} in {folder} ⚠️")
+        return None
+
+    stats = pstats.Stats(*profile_files)
+    if output_file:
+        stats.dump_stats(output_file)
+
+    logger.info(f"📊 Merged {len(profile_files)} profiles from {folder} 📊")
+    return stats
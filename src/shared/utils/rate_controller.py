@@ -0,0 +1,107 @@
+import asyncio
+import random
+import time
+
+from config import ADAPTIVE_WINDOW, ADAPTIVE_TARGET_LATENCY, ADAPTIVE_MAX_ERROR_RATE, ADAPTIVE_DECREASE_FACTOR, \
+    ADAPTIVE_DECREASE_COOLDOWN, BACKOFF_BASE, BACKOFF_MAX
+
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease of a limit (requests/sec of a worker, or requests in flight).
+    Every `window` results with a good success rate and latency raise it by `increase`. Only a block (captcha,
+    challenge page, 403/429, timeout) multiplies it by `decrease`, at most once per cooldown so a burst of blocks
+    doesn't collapse it to the minimum. Plain errors (5xx, unusable pages) and slow responses aren't the site pushing
+    back, a window with too many of them only holds the limit. Consecutive blocks also grow a jittered backoff.
+    """
+
+    def __init__(self, initial, minimum, maximum, increase,
+                 decrease=ADAPTIVE_DECREASE_FACTOR,
+                 window=ADAPTIVE_WINDOW,
+                 target_latency=ADAPTIVE_TARGET_LATENCY,
+                 max_error_rate=ADAPTIVE_MAX_ERROR_RATE,
+                 cooldown=ADAPTIVE_DECREASE_COOLDOWN):
+        self.value = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.window = window
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+
+        self.results = []  # (ok, latency) of the current window
+        self.consecutive_blocks = 0
+        self.last_decrease_at = 0
+        self.stats = {"ok": 0, "errors": 0, "blocks": 0, "increases": 0, "holds": 0, "decreases": 0}
+
+    def record(self, ok, latency=None, blocked=False):
+        if blocked:
+            self.stats["blocks"] += 1
+            self.consecutive_blocks += 1
+            self.results.clear()
+            self.__decrease()
+            return
+
+        self.stats["ok" if ok else "errors"] += 1
+        if ok:
+            self.consecutive_blocks = 0
+
+        self.results.append((ok, latency))
+        if len(self.results) < self.window:
+            return
+
+        error_rate = sum(1 for ok, _ in self.results if not ok) / len(self.results)
+        latencies = [latency for ok, latency in self.results if ok and latency is not None]
+        average_latency = sum(latencies) / len(latencies) if latencies else 0
+        self.results.clear()
+
+        if error_rate > self.max_error_rate or (self.target_latency and average_latency > self.target_latency):
+            self.stats["holds"] += 1
+        else:
+            self.value = min(self.maximum, self.value + self.increase)
+            self.stats["increases"] += 1
+
+    def __decrease(self):
+        if time.time() - self.last_decrease_at < self.cooldown:
+            return
+        self.value = max(self.minimum, self.value * self.decrease)
+        self.last_decrease_at = time.time()
+        self.stats["decreases"] += 1
+
+    def get_backoff_delay(self, attempt=None):
+        """
+        Full-jitter exponential backoff: random in [0, BACKOFF_BASE * 2^attempt], capped at BACKOFF_MAX.
+        Without an attempt, it backs off by the number of blocks in a row.
+        """
+        attempt = self.consecutive_blocks if attempt is None else attempt
+        if attempt <= 0:
+            return 0
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def get_stats(self):
+        return {**self.stats, "limit": round(self.value, 2)}
+
+
+class AsyncAdaptiveLimiter:
+    """
+    Async context manager that lets at most int(controller.value) coroutines in at once, so the concurrency
+    follows the AIMD controller instead of a fixed semaphore.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < max(1, int(self.controller.value)))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
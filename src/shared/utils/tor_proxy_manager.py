@@ -1,15 +1,28 @@
+import os
+import queue
+import re
+import secrets
 import subprocess
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
 import requests
 from stem import Signal
-from stem.control import Controller
+from stem.control import Controller, EventType
 
-from config import TOR_PATH, TOR_IP_CHECKER_URL, TOR_CONTROL_PORT, TOR_PROXIES, TOR_PORT
+from config import TOR_PATH, TOR_IP_CHECKER_URL, TOR_CONTROL_PORT, TOR_PROXIES, TOR_PORT, TOR_HOST, \
+    TOR_BOOTSTRAP_TIMEOUT, TOR_STOP_TIMEOUT, NUM_TOR_INSTANCES, TOR_POOL_SOCKS_BASE_PORT, TOR_POOL_CONTROL_BASE_PORT, TOR_POOL_DATA_FOLDER
 from src.shared.service.logger_service import LoggingService
+from src.shared.utils.network_util import is_port_open
 
 logger = LoggingService().initialize_logger()
 
+BOOTSTRAP_PATTERN = re.compile(r"Bootstrapped (\d+)%")
+CONTROL_BOOTSTRAP_PATTERN = re.compile(r"PROGRESS=(\d+)")
+NEWNYM_RATE_LIMIT_PATTERN = re.compile(r"Rate limiting NEWNYM request: delaying by (\d+) second")
+
 
 def get_current_tor_ip(proxies):
     try:
@@ -21,14 +34,36 @@ def get_current_tor_ip(proxies):
         logger.warning("⚠️ Unable to fetch current Tor IP. ⚠️")
         return "Unknown"
 
+def get_isolated_proxy(proxy, session_id=None):
+    """
+    Adds SOCKS credentials to the proxy URL. Tor isolates streams by SOCKS auth (IsolateSOCKSAuth is on by default),
+    so every distinct session_id gets its own circuit without touching the circuits of other sessions.
+    """
+    if not proxy or not proxy.startswith("socks"):
+        return proxy
+
+    session_id = session_id or secrets.token_hex(8)
+    parts = urlsplit(proxy)
+
+    return f"{parts.scheme}://{session_id}:{session_id}@{parts.hostname}:{parts.port}"
+
 class TorManager:
-    def __init__(self, tor_path=TOR_PATH, control_port=TOR_CONTROL_PORT, port=TOR_PORT, proxies=TOR_PROXIES):
+    def __init__(self, tor_path=TOR_PATH, control_port=TOR_CONTROL_PORT, port=TOR_PORT, proxies=TOR_PROXIES,
+                 data_directory=None, bootstrap_timeout=TOR_BOOTSTRAP_TIMEOUT, stop_timeout=TOR_STOP_TIMEOUT):
         self.path = tor_path
         self.control_port = control_port
         self.port = port
         self.proxies = proxies
         self.process = None
 
+        # With a data directory the ports are passed on the command line instead of coming from torrc,
+        # which is what lets several instances run side by side
+        self.data_directory = data_directory
+        self.bootstrap_timeout = bootstrap_timeout
+        self.bootstrap_progress = 0
+        self.bootstrapped = threading.Event()
+        self.stop_timeout = stop_timeout
+
     def __del__(self):
         if self.process:
             try:
@@ -36,28 +71,117 @@ class TorManager:
             except:
                 pass
 
+    def __command(self):
+        command = [self.path]
+
+        if self.data_directory:
+            os.makedirs(self.data_directory, exist_ok=True)
+            command += [
+                "--SocksPort", str(self.port),
+                "--ControlPort", str(self.control_port),
+                "--DataDirectory", os.path.abspath(self.data_directory),
+                "--CookieAuthentication", "1",
+            ]
+
+        return command
+
+    def __read_output(self, process):
+        # Keeps draining stdout for the whole life of the process, otherwise Tor blocks once the pipe buffer is full
+        for line in process.stdout:
+            match = BOOTSTRAP_PATTERN.search(line)
+            if match:
+                self.bootstrap_progress = int(match.group(1))
+                if self.bootstrap_progress == 100:
+                    self.bootstrapped.set()
+
+    def get_bootstrap_progress(self):
+        """
+        Asks the control port for the bootstrap phase, returns None when the control port is not usable (yet).
+        """
+        if not is_port_open(TOR_HOST, self.control_port):
+            return None
+
+        try:
+            with Controller.from_port(address=TOR_HOST, port=self.control_port) as controller:
+                controller.authenticate()
+                match = CONTROL_BOOTSTRAP_PATTERN.search(controller.get_info("status/bootstrap-phase"))
+                return int(match.group(1)) if match else 0
+        except Exception:
+            return None
+
+    def is_running(self):
+        return is_port_open(TOR_HOST, self.port)
+
+    def wait_for_bootstrap(self, timeout=None):
+        """
+        Blocks until Tor reports "Bootstrapped 100%" on stdout or on the control port, the process exits or the timeout expires.
+        The control port covers setups where torrc sends the log to a file.
+        """
+        deadline = time.time() + (timeout or self.bootstrap_timeout)
+
+        while time.time() < deadline:
+            if self.bootstrapped.wait(0.5):
+                return True
+            if self.process is None or self.process.poll() is not None:
+                return False
+
+            progress = self.get_bootstrap_progress()
+            if progress is not None:
+                self.bootstrap_progress = max(self.bootstrap_progress, progress)
+                if progress == 100:
+                    self.bootstrapped.set()
+
+        return self.bootstrapped.is_set()
+
     def start(self):
         if self.process:
             logger.info("🟢 Tor service is already running. 🟢")
-            return
+            return True
+
+        # A Tor left running from a previous run (or started by hand) is reused instead of starting another one
+        if self.is_running():
+            progress = self.get_bootstrap_progress()
+            logger.info(f"🟢 Reusing Tor already listening on port {self.port} (bootstrap: {f'{progress}%' if progress is not None else 'unknown'}). 🟢")
+            return True
 
         try:
-            logger.info("🔄 Starting Tor service... 🔄")
-            self.process = subprocess.Popen([self.path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            time.sleep(5)
-            logger.info("✅ Tor service started successfully! ✅")
+            logger.info(f"🔄 Starting Tor service on port {self.port}... 🔄")
+            self.bootstrap_progress = 0
+            self.bootstrapped.clear()
+
+            self.process = subprocess.Popen(self.__command(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                            text=True, errors="replace")
+            threading.Thread(target=self.__read_output, args=(self.process,), daemon=True).start()
+
+            if not self.wait_for_bootstrap():
+                logger.warning(f"⚠️ Tor on port {self.port} did not finish bootstrapping ({self.bootstrap_progress}%). ⚠️")
+                return False
+
+            logger.info(f"✅ Tor service started successfully on port {self.port}! ✅")
+            return True
         except Exception as e:
             logger.error(f"❌ Failed to start Tor: {e}")
+            return False
 
     def stop(self):
         if self.process:
             try:
-                logger.info("🛑 Stopping Tor service... 🛑")
+                logger.info(f"🛑 Stopping Tor service on port {self.port}... 🛑")
                 self.process.terminate()
-                self.process = None
+
+                # Waiting reaps the process, without it every stopped Tor stays behind as a zombie
+                try:
+                    self.process.wait(timeout=self.stop_timeout)
+                except subprocess.TimeoutExpired:
+                    logger.warning(f"⚠️ Tor on port {self.port} did not exit within {self.stop_timeout}s, killing it ⚠️")
+                    self.process.kill()
+                    self.process.wait()
+
                 logger.info("✅ Tor service stopped successfully! ✅")
             except Exception as e:
                 logger.error(f"❌ Failed to stop Tor: {e}")
+            finally:
+                self.process = None
 
     def request_new_identity(self):
         """
@@ -66,16 +190,124 @@ class TorManager:
         """
         try:
             logger.info("🔄 Requesting new Tor IP... 🔄")
-            with Controller.from_port(port=self.control_port) as controller:
+            with Controller.from_port(address=TOR_HOST, port=self.control_port) as controller:
                 controller.authenticate()
+
+                notices = queue.Queue()
+                controller.add_event_listener(lambda event: notices.put(event.message), EventType.NOTICE)
+
                 controller.signal(Signal.NEWNYM)
-            time.sleep(5)  # Wait for Tor to apply changes
+
+                # Tor only announces something when it has to delay the NEWNYM, otherwise it applies it right away
+                delay = self.__get_newnym_delay(notices)
+                if delay:
+                    logger.info(f"⏳ NEWNYM is rate limited, waiting {delay}s ⏳")
+                    time.sleep(delay)
+
             logger.info("✅ New Tor identity acquired.")
         except Exception as e:
             logger.warning(f"⚠️ Failed to request new Tor identity: {e}")
 
+    @staticmethod
+    def __get_newnym_delay(notices, timeout=0.5):
+        deadline = time.time() + timeout
+
+        while time.time() < deadline:
+            try:
+                match = NEWNYM_RATE_LIMIT_PATTERN.search(notices.get(timeout=max(deadline - time.time(), 0.01)))
+                if match:
+                    return int(match.group(1))
+            except queue.Empty:
+                break
+
+        return 0
+
     def restart(self):
         logger.info("🔄 Restarting Tor service... 🔄")
         self.stop()
         self.start()
-        logger.info("✅ Tor service restarted!")
\ No newline at end of file
+        logger.info("✅ Tor service restarted!")
+
+    def get_worker_proxies(self, num_workers):
+        return [self.proxies["http"]] * num_workers
+
+class TorPool:
+    """
+    Runs several independent Tor processes, each with its own SOCKS/control port and data directory,
+    so that identity rotation and circuit failures stay isolated to the workers using that instance.
+    Any executable that prints Tor's "Bootstrapped 100%" line can be passed as tor_path (e.g. a fake one for testing).
+    """
+
+    def __init__(self, size=NUM_TOR_INSTANCES, tor_path=TOR_PATH,
+                 socks_base_port=TOR_POOL_SOCKS_BASE_PORT,
+                 control_base_port=TOR_POOL_CONTROL_BASE_PORT,
+                 data_folder=TOR_POOL_DATA_FOLDER,
+                 bootstrap_timeout=TOR_BOOTSTRAP_TIMEOUT,
+                 stop_timeout=TOR_STOP_TIMEOUT):
+        self.instances = []
+        for i in range(size):
+            proxy = f"socks5://{TOR_HOST}:{socks_base_port + i}"
+            self.instances.append(TorManager(
+                tor_path=tor_path,
+                control_port=control_base_port + i,
+                port=socks_base_port + i,
+                proxies={"http": proxy, "https": proxy},
+                data_directory=os.path.join(data_folder, f"instance_{i}"),
+                bootstrap_timeout=bootstrap_timeout,
+                stop_timeout=stop_timeout,
+            ))
+        self.ready_instances = []
+
+    def __del__(self):
+        self.stop()
+
+    @property
+    def proxies(self):
+        # Only an instance that bootstrapped is ever handed out, the others are stopped by start()
+        if not self.ready_instances:
+            raise Exception("❌ No Tor instance of the pool is ready, call start() first ❌")
+        return self.ready_instances[0].proxies
+
+    def start(self):
+        logger.info(f"🔄 Starting a pool of {len(self.instances)} Tor instances... 🔄")
+
+        # Bootstrapping is mostly waiting on the network, so all instances bootstrap at the same time
+        with ThreadPoolExecutor(max_workers=len(self.instances)) as executor:
+            started = list(executor.map(lambda instance: instance.start(), self.instances))
+
+        self.ready_instances = [instance for instance, ok in zip(self.instances, started) if ok]
+
+        failed = [instance for instance, ok in zip(self.instances, started) if not ok]
+        for instance in failed:
+            logger.warning(f"⚠️ Dropping the Tor instance on port {instance.port}, it did not bootstrap ⚠️")
+        with ThreadPoolExecutor(max_workers=max(len(failed), 1)) as executor:
+            list(executor.map(lambda instance: instance.stop(), failed))
+
+        if not self.ready_instances:
+            raise Exception("❌ None of the Tor instances finished bootstrapping ❌")
+
+        logger.info(f"✅ {len(self.ready_instances)}/{len(self.instances)} Tor instances ready! ✅")
+        return True
+
+    def stop(self):
+        # Each stop can wait up to stop_timeout for its process to exit, so they all wait at the same time
+        with ThreadPoolExecutor(max_workers=len(self.instances)) as executor:
+            list(executor.map(lambda instance: instance.stop(), self.instances))
+        self.ready_instances = []
+
+    def get_instance(self, proxy):
+        return next((instance for instance in self.ready_instances if instance.proxies["http"] == proxy), None)
+
+    def request_new_identity(self, proxy):
+        """
+        Requests a new identity only on the instance behind the given proxy, other workers are not affected.
+        """
+        instance = self.get_instance(proxy)
+        if instance:
+            instance.request_new_identity()
+
+    def get_worker_proxies(self, num_workers):
+        """
+        Spreads the ready instances over the workers, each worker gets its own instance while there are enough of them.
+        """
+        return [self.ready_instances[i % len(self.ready_instances)].proxies["http"] for i in range(num_workers)]
\ No newline at end of file